@@ -0,0 +1,67 @@
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from polycut.models import CutRequest, Polygon, Vector3D
+
+
+def convex_polygon(count: int, rng: np.random.Generator) -> np.ndarray:
+    """ Convex polygon with jittered vertices on the unit circle """
+    angles = np.sort(rng.uniform(0, 2 * np.pi, count))
+    return np.column_stack([np.cos(angles), np.sin(angles), np.zeros(count)])
+
+
+def star_polygon(count: int, rng: np.random.Generator) -> np.ndarray:
+    """ Star-shaped polygon with random radii around the origin """
+    angles = np.sort(rng.uniform(0, 2 * np.pi, count))
+    radii = rng.uniform(0.3, 1, count)
+    return np.column_stack([radii * np.cos(angles), radii * np.sin(angles), np.zeros(count)])
+
+
+def comb_polygon(count: int, rng: np.random.Generator) -> np.ndarray:
+    """ Comb with count // 4 teeth of random height on a bar of height 1, padded with vertices on the bottom """
+    teeth = max(1, (count - 2) // 4)
+    tops = rng.uniform(1.5, 2.5, teeth)
+    x = np.arange(teeth - 1, -1, -1, dtype=float)
+    # every tooth is walked from its right to its left edge
+    outline = np.stack([np.column_stack([x + 1, tops]), np.column_stack([x + 0.5, tops]),
+                        np.column_stack([x + 0.5, np.ones(teeth)]), np.column_stack([x, np.ones(teeth)])], axis=1)
+    padding = max(0, count - 2 - 4 * teeth)
+    bottom = np.column_stack([np.linspace(0, teeth, padding + 2), np.zeros(padding + 2)])
+    points = np.concatenate([bottom, outline.reshape(-1, 2)])
+    return np.column_stack([points, np.zeros(len(points))])
+
+
+def degenerate_polygon(count: int, rng: np.random.Generator) -> np.ndarray:
+    """ Convex polygon where every vertex is repeated and every other edge is split at its midpoint """
+    corners = convex_polygon(max(3, -(-count // 3)), rng)
+    midpoints = (corners + np.roll(corners, -1, axis=0)) / 2
+    points = np.stack([corners, corners, midpoints], axis=1).reshape(-1, 3)
+    return points[:max(count, 3)]
+
+
+generators: Dict[str, Callable[[int, np.random.Generator], np.ndarray]] = {
+    "convex": convex_polygon,
+    "star": star_polygon,
+    "comb": comb_polygon,
+    "degenerate": degenerate_polygon,
+}
+
+
+def make_request(shape: str, count: int, seed: int = 0) -> CutRequest:
+    """ Generate a reproducible cut request for a polygon shape and vertex count """
+    rng = np.random.default_rng(seed)
+    coordinates = generators[shape](count, rng)
+    origin, normal = make_plane(shape, coordinates, rng)
+    return CutRequest(polygon=Polygon(coordinates), plane_origin=Vector3D(x=origin[0], y=origin[1], z=0),
+                      plane_normal=Vector3D(x=normal[0], y=normal[1], z=0))
+
+
+def make_plane(shape: str, coordinates: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """ Plane through the middle of the polygon, through a vertex for degenerate polygons """
+    if shape == "comb":
+        # across all teeth
+        return np.array([0, 1.25]), np.array([0, 1])
+    if shape == "degenerate":
+        return coordinates[0, :2], rng.normal(size=2)
+    return coordinates[:, :2].mean(axis=0), rng.normal(size=2)
@@ -0,0 +1,156 @@
+"""
+Benchmarks for the cut engine and the HTTP layer.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+Every result records the throughput of one case in vertices per second, and requests per second
+for endpoints. Comparing against a baseline exits with status 1 if any case got slower than the
+tolerance allows.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.generators import generators, make_request
+from polycut import codec
+from polycut.calculations import PreparedPolygon, intersect_curve_with_line, slice_prepared_polygon, try_cut_polygon
+from polycut.models import Vector2D, Vector3D
+
+default_sizes = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def measure(function: Callable[[], object], min_time: float) -> float:
+    """ Return the median duration of repeated calls, running for at least min_time seconds """
+    function()
+    durations = []
+    start = time.perf_counter()
+    while not durations or time.perf_counter() - start < min_time:
+        call_start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - call_start)
+    return float(np.median(durations))
+
+
+def calculation_cases(shape: str, size: int) -> Dict[str, Callable[[], object]]:
+    """ Benchmark cases that call the calculation functions directly """
+    request = make_request(shape, size)
+    prepared = PreparedPolygon(request.polygon)
+    normal = np.array([request.plane_normal.x, request.plane_normal.y])
+    heights = prepared.points @ normal
+    # planes spread evenly over the polygon
+    origins = [Vector3D(x=x, y=y, z=0) for x, y in
+               np.outer(np.linspace(heights.min(), heights.max(), 16), normal / (normal @ normal)).tolist()]
+    cases = {
+        "try_cut_polygon": lambda: try_cut_polygon(request),
+        "slice_16_planes": lambda: slice_prepared_polygon(prepared, request.plane_normal, origins),
+    }
+    if size <= 10_000:
+        # the per-segment helper is too slow for large polygons
+        points = [Vector2D(x=x, y=y) for x, y, _ in request.polygon.coordinates.tolist()]
+        origin = Vector2D(x=request.plane_origin.x, y=request.plane_origin.y)
+        normal = Vector2D(x=request.plane_normal.x, y=request.plane_normal.y)
+        cases["intersect_curve_with_line"] = lambda: [
+            intersect_curve_with_line(v, points[(i + 1) % len(points)], origin, normal) for i, v in enumerate(points)]
+    return cases
+
+
+def http_cases(shape: str, size: int) -> Dict[str, Callable[[], object]]:
+    """ Benchmark cases that call the endpoints through the test client """
+    from fastapi.testclient import TestClient
+    from polycut.main import app, cache
+
+    client = TestClient(app)
+    request = make_request(shape, size)
+    body = request.json().encode()
+    binary = codec.encode_cut_request(request)
+    cut_id = client.post("/api/poly-cut", content=body, headers={"Content-Type": "application/json"}).json()
+
+    def post(content: bytes, content_type: str):
+        # every iteration posts the same request, which would otherwise be answered from the cache
+        cache.clear()
+        response = client.post("/api/poly-cut", content=content, headers={"Content-Type": content_type})
+        # keep the store from growing during the benchmark
+        client.delete(f"/api/poly-cut/{response.json()}")
+
+    return {
+        "post_json": lambda: post(body, "application/json"),
+        "post_binary": lambda: post(binary, codec.MEDIA_TYPE),
+        "get_json": lambda: client.get(f"/api/poly-cut/{cut_id}"),
+        "get_binary": lambda: client.get(f"/api/poly-cut/{cut_id}", headers={"Accept": codec.MEDIA_TYPE}),
+    }
+
+
+def run(sizes: List[int], shapes: List[str], max_http_size: int, min_time: float) -> List[dict]:
+    """ Run all benchmark cases and return one result per case """
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            suites = [("calculations", calculation_cases(shape, size))]
+            if size <= max_http_size:
+                suites.append(("http", http_cases(shape, size)))
+            for suite, cases in suites:
+                for name, function in cases.items():
+                    seconds = measure(function, min_time)
+                    result = {"suite": suite, "case": name, "shape": shape, "vertices": size, "seconds": seconds,
+                              "vertices_per_second": size / seconds}
+                    if suite == "http":
+                        result["requests_per_second"] = 1 / seconds
+                    results.append(result)
+                    print(f"{suite:12} {name:26} {shape:10} {size:>9} {seconds * 1e3:10.3f} ms", file=sys.stderr)
+    return results
+
+
+def result_key(result: dict) -> str:
+    return f"{result['suite']}/{result['case']}/{result['shape']}/{result['vertices']}"
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """ Return a message for every case that is slower than the baseline by more than the tolerance """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        ratio = result["vertices_per_second"] / before["vertices_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{result_key(result)}: {ratio:.0%} of baseline throughput")
+    return regressions
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--shapes", nargs="+", choices=sorted(generators), default=list(generators))
+    parser.add_argument("--max-http-size", type=int, default=100_000, help="largest polygon sent through HTTP")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to repeat every case for")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against the results in this file")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative throughput loss")
+    args = parser.parse_args(arguments)
+
+    results = run(args.sizes, args.shapes, args.max_http_size, args.min_time)
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"regression {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the API, run its startup and answer its first request.
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --save-baseline benchmarks/startup-baseline.json
+    python -m benchmarks.startup --baseline benchmarks/startup-baseline.json --tolerance 0.25
+
+Every case is measured in new interpreter processes and the median over all runs is reported. Comparing against
+a baseline exits with status 1 if any case got slower than the tolerance allows.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# runs in the measured process and prints the durations of its stages as JSON
+child = """
+import json, sys, time
+start = time.perf_counter()
+from polycut.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(app)
+ready = time.perf_counter()
+client.__enter__()
+started = time.perf_counter()
+response = client.post("/api/poly-cut", json={
+    "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0}],
+    "plane_origin": {"x": 1, "y": 0, "z": 0}, "plane_normal": {"x": 1, "y": 0, "z": 0}})
+answered = time.perf_counter()
+assert response.status_code == 200, response.text
+client.__exit__(None, None, None)
+heavy = sorted(name for name in ("matplotlib", "sqlite3", "multiprocessing.shared_memory") if name in sys.modules)
+print(json.dumps({"import": imported - start, "startup": started - ready, "first_request": answered - started,
+                  "modules": heavy}))
+"""
+
+
+def measure_process() -> Dict[str, float]:
+    """ Start one process and return the durations of its stages and of the whole process """
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", child], check=True, capture_output=True, text=True).stdout
+    stages = json.loads(output.strip().splitlines()[-1])
+    stages["process"] = time.perf_counter() - start
+    return stages
+
+
+def run(repeat: int) -> List[dict]:
+    """ Run the cold-start cases in `repeat` new processes and return one result per case """
+    runs = [measure_process() for _ in range(repeat)]
+    results = []
+    for case in ("import", "startup", "first_request", "process"):
+        seconds = float(np.median([stages[case] for stages in runs]))
+        results.append({"suite": "startup", "case": case, "seconds": seconds})
+        print(f"startup      {case:26} {seconds * 1e3:10.3f} ms", file=sys.stderr)
+    # heavy optional modules that a cold start should not have loaded
+    for name in sorted({name for stages in runs for name in stages["modules"]}):
+        print(f"startup      loaded {name}", file=sys.stderr)
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """ Return a message for every case that is slower than the baseline by more than the tolerance """
+    previous = {result["case"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["case"])
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"startup/{result['case']}: {ratio:.0%} of baseline duration")
+    return regressions
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="number of processes to start")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against the results in this file")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args(arguments)
+
+    results = run(args.repeat)
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"regression {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Cut newline-delimited cut requests offline and write one result line per request, in order.
+
+    python -m polycut parcels.ndjson --output results.ndjson
+    cat parcels.ndjson | python -m polycut --workers 8 > results.ndjson
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from polycut.bulk import cut_stream
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m polycut", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", default="-", help="file with one cut request per line, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="file for the result lines, - for stdout")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="requests sent to a worker at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes, 0 to cut in this process")
+    args = parser.parse_args(arguments)
+
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    target = sys.stdout if args.output == "-" else open(args.output, "w")
+    pool = None
+    if args.workers > 0:
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for results in cut_stream(source, pool, args.chunk_size, max_pending=max(args.workers, 1) * 2):
+            target.write(results)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
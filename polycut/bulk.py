@@ -0,0 +1,87 @@
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from polycut.calculations import try_cut_polygon
+from polycut.models import CutRequest
+
+
+def cut_lines(lines: List[bytes]) -> str:
+    """ Cut newline-delimited cut requests and return one result line per request, runs in a worker process
+
+    A request that is not valid is answered with a line holding its validation errors as `detail`, like the
+    response of an invalid request to POST /api/poly-cut.
+    """
+    results = []
+    for line in lines:
+        try:
+            request = CutRequest.parse_raw(line)
+        except ValidationError as e:
+            results.append(json.dumps({"detail": e.errors()}))
+            continue
+        results.append(try_cut_polygon(request).json())
+    return "".join(result + "\n" for result in results)
+
+
+def chunked(lines: Iterable[bytes], size: int) -> Iterator[List[bytes]]:
+    """ Split the non-empty lines into lists of at most size lines """
+    lines = (line for line in lines if line.strip())
+    while chunk := list(islice(lines, size)):
+        yield chunk
+
+
+def cut_stream(lines: Iterable[bytes], pool: Optional[Executor], chunk_size: int, max_pending: int) \
+        -> Iterator[str]:
+    """ Cut newline-delimited cut requests in chunks, at most max_pending chunks at a time in the pool or inline if
+    there is none, and yield the result lines of every chunk in the order of the requests """
+    pending = deque()
+    for chunk in chunked(lines, chunk_size):
+        if pool is None:
+            yield cut_lines(chunk)
+            continue
+        pending.append(pool.submit(cut_lines, chunk))
+        if len(pending) >= max_pending:
+            # read no further input until the oldest chunk is done
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """ Split a stream of byte chunks into lines, keeping only the last incomplete line in memory """
+    rest = b""
+    async for chunk in chunks:
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+async def cut_stream_async(lines: AsyncIterator[bytes], pool: Optional[Executor], chunk_size: int,
+                           max_pending: int) -> AsyncIterator[str]:
+    """ Same as cut_stream for a stream of lines, cutting in threads if there is no pool """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    chunk = []
+    async for line in lines:
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) < chunk_size:
+            continue
+        pending.append(loop.run_in_executor(pool, cut_lines, chunk))
+        chunk = []
+        if len(pending) >= max_pending:
+            # read no further input until the oldest chunk is done
+            yield await pending.popleft()
+    if chunk:
+        pending.append(loop.run_in_executor(pool, cut_lines, chunk))
+    while pending:
+        yield await pending.popleft()
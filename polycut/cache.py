@@ -0,0 +1,113 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Tuple
+
+import numpy as np
+
+from polycut.calculations import PreparedPolygon, unit_normal
+from polycut.models import CutRequest, CutResult
+
+
+class CutCache:
+    """ Bounded LRU cache of cut results, keyed by a canonical hash of the request """
+
+    def __init__(self, max_entries: int = 1024, max_vertices: int = 1_000_000):
+        self.max_entries = max_entries
+        self.max_vertices = max_vertices
+        self.entries: OrderedDict[bytes, Tuple[CutResult, int]] = OrderedDict()
+        self.vertices = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key: bytes) -> Optional[CutResult]:
+        """ Return the cached result for a request key, if any """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: bytes, request: CutRequest, result: CutResult):
+        """ Cache the result of a request unless it is larger than the whole cache """
+        vertices = len(request.polygon) + sum(len(p) for p in result.result_polygons)
+        if vertices > self.max_vertices:
+            return
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (result, vertices)
+                self.vertices += vertices
+            # evict least recently used entries
+            while len(self.entries) > self.max_entries or self.vertices > self.max_vertices:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.vertices -= evicted
+
+    def clear(self):
+        """ Remove all entries and reset the counters """
+        with self.lock:
+            self.entries.clear()
+            self.vertices = self.hits = self.misses = 0
+
+
+class PreparedCache:
+    """ Bounded LRU cache of the prepared polygons of stored cuts, so updating a cut can reuse the previous work """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, PreparedPolygon] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, cut_id: str) -> Optional[PreparedPolygon]:
+        """ Return the prepared polygon of a cut, if any """
+        with self.lock:
+            polygon = self.entries.get(cut_id)
+            if polygon is not None:
+                self.entries.move_to_end(cut_id)
+            return polygon
+
+    def put(self, cut_id: str, polygon: PreparedPolygon):
+        """ Keep the prepared polygon of a cut, evicting the least recently used ones """
+        with self.lock:
+            self.entries[cut_id] = polygon
+            self.entries.move_to_end(cut_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def add(self, cut_id: str, polygon: PreparedPolygon):
+        """ Keep the prepared polygon of a cut unless one is kept already, which is at least as recent """
+        with self.lock:
+            if cut_id not in self.entries:
+                self.entries[cut_id] = polygon
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+    def pop(self, cut_id: str):
+        """ Forget the prepared polygon of a cut """
+        with self.lock:
+            self.entries.pop(cut_id, None)
+
+
+def request_key(request: CutRequest) -> bytes:
+    """ Hash a request so that requests with the same cut result get the same key """
+    coordinates = request.polygon.coordinates
+    # consecutive duplicates are removed by the cut anyway
+    distinct = np.any(coordinates != np.roll(coordinates, -1, axis=0), axis=1)
+    if np.any(distinct):
+        coordinates = coordinates[distinct]
+    else:
+        coordinates = coordinates[:1]
+    origin, normal = request.plane_origin, request.plane_normal
+    # the cut only depends on the direction of the normal
+    normal = unit_normal(np.array([normal.x, normal.y, normal.z], dtype="<f8"))
+    # adding 0.0 turns -0.0 into 0.0
+    plane = np.concatenate([[origin.x, origin.y, origin.z], normal]).astype("<f8") + 0.0
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(plane.tobytes())
+    digest.update((coordinates.astype("<f8") + 0.0).tobytes())
+    if request.simplify_tolerance is not None:
+        digest.update(np.array([request.simplify_tolerance], dtype="<f8").tobytes())
+    return digest.digest()
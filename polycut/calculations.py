@@ -1,68 +1,880 @@
-from typing import List
+import math
+import os
+from collections import Counter, OrderedDict
+from fractions import Fraction
+from threading import Lock
+from typing import List, Optional, Tuple, Union
 import numpy as np
 
-from polycut.models import Vector2D, Vector3D, CutInfo, CutRequest, CutResult, Intersection
+from polycut import metrics
+from polycut.spatial import EdgeIndex
+from polycut.models import Vector2D, Vector3D, CutInfo, CutRequest, CutResult, Intersection, Plane, Polygon, \
+    SliceRequest, SliceResult
 
 epsilon = 1e-6
+# with POLYCUT_ROBUST=1, a vertex is on a line only if it lies exactly on it, decided by exact_height_signs
+robust = os.environ.get("POLYCUT_ROBUST") == "1"
+# relative error bound of a height computed as (px - ox) * nx + (py - oy) * ny, like Shewchuk's orient2d filter
+height_error_bound = (3 + 16 * np.finfo(float).eps / 2) * np.finfo(float).eps / 2
+
+
+class Projection:
+    """ Vertex heights along a line normal, sorted so that a line with this normal can be placed in O(log n) """
+    __slots__ = ("directions", "heights", "sorted_heights", "denominators", "scale")
+
+    def __init__(self, points: np.ndarray, directions: np.ndarray, line_normal: np.ndarray):
+        self.directions = directions
+        self.heights = points[:, 0] * line_normal[0] + points[:, 1] * line_normal[1]
+        self.sorted_heights = np.sort(self.heights)
+        # same expression as in intersect_polygon_with_line so results do not depend on the projection
+        self.denominators = line_normal[0] * directions[:, 0] + line_normal[1] * directions[:, 1]
+        self.scale = float(np.abs(points).max(initial=0.0))
+
+    def patched(self, points: np.ndarray, directions: np.ndarray, line_normal: np.ndarray, changed: np.ndarray,
+                edges: np.ndarray) -> "Projection":
+        """ Projection of the polygon after the given vertices and edges changed """
+        projection = Projection.__new__(Projection)
+        projection.directions = directions
+        heights = points[changed, 0] * line_normal[0] + points[changed, 1] * line_normal[1]
+        projection.heights = self.heights.copy()
+        projection.heights[changed] = heights
+
+        # remove the old heights of the changed vertices from the sorted heights and insert the new ones
+        old = np.sort(self.heights[changed])
+        ranks = np.arange(len(old)) - np.searchsorted(old, old)
+        remaining = np.delete(self.sorted_heights, np.searchsorted(self.sorted_heights, old) + ranks)
+        heights.sort()
+        projection.sorted_heights = np.insert(remaining, np.searchsorted(remaining, heights), heights)
+
+        projection.denominators = self.denominators.copy()
+        projection.denominators[edges] = line_normal[0] * directions[edges, 0] + line_normal[1] * directions[edges, 1]
+        projection.scale = max(self.scale, float(np.abs(points[changed]).max()))
+        return projection
+
+    def misses(self, offset: float, margin: float) -> bool:
+        """ Check if a line at the given height is further than margin from every vertex """
+        return self.sorted_heights[0] - offset > margin or offset - self.sorted_heights[-1] > margin
+
+    def vertices_near(self, offset: float, margin: float) -> int:
+        """ Count the vertices closer than margin to a line at the given height """
+        return int(np.searchsorted(self.sorted_heights, offset + margin, side="right")
+                   - np.searchsorted(self.sorted_heights, offset - margin))
+
+
+class Extents:
+    """ Support function of a polygon sampled at eight directions 45 degrees apart, its bounding box and its extent
+    along the diagonals, from which the range of vertex heights along any line normal is bounded in O(1) """
+    __slots__ = ("support", "scale")
+
+    # the first four directions, the support along the other four is minus the lowest height along these
+    directions = np.array([[1, math.sqrt(0.5), 0, -math.sqrt(0.5)], [0, math.sqrt(0.5), 1, math.sqrt(0.5)]])
+    units = [(math.cos(k * math.pi / 4), math.sin(k * math.pi / 4)) for k in range(9)]
+
+    def __init__(self, points: np.ndarray):
+        heights = points @ self.directions
+        self.support = np.concatenate([heights.max(axis=0), -heights.min(axis=0)]).tolist()
+        self.scale = max(map(abs, self.support))
+
+    def patched(self, points: np.ndarray) -> "Extents":
+        """ Extents that also cover the given changed vertices, they may be wider than those of the polygon """
+        extents = Extents(points)
+        extents.support = [max(a, b) for a, b in zip(self.support, extents.support)]
+        extents.scale = max(self.scale, extents.scale)
+        return extents
+
+    def highest(self, line_normal: np.ndarray) -> float:
+        """ Upper bound of the vertex heights along a line normal """
+        x, y = float(line_normal[0]), float(line_normal[1])
+        # write the normal as a positive combination of the two sampled directions around it
+        k = int(math.atan2(y, x) % (2 * math.pi) // (math.pi / 4)) % 8
+        (x0, y0), (x1, y1) = self.units[k], self.units[k + 1]
+        a = (x * y1 - y * x1) / math.sqrt(0.5)
+        b = (x0 * y - y0 * x) / math.sqrt(0.5)
+        return a * self.support[k] + b * self.support[(k + 1) % 8]
+
+    def misses(self, offset: float, line_normal: np.ndarray, margin: float) -> bool:
+        """ Check if a line at the given height is further than margin from every vertex """
+        return offset - self.highest(line_normal) > margin or -self.highest(-line_normal) - offset > margin
+
+
+class Frame:
+    """ Orthonormal frame of the plane of a polygon, in which the polygon is cut as 2D points """
+    __slots__ = ("origin", "axes", "normal", "xy")
+
+    def __init__(self, origin: np.ndarray, axes: np.ndarray, normal: np.ndarray):
+        self.origin = origin
+        self.axes = axes
+        self.normal = normal
+        # polygons on the XY plane keep their x and y coordinates
+        self.xy = False
+
+    @classmethod
+    def xy_plane(cls) -> "Frame":
+        frame = cls(np.zeros(3), np.eye(3)[:2], np.array([0.0, 0.0, 1.0]))
+        frame.xy = True
+        return frame
+
+    @classmethod
+    def of_polygon(cls, coordinates: np.ndarray) -> Optional["Frame"]:
+        """ Frame of a polygon with at least three vertices, None if the vertices do not span a plane """
+        origin = coordinates[0]
+        offsets = coordinates - origin
+        # Newell's method, twice the vector area of the polygon
+        normal = np.cross(offsets, np.roll(offsets, -1, axis=0)).sum(axis=0)
+        length = np.linalg.norm(normal)
+        if length < epsilon * np.abs(offsets).max():
+            return None
+        normal /= length
+        # any axis perpendicular to the normal, the second one completes a right-handed frame
+        first = np.cross(np.eye(3)[np.argmin(np.abs(normal))], normal)
+        first /= np.linalg.norm(first)
+        return cls(origin, np.stack([first, np.cross(normal, first)]), normal)
+
+    def to_2d(self, coordinates: np.ndarray) -> np.ndarray:
+        """ Convert (N, 3) points on the plane to (N, 2) points in the frame """
+        if self.xy:
+            return coordinates[:, :2]
+        return (coordinates - self.origin) @ self.axes.T
+
+    def to_3d(self, points: np.ndarray) -> np.ndarray:
+        """ Convert (N, 2) points in the frame to (N, 3) points """
+        if self.xy:
+            return np.column_stack([points, np.zeros(len(points))])
+        return self.origin + points @ self.axes
+
+    def distances(self, coordinates: np.ndarray) -> np.ndarray:
+        """ Signed distances of (N, 3) points to the plane """
+        return (coordinates - self.origin) @ self.normal
+
+    def line(self, plane_origin: np.ndarray, plane_normal: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Origin and normal of the line where a plane intersects the plane of the frame, in the frame.
+        The normal is zero if the planes are parallel """
+        line_normal = self.axes @ plane_normal
+        offset = plane_origin - self.origin
+        line_origin = self.axes @ offset
+        # move the plane origin projected onto the frame along the line normal onto the line
+        shift = (offset @ self.normal) * (self.normal @ plane_normal)
+        if shift != 0:
+            # the shift is meaningless for parallel planes, which have to be checked with is_parallel
+            with np.errstate(divide="ignore", invalid="ignore"):
+                line_origin = line_origin + line_normal * (shift / (line_normal @ line_normal))
+        return line_origin, line_normal
+
+    def is_parallel(self, line_normal: np.ndarray, plane_normal: np.ndarray) -> bool:
+        """ Check if a plane whose line in the frame has the given normal is parallel to the plane of the frame """
+        return bool(np.linalg.norm(line_normal) <= epsilon * np.linalg.norm(plane_normal))
+
+    def on_plane(self, plane_origin: np.ndarray, plane_normal: np.ndarray) -> bool:
+        """ Check if the plane of the frame lies in a parallel plane """
+        return bool(abs((self.origin - plane_origin) @ plane_normal) <= epsilon * np.linalg.norm(plane_normal))
+
+
+xy_frame = Frame.xy_plane()
+
+
+class PreparedPolygon:
+    """ Array form of a polygon that is validated and de-duplicated once and can then be cut with many planes """
+    __slots__ = ("info", "frame", "points", "duplicates", "tolerance", "removed", "directions", "projections", "index",
+                 "bounds", "lock", "sources")
+
+    # number of line normals whose projection is kept
+    max_projections = 4
+    # smallest polygon for which an edge index is built, below a full scan is as fast
+    min_index_vertices = 1024
+    # fraction of vertices that may change for update() to patch the polygon instead of preparing it again
+    max_patch_fraction = 0.25
+
+    def __init__(self, polygon: Union[Polygon, List[Vector3D]], tolerance: Optional[float] = None):
+        """ Prepare a polygon, with a tolerance simplified so that no vertex moves further than the tolerance """
+        coordinates = Polygon.validate(polygon).coordinates
+        # cached polygons are cut by several threads at once, which fill the lazily computed parts
+        self.lock = Lock()
+        self.directions = None
+        self.projections = OrderedDict()
+        self.index = None
+        self.bounds = None
+        self.info = None
+        self.tolerance = tolerance
+        self.removed = 0
+        self.sources = None
+
+        # polygons on the XY plane are cut in x and y, all others in the frame of their plane
+        if not np.any(coordinates[:, 2] != 0):
+            self.frame = xy_frame
+            with metrics.stage("dedup"):
+                self.points = remove_duplicate_vertices(coordinates[:, :2])
+            self.duplicates = len(coordinates) - len(self.points)
+            self.simplify()
+            return
+
+        with metrics.stage("dedup"):
+            coordinates_3d = remove_duplicate_vertices(coordinates)
+        self.duplicates = len(coordinates) - len(coordinates_3d)
+        self.frame = xy_frame
+        self.points = np.empty((0, 2))
+        if len(coordinates_3d) < 3:
+            self.info = CutInfo.failed_polygon_less_than_three_vertices
+            return
+        with metrics.stage("frame"):
+            frame = Frame.of_polygon(coordinates_3d)
+            if frame is None or np.any(np.abs(frame.distances(coordinates_3d)) >= epsilon):
+                self.info = CutInfo.failed_polygon_not_planar
+                return
+            self.frame = frame
+            self.points = frame.to_2d(coordinates_3d)
+        # the 2D vertices and the coordinates they were given with, as rounding through the frame changes them
+        self.sources = (self.points, coordinates_3d)
+        self.simplify()
+
+    def simplify(self):
+        """ Remove the vertices that are not needed to keep the outline within the tolerance """
+        if self.tolerance is None:
+            return
+        with metrics.stage("simplify"):
+            points = simplify_polygon(self.points, self.tolerance)
+        self.removed = len(self.points) - len(points)
+        self.points = points
+
+    def to_polygons(self, pieces: List[np.ndarray]) -> List[Polygon]:
+        """ Convert (N, 2) pieces of the polygon to 3D polygons, in which its own vertices keep their coordinates """
+        if self.sources is None or not pieces:
+            return [to_polygon(piece, self.frame) for piece in pieces]
+        points, coordinates = self.sources
+        vertices = np.concatenate(pieces)
+        # find the vertices of the polygon among the vertices of the pieces, adding 0.0 turns -0.0 into 0.0
+        rows, inverse = np.unique(np.concatenate([points, vertices]) + 0.0, axis=0, return_inverse=True)
+        positions = np.full(len(rows), -1)
+        positions[inverse[:len(points)]] = np.arange(len(points))
+        found = positions[inverse[len(points):]]
+        vertices_3d = self.frame.to_3d(vertices)
+        vertices_3d[found >= 0] = coordinates[found[found >= 0]]
+        return [Polygon(piece) for piece in np.split(vertices_3d, np.cumsum([len(p) for p in pieces])[:-1])]
+
+    def projection(self, line_normal: np.ndarray) -> Projection:
+        """ Projection of the vertices onto a line normal, computed once for the last few normals """
+        key = (float(line_normal[0]), float(line_normal[1]))
+        with self.lock:
+            projection = self.projections.get(key)
+            if projection is not None:
+                self.projections.move_to_end(key)
+                return projection
+
+            if self.directions is None:
+                self.directions = np.roll(self.points, -1, axis=0) - self.points
+            projection = self.projections[key] = Projection(self.points, self.directions, line_normal)
+            if len(self.projections) > self.max_projections:
+                self.projections.popitem(last=False)
+            return projection
+
+    def extents(self) -> Extents:
+        """ Bounding box and diagonal extents of the vertices, computed on first use """
+        with self.lock:
+            if self.bounds is None:
+                with metrics.stage("extents"):
+                    self.bounds = Extents(self.points)
+            return self.bounds
+
+    def misses(self, line_origin: np.ndarray, line_normal: np.ndarray) -> bool:
+        """ Check in O(1) if a line is certainly too far from the polygon to touch it """
+        extents = self.extents()
+        offset = line_origin[0] * line_normal[0] + line_origin[1] * line_normal[1]
+        return extents.misses(offset, line_normal, cut_margin(line_origin, line_normal, extents.scale))
+
+    def edge_index(self) -> Optional[EdgeIndex]:
+        """ Spatial index of the edges, built on first use for large polygons """
+        with self.lock:
+            if self.index is None and len(self.points) >= self.min_index_vertices:
+                with metrics.stage("index"):
+                    self.index = EdgeIndex(self.points)
+            return self.index
+
+    def update(self, polygon: Union[Polygon, List[Vector3D]], tolerance: Optional[float] = None) \
+            -> "PreparedPolygon":
+        """ Prepare a changed polygon, reusing this one if no vertex changed and patching it if only a few did """
+        coordinates = Polygon.validate(polygon).coordinates
+        updated = self.patch(coordinates, tolerance)
+        return updated if updated is not None else PreparedPolygon(coordinates, tolerance)
+
+    def patch(self, polygon: Union[Polygon, List[Vector3D]], tolerance: Optional[float] = None) \
+            -> Optional["PreparedPolygon"]:
+        """ Return this polygon if no vertex of the changed polygon changed, a patched copy if only a few did and
+        None if it has to be prepared again """
+        coordinates = Polygon.validate(polygon).coordinates
+        count = len(self.points)
+        # patching keeps vertex indices, so neither polygon may have had duplicates or other vertices removed
+        if self.info is not None or not self.frame.xy or self.duplicates or self.tolerance is not None \
+                or tolerance is not None or len(coordinates) != count or np.any(coordinates[:, 2] != 0):
+            return None
+
+        points = coordinates[:, :2]
+        changed = np.flatnonzero(np.any(points != self.points, axis=1))
+        if len(changed) == 0:
+            metrics.increment("prepared_reused")
+            return self
+        if len(changed) > self.max_patch_fraction * count:
+            return None
+
+        # the edges starting at a changed vertex or its predecessor changed, and must not have become degenerate
+        edges = np.unique(np.concatenate([changed, changed - 1]) % count)
+        if np.any(same_vertices(points[edges], points[(edges + 1) % count])):
+            return None
+
+        metrics.increment("prepared_patched")
+        prepared = PreparedPolygon.__new__(PreparedPolygon)
+        prepared.lock = Lock()
+        prepared.info = None
+        prepared.frame = self.frame
+        prepared.duplicates = 0
+        prepared.tolerance = None
+        prepared.removed = 0
+        # only polygons on the XY plane are patched, their points are their coordinates
+        prepared.sources = None
+        prepared.points = self.points.copy()
+        prepared.points[changed] = points[changed]
+        prepared.directions = None
+        prepared.projections = OrderedDict()
+        with self.lock:
+            prepared.index = self.index.patched(prepared.points, edges) if self.index is not None else None
+            prepared.bounds = self.bounds.patched(points[changed]) if self.bounds is not None else None
+            if self.directions is not None:
+                prepared.directions = self.directions.copy()
+                prepared.directions[edges] = prepared.points[(edges + 1) % count] - prepared.points[edges]
+                for key, projection in self.projections.items():
+                    prepared.projections[key] = projection.patched(prepared.points, prepared.directions,
+                                                                   np.array(key), changed, edges)
+        return prepared
 
 
 def try_cut_polygon(request: CutRequest) -> CutResult:
     """ Try to cut a polygon with a plane """
-    # check if polygon is on XY plane
-    if not all(v.z == 0 for v in request.polygon):
-        return CutResult(info=CutInfo.failed_polygon_not_on_xy_plane, result_polygons=[])
+    return cut_prepared_polygon(PreparedPolygon(request.polygon, request.simplify_tolerance), request.plane_origin,
+                                request.plane_normal)
+
+
+def try_cut_polygons(polygons: List[Polygon], planes: List[Plane], pairs: List[Tuple[int, int]]) \
+        -> List[CutResult]:
+    """ Try to cut every (polygon index, plane index) pair, preparing each polygon only once """
+    prepared = {}
+    results = []
+    uses = Counter(polygon_index for polygon_index, _ in pairs)
+    for polygon_index, plane_index in pairs:
+        if polygon_index not in prepared:
+            prepared[polygon_index] = PreparedPolygon(polygons[polygon_index])
+        plane = planes[plane_index]
+        # the edge index of a polygon pays off if it is cut more than once
+        results.append(cut_prepared_polygon(prepared[polygon_index], plane.origin, plane.normal,
+                                            indexed=uses[polygon_index] > 1))
+    return results
+
+
+def cut_prepared_polygon(polygon: PreparedPolygon, plane_origin: Vector3D, plane_normal: Vector3D,
+                         projected: bool = False, indexed: bool = False) -> CutResult:
+    """ Try to cut a prepared polygon with a plane, with projected=True through the cached projection onto the normal,
+    which pays off when the polygon is cut again with the same normal, and with indexed=True through the edge index,
+    which pays off when a large polygon is cut again with any plane """
+    if polygon.info is not None:
+        metrics.record_cut(len(polygon.points), polygon.info)
+        return CutResult(info=polygon.info, result_polygons=[], removed_vertices=polygon.removed)
+
+    # intersect the plane with the plane of the polygon
+    # the tolerances are distances, so scaled normals give the same cut
+    normal = unit_normal(np.array([plane_normal.x, plane_normal.y, plane_normal.z]))
+    line_origin, line_normal = polygon.frame.line(np.array([plane_origin.x, plane_origin.y, plane_origin.z]), normal)
+    if polygon.frame.is_parallel(line_normal, normal):
+        info = parallel_cut_info(polygon, plane_origin, normal)
+        metrics.record_cut(len(polygon.points), info)
+        return CutResult(info=info, result_polygons=[], removed_vertices=polygon.removed)
+
+    # most planes of a tiling miss the polygon, which the extents tell without looking at the edges
+    if len(polygon.points) >= 3 and polygon.misses(line_origin, line_normal):
+        metrics.increment("fast_rejects")
+        metrics.record_cut(len(polygon.points), CutInfo.success_no_cut)
+        return CutResult(info=CutInfo.success_no_cut, result_polygons=[], removed_vertices=polygon.removed,
+                         fast_rejected=True)
+
+    projection = polygon.projection(line_normal) if projected and len(polygon.points) >= 3 else None
+    index = polygon.edge_index() if indexed else None
+    info, pieces = cut_polygon_array(polygon.points, line_origin, line_normal, projection, index)
+    metrics.record_cut(len(polygon.points), info)
 
-    # check if plane is orthogonal to XY plane
-    if not (request.plane_normal.z == 0):
-        return CutResult(info=CutInfo.failed_cut_plane_not_orthogonal, result_polygons=[])
+    # convert back to 3D
+    result_polygons = polygon.to_polygons(pieces)
+
+    return CutResult(info=info, result_polygons=result_polygons, removed_vertices=polygon.removed)
+
+
+def try_slice_polygon(request: SliceRequest) -> SliceResult:
+    """ Try to cut a polygon with a stack of parallel planes """
+    return slice_prepared_polygon(PreparedPolygon(request.polygon), request.plane_normal, request.plane_origins)
+
+
+def slice_prepared_polygon(polygon: PreparedPolygon, plane_normal: Vector3D, plane_origins: List[Vector3D]) \
+        -> SliceResult:
+    """ Try to cut a prepared polygon with parallel planes that share a normal """
+    if polygon.info is not None:
+        return SliceResult(info=polygon.info, strips=[])
+
+    if len(polygon.points) < 3:
+        return SliceResult(info=CutInfo.failed_polygon_less_than_three_vertices, strips=[])
+
+    # project the polygon and the planes onto the normal once
+    normal = np.array([plane_normal.x, plane_normal.y, plane_normal.z])
+    line_normal = polygon.frame.axes @ normal
+    origins = np.array([[v.x, v.y, v.z] for v in plane_origins], dtype=float).reshape(-1, 3)
+    offsets = np.sort((origins - polygon.frame.origin) @ normal)
+    if polygon.frame.is_parallel(line_normal, normal):
+        # the polygon lies between two planes or on one of them
+        if np.any(np.abs(offsets) <= epsilon * np.linalg.norm(normal)):
+            return SliceResult(info=CutInfo.failed_polygon_on_cut_plane, strips=[])
+        strips = [[] for _ in range(len(offsets) + 1)]
+        strips[np.searchsorted(offsets, 0)].extend(polygon.to_polygons([polygon.points]))
+        return SliceResult(info=CutInfo.success_no_cut, strips=strips)
+
+    # if no plane comes near the polygon, it lies in one strip
+    extents = polygon.extents()
+    margin = cut_margin(np.zeros(2), line_normal, extents.scale + float(np.abs(offsets).max(initial=0.0)))
+    low, high = -extents.highest(-line_normal) - margin, extents.highest(line_normal) + margin
+    if not np.any((offsets >= low) & (offsets <= high)):
+        metrics.increment("fast_rejects")
+        strips = [[] for _ in range(len(offsets) + 1)]
+        strips[np.searchsorted(offsets, low)].extend(polygon.to_polygons([polygon.points]))
+        return SliceResult(info=CutInfo.success_no_cut, strips=strips, fast_rejected=True)
+
+    heights = polygon.points @ line_normal
+    with metrics.stage("slice"):
+        info, strips = slice_polygon_array(polygon.points, heights, offsets, line_normal)
+    metrics.record_cut(len(polygon.points), info)
+
+    # convert back to 3D
+    pieces = iter(polygon.to_polygons([piece for strip in strips for piece in strip]))
+    strips = [[next(pieces) for _ in strip] for strip in strips]
+
+    return SliceResult(info=info, strips=strips)
+
+
+def to_polygon(points: np.ndarray, frame: Optional[Frame] = None) -> Polygon:
+    """ Convert (N, 2) points in a frame, by default on the XY plane, to a polygon """
+    if frame is None:
+        return Polygon(np.column_stack([points, np.zeros(len(points))]))
+    return Polygon(frame.to_3d(points))
+
+
+def parallel_cut_info(polygon: PreparedPolygon, plane_origin: Vector3D, plane_normal: np.ndarray) -> CutInfo:
+    """ Outcome of cutting a polygon with a plane parallel to it """
+    if len(polygon.points) < 3:
+        return CutInfo.failed_polygon_less_than_three_vertices
+    if polygon.frame.on_plane(np.array([plane_origin.x, plane_origin.y, plane_origin.z]), plane_normal):
+        return CutInfo.failed_polygon_on_cut_plane
+    return CutInfo.success_no_cut
 
-    # convert to 2D
-    polygon2d = [Vector2D(x=v.x, y=v.y) for v in request.polygon]
-    line_origin2d = Vector2D(x=request.plane_origin.x, y=request.plane_origin.y)
-    line_normal2d = Vector2D(x=request.plane_normal.x, y=request.plane_normal.y)
 
-    # remove duplicate points from polygon
-    polygon2d = [x for i, x in enumerate(polygon2d) if not are_equal(x, polygon2d[(i + 1) % len(polygon2d)])]
+def unit_normal(normal: np.ndarray) -> np.ndarray:
+    """ Normal of unit length in the same direction, the same for all normals that are exactly scaled copies """
+    scale = np.abs(normal).max()
+    if scale == 0:
+        return normal
+    # dividing by the largest component first maps scaled copies to the same values
+    normal = normal / scale
+    return normal / np.linalg.norm(normal)
 
+
+def cut_margin(line_origin: np.ndarray, line_normal: np.ndarray, scale: float) -> float:
+    """ Height difference along a line normal within which a vertex may touch the line: a generous bound on the
+    distance tolerance plus the rounding difference to distances_to_line, for coordinates up to scale """
+    return float(np.linalg.norm(line_normal)) * (epsilon + 1e-9 * (scale + float(np.abs(line_origin).max())))
+
+
+def cut_polygon_array(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray,
+                      projection: Optional[Projection] = None, index: Optional[EdgeIndex] = None) \
+        -> Tuple[CutInfo, List[np.ndarray]]:
+    """ Cut a de-duplicated (N, 2) polygon with a line and return the outcome and the resulting pieces """
     # check if polygon is valid
-    if len(polygon2d) < 3:
-        return CutResult(info=CutInfo.failed_polygon_less_than_three_vertices, result_polygons=[])
+    if len(points) < 3:
+        return CutInfo.failed_polygon_less_than_three_vertices, []
+
+    directions = denominators = edges = None
+    tangent_possible = True
+    if projection is not None or index is not None:
+        margin = cut_margin(line_origin, line_normal, projection.scale if projection is not None else index.scale())
+    if projection is not None:
+        offset = line_origin[0] * line_normal[0] + line_origin[1] * line_normal[1]
+        if projection.misses(offset, margin):
+            return CutInfo.success_no_cut, []
+        # a segment can only lie on the line if two vertices are close to it
+        tangent_possible = projection.vertices_near(offset, margin) >= 2
+        directions, denominators = projection.directions, projection.denominators
+    if index is not None:
+        # only the edges near the line can touch or cross it
+        with metrics.stage("query"):
+            edges = index.query(line_origin, line_normal, margin)
+
+    if robust:
+        with metrics.stage("intersections"):
+            tangent, indices, positions = intersect_polygon_with_line_exactly(points, line_origin, line_normal, edges)
+        if tangent:
+            return CutInfo.failed_line_tangent_to_segment, []
+        tangent_possible = False
 
     # check if line lies on polygon
-    if is_line_tangent_to_poly_segment(polygon2d, line_origin2d, line_normal2d):
-        return CutResult(info=CutInfo.failed_line_tangent_to_segment, result_polygons=[])
-
-    # find intersections
-    intersections = []
-    for i, v1 in enumerate(polygon2d):
-        v2 = polygon2d[(i + 1) % len(polygon2d)]
-        intersection = intersect_curve_with_line(v1, v2, line_origin2d, line_normal2d)
-        if intersection is not None:
-            intersections.append(Intersection(index=i, position=intersection))
-
-    # remove intersections that are too close to each other
-    intersections = [x for i, x in enumerate(intersections) if
-                     not are_equal(x.position, intersections[(i + 1) % len(intersections)].position)]
-
-    if len(intersections) == 0:
+    if tangent_possible:
+        with metrics.stage("tangency"):
+            if edges is None:
+                tangent = has_tangent_segment(distances_to_line(points, line_origin, line_normal))
+            else:
+                tangent = has_tangent_edge(points, edges, line_origin, line_normal)
+        if tangent:
+            return CutInfo.failed_line_tangent_to_segment, []
+
+    # find intersections and remove those that are too close to each other
+    if not robust:
+        with metrics.stage("intersections"):
+            if edges is None:
+                indices, positions = intersect_polygon_with_line(points, line_origin, line_normal, directions,
+                                                                 denominators)
+            else:
+                indices, positions = intersect_edges_with_line(points, edges, line_origin, line_normal, directions,
+                                                               denominators)
+            indices, positions = remove_duplicate_intersections(indices, positions)
+
+    if len(indices) == 0:
         # no intersections, polygon is not cut
-        return CutResult(info=CutInfo.success_no_cut, result_polygons=[])
+        return CutInfo.success_no_cut, []
 
-    if len(intersections) == 1:
+    if len(indices) == 1:
         # one intersection, polygon touched at vertex
-        return CutResult(info=CutInfo.failed_line_vertex_tangent, result_polygons=[])
-
-    # accepts non-convex polygons if they are cut in two
-    # todo: discuss if non-convex input should be caught earlier; might be too expensive for large polygons
-    if len(intersections) > 2:
-        return CutResult(info=CutInfo.failed_polygon_not_convex, result_polygons=[])
-
-    result_polygons = cut_polygon(polygon2d, intersections[0], intersections[1])
+        return CutInfo.failed_line_vertex_tangent, []
+
+    if len(indices) > 2:
+        # non-convex polygon, cut it into all of its pieces
+        with metrics.stage("cut"):
+            return split_polygon_along_line(points, line_origin, line_normal)
+
+    with metrics.stage("cut"):
+        return CutInfo.successful, split_polygon(points, indices, positions)
+
+
+def remove_duplicate_vertices(points: np.ndarray) -> np.ndarray:
+    """ Remove vertices that are equal to their successor """
+    return points[~same_vertices(points, np.roll(points, -1, axis=0))]
+
+
+def same_vertices(points: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """ Check which vertices are equal to the other vertices at the same rows: closer than epsilon in every
+    coordinate, or in robust mode exactly equal like are_equal """
+    if robust:
+        return np.all(points == others, axis=1)
+    return np.all(np.abs(points - others) < epsilon, axis=1)
+
+
+def simplify_polygon(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """ Simplify a closed polygon with the Douglas-Peucker algorithm, processing all open segments of a level at once.
+    Every removed vertex is at most tolerance away from the simplified outline """
+    count = len(points)
+    if count <= 3:
+        return points
+    # split the ring into two chains at the first vertex and the vertex furthest from it
+    far = int(np.argmax(np.sum((points - points[0]) ** 2, axis=1)))
+    ring = np.concatenate([points, points[:1]])
+    keep = np.zeros(count + 1, dtype=bool)
+    keep[[0, far, count]] = True
+    starts, ends = np.array([0, far]), np.array([far, count])
+    while len(starts):
+        lengths = ends - starts - 1
+        inner = lengths > 0
+        starts, ends, lengths = starts[inner], ends[inner], lengths[inner]
+        if len(starts) == 0:
+            break
+        # the vertices between the ends of every segment
+        segments = np.repeat(np.arange(len(starts)), lengths)
+        firsts = np.cumsum(lengths) - lengths
+        indices = np.arange(lengths.sum()) - firsts[segments] + starts[segments] + 1
+        distances = distances_to_segments(ring[indices], ring[starts[segments]], ring[ends[segments]])
+        # split every segment at its furthest vertex if that is too far away
+        furthest = np.lexsort((-distances, segments))[firsts]
+        split = distances[furthest] > tolerance
+        middles = indices[furthest[split]]
+        keep[middles] = True
+        starts, ends = np.concatenate([starts[split], middles]), np.concatenate([middles, ends[split]])
+
+    kept = np.flatnonzero(keep[:count])
+    # a polygon thinner than the tolerance is kept as it is
+    if len(kept) < 3:
+        return points
+    return points[kept]
+
+
+def distances_to_segments(points: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """ Calculate the distance of every point to the segment from its start to its end """
+    directions = ends - starts
+    lengths = np.sum(directions ** 2, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip(np.sum((points - starts) * directions, axis=1) / lengths, 0, 1)
+    t[lengths == 0] = 0
+    return np.linalg.norm(points - (starts + t[:, None] * directions), axis=1)
+
+
+def distances_to_line(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray) -> np.ndarray:
+    """ Calculate the signed distance of every point to a line """
+    offsets = points - line_origin
+    return (offsets[:, 0] * line_normal[0] + offsets[:, 1] * line_normal[1]) / np.linalg.norm(line_normal)
+
+
+def has_tangent_segment(distances: np.ndarray) -> bool:
+    """ Check if both vertices of any polygon segment lie on the line """
+    on_line = np.abs(distances) < epsilon
+    return bool(np.any(on_line & np.roll(on_line, -1)))
+
+
+def intersect_polygon_with_line(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray,
+                                directions: Optional[np.ndarray] = None, denominators: Optional[np.ndarray] = None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """ Find the indices of all segments crossed by a line and the intersection positions, optionally from
+    precomputed segment directions and their dot products with the line normal """
+    if directions is None:
+        directions = np.roll(points, -1, axis=0) - points
+    if denominators is None:
+        denominators = line_normal[0] * directions[:, 0] + line_normal[1] * directions[:, 1]
+    offsets = line_origin - points
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (offsets[:, 0] * line_normal[0] + offsets[:, 1] * line_normal[1]) / denominators
+    # skip segments parallel to the line and intersections outside the segment
+    hit = (np.abs(denominators) >= epsilon) & (t >= 0) & (t <= 1)
+    indices = np.flatnonzero(hit)
+    positions = points[indices] + t[indices, None] * directions[indices]
+    return indices, positions
+
+
+def has_tangent_edge(points: np.ndarray, edges: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray) -> bool:
+    """ Check if both vertices of any of the given polygon segments lie on the line """
+    starts = distances_to_line(points[edges], line_origin, line_normal)
+    ends = distances_to_line(points[(edges + 1) % len(points)], line_origin, line_normal)
+    return bool(np.any((np.abs(starts) < epsilon) & (np.abs(ends) < epsilon)))
+
+
+def intersect_edges_with_line(points: np.ndarray, edges: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray,
+                              directions: Optional[np.ndarray] = None, denominators: Optional[np.ndarray] = None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """ Same as intersect_polygon_with_line for the segments starting at the given sorted vertex indices """
+    starts = points[edges]
+    directions = points[(edges + 1) % len(points)] - starts if directions is None else directions[edges]
+    if denominators is None:
+        denominators = line_normal[0] * directions[:, 0] + line_normal[1] * directions[:, 1]
+    else:
+        denominators = denominators[edges]
+    offsets = line_origin - starts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (offsets[:, 0] * line_normal[0] + offsets[:, 1] * line_normal[1]) / denominators
+    hit = (np.abs(denominators) >= epsilon) & (t >= 0) & (t <= 1)
+    return edges[hit], starts[hit] + t[hit, None] * directions[hit]
+
+
+def exact_height_signs(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray) -> np.ndarray:
+    """ Heights of points along a line normal whose signs are exact: zero only for points exactly on the line
+
+    The heights are computed in floating point with an error bound, only the few heights that are not clearly
+    away from zero are decided with exact rational arithmetic. Heights whose rounded sign was wrong are replaced
+    by the smallest height of the right sign.
+    """
+    products = (points - line_origin) * line_normal
+    heights = products[:, 0] + products[:, 1]
+    uncertain = np.flatnonzero(np.abs(heights) <= height_error_bound * np.abs(products).sum(axis=1))
+    if len(uncertain):
+        metrics.increment("exact_predicates", len(uncertain))
+        signs = np.array([height_sign(x, y, line_origin, line_normal) for x, y in points[uncertain].tolist()])
+        rounded = heights[uncertain]
+        heights[uncertain] = np.where(np.sign(rounded) == signs, rounded, signs * np.finfo(float).tiny)
+    return heights
+
+
+def height_sign(x: float, y: float, line_origin: np.ndarray, line_normal: np.ndarray) -> int:
+    """ Exact sign of the height of a point along a line normal, from the rational values of the floats """
+    (ox, oy), (nx, ny) = line_origin.tolist(), line_normal.tolist()
+    height = (Fraction(x) - Fraction(ox)) * Fraction(nx) + (Fraction(y) - Fraction(oy)) * Fraction(ny)
+    return (height > 0) - (height < 0)
+
+
+def intersect_polygon_with_line_exactly(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray,
+                                        edges: Optional[np.ndarray] = None) -> Tuple[bool, np.ndarray, np.ndarray]:
+    """ Check if a segment lies on a line and find where the polygon crosses it from exact vertex signs, optionally
+    only for the segments starting at the given sorted vertex indices
+
+    A vertex on the line is a crossing of the segment starting at it if its neighbours lie on both sides, vertices
+    that only touch the line are not, so a closed polygon always crosses a line an even number of times.
+    """
+    if edges is None:
+        edges = np.arange(len(points))
+        starts = exact_height_signs(points, line_origin, line_normal)
+        previous, ends = np.roll(starts, 1), np.roll(starts, -1)
+    else:
+        starts = exact_height_signs(points[edges], line_origin, line_normal)
+        previous = exact_height_signs(points[edges - 1], line_origin, line_normal)
+        ends = exact_height_signs(points[(edges + 1) % len(points)], line_origin, line_normal)
+    if np.any((starts == 0) & (ends == 0)):
+        return True, np.empty(0, dtype=int), np.empty((0, 2))
+
+    starts_side, ends_side = np.sign(starts), np.sign(ends)
+    through = (starts == 0) & (np.sign(previous) != ends_side)
+    crossing = (starts_side * ends_side) < 0
+    hit = through | crossing
+    indices = edges[hit]
+    directions = points[(indices + 1) % len(points)] - points[indices]
+    # positions as in intersect_polygon_with_line, the heights decide if they do not round to a valid position
+    offsets = line_origin - points[indices]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (offsets[:, 0] * line_normal[0] + offsets[:, 1] * line_normal[1]) \
+            / (line_normal[0] * directions[:, 0] + line_normal[1] * directions[:, 1])
+    t = np.where(np.isfinite(t), t, starts[hit] / (starts[hit] - ends[hit]))
+    return False, indices, points[indices] + np.clip(t, 0, 1)[:, None] * directions
+
+
+def remove_duplicate_intersections(indices: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Remove intersections that are equal to their successor """
+    equal = np.all(np.abs(positions - np.roll(positions, -1, axis=0)) < epsilon, axis=1)
+    return indices[~equal], positions[~equal]
+
+
+def split_polygon(points: np.ndarray, indices: np.ndarray, positions: np.ndarray) -> List[np.ndarray]:
+    """ Cut a polygon in two at two intersections, see cut_polygon """
+    first, second = indices
+    left_polygon = np.concatenate([points[:first + 1], positions, points[second + 1:]])
+    right_polygon = np.concatenate([positions[:1], points[first + 1:second + 1], positions[1:]])
+    return [left_polygon, right_polygon]
 
-    # convert back to 3D
-    result_polygons = [[Vector3D(x=v.x, y=v.y, z=0) for v in polygon] for polygon in result_polygons]
 
-    return CutResult(info=CutInfo.successful, result_polygons=result_polygons)
+def split_polygon_along_line(points: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray) \
+        -> Tuple[CutInfo, List[np.ndarray]]:
+    """ Cut a polygon with a line into all of its pieces """
+    # the side of a vertex near the line decides how the crossings next to it are ordered, so it has to be exact
+    heights = exact_height_signs(points, line_origin, line_normal)
+    info, strips = slice_polygon_array(points, heights, np.zeros(1), line_normal, line_origin if robust else None)
+    if info != CutInfo.successful:
+        return info, []
+    return info, strips[0] + strips[1]
+
+
+def slice_polygon_array(points: np.ndarray, heights: np.ndarray, offsets: np.ndarray, line_normal: np.ndarray,
+                        line_origin: Optional[np.ndarray] = None) -> Tuple[CutInfo, List[List[np.ndarray]]]:
+    """ Cut a polygon with parallel lines at sorted offsets of the vertex heights into len(offsets) + 1 strips, with
+    line_origin given the heights belong to the single line through it and close crossings are ordered exactly """
+    # strip of every vertex, vertices on a line count as above it so every crossing is found exactly once
+    bands = np.searchsorted(offsets, heights, side="right")
+    next_bands = np.roll(bands, -1)
+    lows = np.minimum(bands, next_bands)
+    counts = np.abs(next_bands - bands)
+    strips = [[] for _ in range(len(offsets) + 1)]
+    if counts.sum() == 0:
+        strips[bands[0]].append(points)
+        return CutInfo.success_no_cut, strips
+
+    # crossings in the order they are passed when walking along the polygon
+    edges = np.repeat(np.arange(len(points)), counts)
+    upward = np.repeat(next_bands > bands, counts)
+    steps = np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+    lines = np.where(upward, np.repeat(lows, counts) + steps, np.repeat(lows + counts - 1, counts) - steps)
+    positions, along, slopes, nears = line_crossings(points, heights, edges, offsets[lines], line_normal)
+
+    # along every line, a simple polygon is alternately entered and left. crossings at the same position pass the
+    # same vertex and are ordered as if the line was moved slightly past it, away from the band of the vertex
+    ties = np.where(bands[nears] > lines, -slopes, slopes)
+    order = np.lexsort((ties, along, lines))
+    if line_origin is not None:
+        order = order_crossings_exactly(points, edges, order, along, line_origin, line_normal)
+    same_line = lines[order][1:] == lines[order][:-1]
+    if np.any(same_line & (upward[order][1:] == upward[order][:-1])):
+        return CutInfo.failed_polygon_not_convex, []
+
+    # every crossing is connected by a chord to its neighbour along the same line
+    partners = np.empty(len(edges), dtype=int)
+    partners[order[0::2]] = order[1::2]
+    partners[order[1::2]] = order[0::2]
+
+    # the part of the polygon after a crossing lies above the line if the crossing is upward
+    arc_bands = lines + upward
+    pieces, arcs = split_polygon_at_crossings(points, edges, positions, partners)
+    for piece, arc in zip(pieces, arcs):
+        # drop the zero-area pieces of vertices that only touch a line
+        if not np.all(piece == piece[0]):
+            strips[arc_bands[arc]].append(piece)
+    if sum(1 for strip in strips if strip) < 2:
+        return CutInfo.success_no_cut, strips
+    return CutInfo.successful, strips
+
+
+def line_crossings(points: np.ndarray, heights: np.ndarray, edges: np.ndarray, offsets: np.ndarray,
+                   line_normal: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Find where the given segments cross the lines at the given heights, the position along the lines, the
+    change of that position with the line height and the vertex of every segment nearer to its line """
+    ends = (edges + 1) % len(points)
+    directions = points[ends] - points[edges]
+    rises = heights[ends] - heights[edges]
+    # crossings are measured from the nearer vertex, so crossings next to a vertex coincide with it
+    nears = np.where(np.abs(heights[ends] - offsets) < np.abs(heights[edges] - offsets), ends, edges)
+    lifts = offsets - heights[nears]
+    positions = points[nears] + (lifts / rises)[:, None] * directions
+
+    line_direction = np.array([-line_normal[1], line_normal[0]])
+    slopes = (directions @ line_direction) / rises
+    along = points[nears] @ line_direction + lifts * slopes
+    return positions, along, slopes, nears
+
+
+def order_crossings_exactly(points: np.ndarray, edges: np.ndarray, order: np.ndarray, along: np.ndarray,
+                            line_origin: np.ndarray, line_normal: np.ndarray) -> np.ndarray:
+    """ Sort the runs of crossings of a line whose rounded positions along it are too close to tell apart by their
+    exact rational positions, crossings at the same position by the exact slope as for a vertex above the line """
+    along = along[order]
+    close = np.diff(along) <= 1e-9 * (1 + np.abs(along[1:]))
+    if not np.any(close):
+        return order
+    (ox, oy), (nx, ny) = line_origin.tolist(), line_normal.tolist()
+    ox, oy, nx, ny = Fraction(ox), Fraction(oy), Fraction(nx), Fraction(ny)
+
+    def key(edge: int) -> Tuple[Fraction, Fraction]:
+        (ax, ay), (bx, by) = points[edge].tolist(), points[(edge + 1) % len(points)].tolist()
+        start = (Fraction(ax) - ox) * nx + (Fraction(ay) - oy) * ny
+        rise = (Fraction(bx) - ox) * nx + (Fraction(by) - oy) * ny - start
+        start_along, run = Fraction(ay) * nx - Fraction(ax) * ny, (Fraction(by) - Fraction(ay)) * nx \
+            - (Fraction(bx) - Fraction(ax)) * ny
+        return start_along - start * run / rise, -run / rise
+
+    order = order.copy()
+    runs = np.concatenate([[0], np.cumsum(~close)])
+    for run in np.unique(runs[1:][close]):
+        members = np.flatnonzero(runs == run)
+        metrics.increment("exact_predicates", len(members))
+        order[members] = sorted(order[members].tolist(), key=lambda crossing: key(edges[crossing]))
+    return order
+
+
+def split_polygon_at_crossings(points: np.ndarray, edges: np.ndarray, positions: np.ndarray,
+                               partners: np.ndarray) -> Tuple[List[np.ndarray], List[int]]:
+    """ Split a polygon into pieces at crossings on the given segments connected by chords to their partners
+
+    Returns the pieces and the first arc, the part of the polygon after a crossing, of every piece.
+    """
+    count = len(edges)
+    pieces = []
+    starts = []
+    visited = np.zeros(count, dtype=bool)
+    for start in range(count):
+        # each piece alternates between arcs of the polygon and chords between crossings
+        parts = []
+        arc = start
+        while not visited[arc]:
+            visited[arc] = True
+            end = (arc + 1) % count
+            parts.append(positions[arc:arc + 1])
+            if end > arc:
+                parts.append(points[edges[arc] + 1:edges[end] + 1])
+            else:
+                parts.append(points[edges[arc] + 1:])
+                parts.append(points[:edges[end] + 1])
+            parts.append(positions[end:end + 1])
+            arc = partners[end]
+        if parts:
+            pieces.append(np.concatenate(parts))
+            starts.append(start)
+    return pieces, starts
 
 
 def cut_polygon(polygon: List[Vector2D], first: Intersection, second: Intersection) -> List[List[Vector2D]]:
@@ -99,6 +911,14 @@ def intersect_curve_with_line(curve_start: Vector2D, curve_end: Vector2D, line_o
 
     c_direction = c_end - c_start
     denominator = np.dot(l_normal, c_direction)
+    if robust:
+        start, end = exact_height_signs(np.array([c_start, c_end]), l_origin, l_normal)
+        if start == end == 0 or np.sign(start) * np.sign(end) > 0:
+            # segment lies on the line or on one side of it
+            return None
+        t = np.dot(l_origin - c_start, l_normal) / denominator if denominator != 0 else start / (start - end)
+        intersection = c_start + min(max(t, 0.0), 1.0) * c_direction
+        return Vector2D(x=intersection[0], y=intersection[1])
     if abs(denominator) < epsilon:
         # line is parallel to plane
         return None
@@ -121,6 +941,9 @@ def is_line_tangent_to_poly_segment(polygon: List[Vector2D], line_origin: Vector
 
 def is_point_on_line(point: Vector2D, line_origin: Vector2D, line_normal: Vector2D) -> bool:
     """ Check if a point is on a line """
+    if robust:
+        return height_sign(point.x, point.y, np.array([line_origin.x, line_origin.y]),
+                           np.array([line_normal.x, line_normal.y])) == 0
     distance = distance_to_line(point, line_origin, line_normal)
     return abs(distance) < epsilon
 
@@ -137,4 +960,6 @@ def distance_to_line(point: Vector2D, line_origin: Vector2D, line_normal: Vector
 
 def are_equal(v1: Vector2D, v2: Vector2D) -> bool:
     """ Check if two vectors are equal """
+    if robust:
+        return v1.x == v2.x and v1.y == v2.y
     return abs(v1.x - v2.x) < epsilon and abs(v1.y - v2.y) < epsilon
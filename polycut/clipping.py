@@ -0,0 +1,235 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from polycut import metrics
+from polycut.calculations import PreparedPolygon, epsilon, remove_duplicate_vertices
+from polycut.models import ClipOperation, ClipRequest, CutInfo, CutResult
+from polycut.spatial import box_levels, branching
+
+
+def try_clip_polygon(request: ClipRequest) -> CutResult:
+    """ Try to intersect, subtract or unite a subject polygon and a clip polygon on the same plane """
+    subject = PreparedPolygon(request.subject)
+    if subject.info is not None:
+        return CutResult(info=subject.info, result_polygons=[])
+    # the clip polygon is cut in the frame of the subject
+    coordinates = request.clip.coordinates
+    if len(coordinates) and np.any(np.abs(subject.frame.distances(coordinates)) >= epsilon):
+        return CutResult(info=CutInfo.failed_polygon_not_planar, result_polygons=[])
+    clip = remove_duplicate_vertices(subject.frame.to_2d(coordinates))
+    if len(subject.points) < 3 or len(clip) < 3:
+        return CutResult(info=CutInfo.failed_polygon_less_than_three_vertices, result_polygons=[])
+
+    with metrics.stage("clip"):
+        info, rings = clip_polygon_array(subject.points, clip, request.operation)
+    metrics.record_cut(len(subject.points) + len(clip), info)
+    return CutResult(info=info, result_polygons=subject.to_polygons(rings))
+
+
+def clip_polygon_array(subject: np.ndarray, clip: np.ndarray, operation: ClipOperation) \
+        -> Tuple[CutInfo, List[np.ndarray]]:
+    """ Combine two simple (N, 2) polygons with the Greiner-Hormann algorithm
+
+    The outlines of the result are counter-clockwise and its holes clockwise. Outlines that touch each other at a
+    vertex or share a segment are reported as failures instead of being resolved.
+    """
+    # with both polygons counter-clockwise, holes come out clockwise
+    if signed_area(subject) < 0:
+        subject = subject[::-1]
+    if signed_area(clip) < 0:
+        clip = clip[::-1]
+
+    with metrics.stage("intersections"):
+        info, subject_edges, clip_edges, alphas, betas = find_crossings(subject, clip)
+    if info is not None:
+        return info, []
+
+    if len(subject_edges) == 0:
+        return CutInfo.success_no_cut, combine_separate(subject, clip, operation)
+
+    # the crossings in the order they are passed along each polygon
+    points = subject[subject_edges] + alphas[:, None] * (np.roll(subject, -1, axis=0)[subject_edges]
+                                                         - subject[subject_edges])
+    subject_walk = Walk(subject, subject_edges, alphas, points)
+    clip_walk = Walk(clip, clip_edges, betas, points)
+
+    # a crossing enters the other polygon if the walk was outside before it, the operation decides where to go on
+    subject_walk.set_entries(inside_polygon(subject[:1], clip)[0] != (operation != ClipOperation.intersection))
+    clip_walk.set_entries(inside_polygon(clip[:1], subject)[0] != (operation == ClipOperation.union))
+
+    rings = []
+    visited = np.zeros(len(points), dtype=bool)
+    for start in subject_walk.order:
+        if visited[start]:
+            continue
+        parts = []
+        crossing, walk = start, subject_walk
+        while not visited[crossing]:
+            visited[crossing] = True
+            part, crossing = walk.run(crossing)
+            parts.append(part)
+            walk = clip_walk if walk is subject_walk else subject_walk
+        # rings started backward along the subject are traced in reverse
+        ring = np.concatenate(parts)
+        rings.append(ring if subject_walk.entries[start] else ring[::-1])
+    return CutInfo.successful, rings
+
+
+class Walk:
+    """ The vertices and crossings of one polygon in the order they are passed when walking along it """
+    __slots__ = ("points", "crossing_positions", "order", "ranks", "entries")
+
+    def __init__(self, polygon: np.ndarray, edges: np.ndarray, positions: np.ndarray, crossings: np.ndarray):
+        # every crossing comes after the start vertex of its edge, crossings on one edge by their position on it
+        order = np.lexsort((positions, edges))
+        self.order = order
+        self.ranks = np.empty(len(order), dtype=int)
+        self.ranks[order] = np.arange(len(order))
+        self.crossing_positions = np.empty(len(order), dtype=int)
+        self.crossing_positions[order] = edges[order] + np.arange(len(order)) + 1
+        self.points = np.insert(polygon, edges[order] + 1, crossings[order], axis=0)
+        self.entries = np.zeros(len(order), dtype=bool)
+
+    def set_entries(self, start_inside: bool):
+        """ Mark the crossings that enter the other polygon, given whether the walk starts inside it """
+        self.entries = (self.ranks % 2 == 0) != start_inside
+
+    def run(self, crossing: int) -> Tuple[np.ndarray, int]:
+        """ Walk from a crossing to the next one, forward after entering crossings and backward after leaving
+        ones, and return the points from the crossing up to the next one and the next crossing """
+        count = len(self.order)
+        start = self.crossing_positions[crossing]
+        if self.entries[crossing]:
+            following = self.order[(self.ranks[crossing] + 1) % count]
+            stop = self.crossing_positions[following]
+            part = self.points[start:stop] if stop > start else np.concatenate([self.points[start:],
+                                                                                self.points[:stop]])
+        else:
+            following = self.order[(self.ranks[crossing] - 1) % count]
+            stop = self.crossing_positions[following]
+            part = self.points[stop + 1:start + 1][::-1] if stop < start \
+                else np.concatenate([self.points[:start + 1][::-1], self.points[stop + 1:][::-1]])
+        return part, following
+
+
+def combine_separate(subject: np.ndarray, clip: np.ndarray, operation: ClipOperation) -> List[np.ndarray]:
+    """ Combine two polygons whose outlines do not cross """
+    subject_in_clip = inside_polygon(subject[:1], clip)[0]
+    clip_in_subject = inside_polygon(clip[:1], subject)[0]
+    if operation == ClipOperation.intersection:
+        return [subject] if subject_in_clip else [clip] if clip_in_subject else []
+    if operation == ClipOperation.union:
+        return [clip] if subject_in_clip else [subject] if clip_in_subject else [subject, clip]
+    # the clip polygon becomes a hole of the subject
+    return [] if subject_in_clip else [subject, clip[::-1]] if clip_in_subject else [subject]
+
+
+def find_crossings(subject: np.ndarray, clip: np.ndarray) \
+        -> Tuple[CutInfo, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Find where the edges of two polygons cross, as the edge indices and the positions along both edges
+
+    Returns a failure if a vertex of one polygon lies on the outline of the other or if edges overlap.
+    """
+    subject_ends = np.roll(subject, -1, axis=0)
+    clip_ends = np.roll(clip, -1, axis=0)
+    subject_edges, clip_edges = overlapping_boxes(np.minimum(subject, subject_ends), np.maximum(subject, subject_ends),
+                                                  np.minimum(clip, clip_ends), np.maximum(clip, clip_ends), epsilon)
+
+    starts, directions = subject[subject_edges], subject_ends[subject_edges] - subject[subject_edges]
+    clip_starts, clip_directions = clip[clip_edges], clip_ends[clip_edges] - clip[clip_edges]
+    lengths = np.linalg.norm(directions, axis=1)
+    clip_lengths = np.linalg.norm(clip_directions, axis=1)
+    offsets = clip_starts - starts
+    denominators = cross(directions, clip_directions)
+    parallel = np.abs(denominators) < epsilon * lengths * clip_lengths
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alphas = cross(offsets, clip_directions) / denominators
+        betas = cross(offsets, directions) / denominators
+
+    # parallel edges overlap if they lie on one line and their projections onto it overlap
+    on_line = parallel & (np.abs(cross(offsets, directions)) < epsilon * lengths)
+    if np.any(on_line):
+        along = np.einsum("ij,ij->i", offsets, directions) / lengths
+        clip_along = along + np.einsum("ij,ij->i", clip_directions, directions) / lengths
+        overlap = np.minimum(lengths, np.maximum(along, clip_along)) - np.maximum(0, np.minimum(along, clip_along))
+        if np.any(on_line & (overlap > epsilon)):
+            return CutInfo.failed_overlapping_segments, *empty_crossings()
+        if np.any(on_line & (overlap > -epsilon)):
+            return CutInfo.failed_vertex_on_boundary, *empty_crossings()
+
+    # positions within epsilon of an end of either edge mean that a vertex touches the other outline
+    tolerances, clip_tolerances = epsilon / lengths, epsilon / clip_lengths
+    touching = ~parallel & (alphas > -tolerances) & (alphas < 1 + tolerances) \
+        & (betas > -clip_tolerances) & (betas < 1 + clip_tolerances)
+    crossing = touching & (alphas > tolerances) & (alphas < 1 - tolerances) \
+        & (betas > clip_tolerances) & (betas < 1 - clip_tolerances)
+    if np.any(touching & ~crossing):
+        return CutInfo.failed_vertex_on_boundary, *empty_crossings()
+    return None, subject_edges[crossing], clip_edges[crossing], alphas[crossing], betas[crossing]
+
+
+def empty_crossings() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0), np.empty(0)
+
+
+def overlapping_boxes(lows: np.ndarray, highs: np.ndarray, other_lows: np.ndarray, other_highs: np.ndarray,
+                      margin: float) -> Tuple[np.ndarray, np.ndarray]:
+    """ Find all pairs of boxes from two sets that are closer than margin by descending the box hierarchies over
+    both sets at once, one level at a time, keeping only the pairs of chunks whose boxes are close
+
+    The boxes of consecutive polygon edges are close to each other, so the pairs of chunks stay few unless the
+    outlines come close. Pairs are not ordered.
+    """
+    if len(lows) == 0 or len(other_lows) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    # level 0 are the boxes themselves
+    first_lows, first_highs = box_levels(lows, highs)
+    second_lows, second_highs = box_levels(other_lows, other_highs)
+    first_lows, first_highs = [lows] + first_lows, [highs] + first_highs
+    second_lows, second_highs = [other_lows] + second_lows, [other_highs] + second_highs
+
+    first_level, second_level = len(first_lows) - 1, len(second_lows) - 1
+    firsts, seconds = (pairs.reshape(-1) for pairs in np.meshgrid(np.arange(len(first_lows[first_level])),
+                                                                  np.arange(len(second_lows[second_level])),
+                                                                  indexing="ij"))
+    while True:
+        near = np.all(first_lows[first_level][firsts] <= second_highs[second_level][seconds] + margin, axis=1) \
+            & np.all(second_lows[second_level][seconds] <= first_highs[first_level][firsts] + margin, axis=1)
+        firsts, seconds = firsts[near], seconds[near]
+        if first_level == 0 and second_level == 0:
+            return firsts, seconds
+        # the set on the higher level goes down one level, replacing every chunk by its children
+        if first_level >= second_level:
+            first_level -= 1
+            firsts, seconds = child_pairs(firsts, seconds, len(first_lows[first_level]))
+        else:
+            second_level -= 1
+            seconds, firsts = child_pairs(seconds, firsts, len(second_lows[second_level]))
+
+
+def child_pairs(chunks: np.ndarray, others: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Pair every child of the given chunks with the item the chunk was paired with """
+    items = chunks[:, None] * branching + np.arange(branching)
+    valid = items < limit
+    return items[valid], np.broadcast_to(others[:, None], items.shape)[valid]
+
+
+def cross(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """ z component of the cross products of (N, 2) vectors """
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+
+def signed_area(points: np.ndarray) -> float:
+    """ Area of a polygon, positive if it is counter-clockwise """
+    return 0.5 * float(cross(points, np.roll(points, -1, axis=0)).sum())
+
+
+def inside_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """ Check which points are inside a polygon by counting the edges crossed by a ray in x direction """
+    starts, ends = polygon, np.roll(polygon, -1, axis=0)
+    x, y = points[:, :1], points[:, 1:]
+    straddles = (starts[:, 1] > y) != (ends[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossings = starts[:, 0] + (y - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+    return np.count_nonzero(straddles & (x < crossings), axis=1) % 2 == 1
@@ -0,0 +1,155 @@
+import math
+import struct
+from typing import Tuple
+
+import numpy as np
+
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Polygon, Vector3D
+
+# Binary encoding of cut requests and cuts. All numbers are little-endian and every coordinate
+# buffer starts at a multiple of 8 bytes, so it can be read as a float64 array without copying.
+#
+#   header:   magic "PCUT", version u8, kind u8, 2 bytes padding
+#   request:  plane origin and normal as 6 f8, simplify tolerance f8 or NaN for none, polygon
+#   cut:      id length u32, info length u32, utf-8 id and info padded to 8 bytes, request,
+#             result polygon count u32, removed vertices u32, sizes as u32 padded to 8 bytes, coordinates
+#   polygon:  vertex count u32, 4 bytes padding, vertex count * 3 f8
+#
+# Version 1 had no simplify tolerance and 4 bytes padding instead of the removed vertices, it is still read.
+MEDIA_TYPE = "application/x-polycut"
+MAGIC = b"PCUT"
+VERSION = 2
+KIND_REQUEST = 1
+KIND_CUT = 2
+
+header = struct.Struct("<4sBBxx")
+counts = struct.Struct("<II")
+
+
+def encode_cut_request(request: CutRequest) -> bytes:
+    """ Encode a cut request """
+    return header.pack(MAGIC, VERSION, KIND_REQUEST) + pack_request(request)
+
+
+def decode_cut_request(data: bytes) -> CutRequest:
+    """ Decode a cut request written by encode_cut_request """
+    buffer = memoryview(data)
+    offset, version = unpack_header(buffer, KIND_REQUEST)
+    request, offset = unpack_request(buffer, offset, version)
+    check_end(buffer, offset)
+    return request
+
+
+def encode_cut(cut: Cut) -> bytes:
+    """ Encode a stored cut with its request and result """
+    cut_id = cut.id.encode()
+    info = cut.result.info.value.encode()
+    polygons = cut.result.result_polygons
+    sizes = np.array([len(p) for p in polygons], dtype="<u4")
+    coordinates = np.concatenate([p.coordinates for p in polygons] + [np.empty((0, 3))]).astype("<f8")
+    return b"".join([
+        header.pack(MAGIC, VERSION, KIND_CUT),
+        counts.pack(len(cut_id), len(info)),
+        padded(cut_id + info),
+        pack_request(cut.request),
+        counts.pack(len(polygons), cut.result.removed_vertices),
+        padded(sizes.tobytes()),
+        coordinates.tobytes(),
+    ])
+
+
+def decode_cut(data: bytes) -> Cut:
+    """ Decode a cut written by encode_cut """
+    buffer = memoryview(data)
+    offset, version = unpack_header(buffer, KIND_CUT)
+    id_length, info_length = unpack_counts(buffer, offset)
+    offset += counts.size
+    text = bytes(buffer[offset:offset + id_length + info_length])
+    offset += padded_length(id_length + info_length)
+    request, offset = unpack_request(buffer, offset, version)
+    # the padding of version 1 is zero
+    polygon_count, removed_vertices = unpack_counts(buffer, offset)
+    offset += counts.size
+    sizes = np.frombuffer(buffer, dtype="<u4", count=polygon_count, offset=offset).tolist()
+    offset += padded_length(4 * polygon_count)
+    vertex_count = sum(sizes)
+    coordinates = read_coordinates(buffer, offset, vertex_count)
+    offset += 24 * vertex_count
+    check_end(buffer, offset)
+
+    ends = np.cumsum(sizes, dtype=int).tolist()
+    result_polygons = [Polygon(coordinates[end - size:end]) for size, end in zip(sizes, ends)]
+    try:
+        result = CutResult.construct(info=CutInfo(text[id_length:].decode()), result_polygons=result_polygons,
+                                     removed_vertices=removed_vertices)
+        return Cut.construct(id=text[:id_length].decode(), request=request, result=result)
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("invalid cut id or info")
+
+
+def pack_request(request: CutRequest) -> bytes:
+    """ Pack the plane, simplify tolerance and polygon of a request """
+    origin, normal = request.plane_origin, request.plane_normal
+    tolerance = math.nan if request.simplify_tolerance is None else request.simplify_tolerance
+    plane = struct.pack("<7d", origin.x, origin.y, origin.z, normal.x, normal.y, normal.z, tolerance)
+    polygon = request.polygon.coordinates.astype("<f8")
+    return plane + counts.pack(len(polygon), 0) + polygon.tobytes()
+
+
+def unpack_request(buffer: memoryview, offset: int, version: int = VERSION) -> Tuple[CutRequest, int]:
+    """ Unpack a request written by pack_request and return it with the offset after it """
+    fields = 6 if version == 1 else 7
+    if len(buffer) < offset + 8 * fields:
+        raise ValueError("truncated plane")
+    ox, oy, oz, nx, ny, nz, *tolerance = struct.unpack_from(f"<{fields}d", buffer, offset)
+    offset += 8 * fields
+    tolerance = tolerance[0] if tolerance and not math.isnan(tolerance[0]) else None
+    if tolerance is not None and tolerance < 0:
+        raise ValueError("negative simplify tolerance")
+    vertex_count, _ = unpack_counts(buffer, offset)
+    offset += counts.size
+    polygon = Polygon(read_coordinates(buffer, offset, vertex_count))
+    # the coordinates are plain float64 values, no further validation needed
+    request = CutRequest.construct(polygon=polygon, plane_origin=Vector3D(x=ox, y=oy, z=oz),
+                                   plane_normal=Vector3D(x=nx, y=ny, z=nz), simplify_tolerance=tolerance)
+    return request, offset + 24 * vertex_count
+
+
+def unpack_header(buffer: memoryview, kind: int) -> Tuple[int, int]:
+    """ Check the header and return the offset after it and the version """
+    if len(buffer) < header.size:
+        raise ValueError("truncated header")
+    magic, version, actual_kind = header.unpack_from(buffer, 0)
+    if magic != MAGIC or version not in (1, VERSION) or actual_kind != kind:
+        raise ValueError("unsupported binary format")
+    return header.size, version
+
+
+def unpack_counts(buffer: memoryview, offset: int) -> Tuple[int, int]:
+    """ Unpack a pair of u32 counts """
+    if len(buffer) < offset + counts.size:
+        raise ValueError("truncated counts")
+    return counts.unpack_from(buffer, offset)
+
+
+def read_coordinates(buffer: memoryview, offset: int, vertex_count: int) -> np.ndarray:
+    """ Read vertex coordinates as a read-only view of the buffer """
+    if len(buffer) < offset + 24 * vertex_count:
+        raise ValueError("truncated coordinates")
+    return np.frombuffer(buffer, dtype="<f8", count=3 * vertex_count, offset=offset).reshape(-1, 3)
+
+
+def check_end(buffer: memoryview, offset: int):
+    """ Check that the whole buffer was read """
+    if len(buffer) != offset:
+        raise ValueError("unexpected trailing data")
+
+
+def padded_length(length: int) -> int:
+    """ Round a length up to a multiple of 8 bytes """
+    return (length + 7) // 8 * 8
+
+
+def padded(data: bytes) -> bytes:
+    """ Pad data with zero bytes to a multiple of 8 bytes """
+    return data + bytes(padded_length(len(data)) - len(data))
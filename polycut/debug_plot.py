@@ -1,8 +1,10 @@
-import matplotlib.pyplot as plt
 from polycut.models import Cut, Vector2D
 
 
 def plot_cut(cut: Cut):
+    # matplotlib takes longer to import than the whole server, only load it when plotting
+    import matplotlib.pyplot as plt
+
     fig = plt.figure()
     ax = fig.add_subplot(111)
 
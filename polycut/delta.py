@@ -0,0 +1,65 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from polycut.models import Polygon
+
+
+# Delta encoding of the result polygons of a cut. Most result vertices are vertices of the cut polygon, so
+# every result polygon is written as [start, stop) index ranges into the vertex table made of the polygon
+# vertices followed by `new_points`, the vertices that are not in the polygon:
+#
+#   {"new_points": [{"x": 0.5, "y": 0, "z": 0}, ...], "result_polygons": [[[0, 2], [5, 7], [3, 4]], ...]}
+
+
+def delta_encode(polygon: Polygon, result_polygons: List[Polygon]) -> Tuple[np.ndarray, List[List[List[int]]]]:
+    """ Encode result polygons as the vertices that are not in the polygon and index ranges per result polygon """
+    source = polygon.coordinates
+    sizes = [len(p) for p in result_polygons]
+    vertices = np.concatenate([p.coordinates for p in result_polygons] + [np.empty((0, 3))])
+    if len(vertices) == 0:
+        return np.empty((0, 3)), [[] for _ in sizes]
+
+    # find every result vertex in the polygon by sorting both together, adding 0.0 turns -0.0 into 0.0
+    rows, inverse = np.unique(np.concatenate([source, vertices]) + 0.0, axis=0, return_inverse=True)
+    positions = np.full(len(rows), -1)
+    # the first of equal polygon vertices
+    positions[inverse[:len(source)][::-1]] = np.arange(len(source))[::-1]
+    indices = positions[inverse[len(source):]]
+
+    # vertices not in the polygon are appended to the vertex table once, in the order they first appear
+    new = indices < 0
+    _, firsts, inverse_new = np.unique(inverse[len(source):][new], return_index=True, return_inverse=True)
+    order = np.argsort(firsts)
+    ranks = np.empty(len(order), dtype=int)
+    ranks[order] = np.arange(len(order))
+    indices[new] = len(source) + ranks[inverse_new]
+
+    ranges = []
+    for piece in np.split(indices, np.cumsum(sizes)[:-1]):
+        if len(piece) == 0:
+            ranges.append([])
+            continue
+        # a range ends where the next vertex is not the next one in the vertex table
+        breaks = np.flatnonzero(np.diff(piece) != 1) + 1
+        starts = piece[np.concatenate([[0], breaks])]
+        stops = piece[np.concatenate([breaks - 1, [len(piece) - 1]])] + 1
+        ranges.append(np.column_stack([starts, stops]).tolist())
+    return vertices[new][firsts[order]], ranges
+
+
+def delta_decode(polygon: Polygon, new_points: np.ndarray, ranges: List[List[List[int]]]) -> List[Polygon]:
+    """ Decode result polygons written by delta_encode """
+    table = np.concatenate([polygon.coordinates, np.asarray(new_points, dtype=float).reshape(-1, 3)])
+    return [Polygon(np.concatenate([table[start:stop] for start, stop in piece] + [np.empty((0, 3))]))
+            for piece in ranges]
+
+
+def delta_result(polygon: Polygon, result: dict) -> dict:
+    """ Replace the result polygons of a result dict by their delta encoding """
+    new_points, ranges = delta_encode(polygon, result["result_polygons"])
+    result = dict(result)
+    result["new_points"] = Polygon(new_points)
+    result["result_polygons"] = ranges
+    return result
+
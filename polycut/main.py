@@ -1,13 +1,165 @@
+import asyncio
+import json
+import os
 from uuid import uuid4
 
-from typing import List
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import BrokenExecutor, Executor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional, Tuple, TypeVar
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
 
-from polycut.calculations import try_cut_polygon
-from polycut.models import CutResult, CutRequest, Cut, CutInfo, CutRequestUpdate
+from polycut import bulk, codec, metrics
+from polycut.cache import CutCache, PreparedCache, request_key
+from polycut.calculations import PreparedPolygon, cut_prepared_polygon, try_cut_polygons, try_slice_polygon
+from polycut.clipping import try_clip_polygon
+from polycut.delta import delta_result
+from polycut.mesh import try_cut_mesh
+from polycut.models import CutResult, CutRequest, Cut, CutInfo, CutRequestUpdate, BatchCutRequest, BatchCutItem, \
+    ClipRequest, MeshCutRequest, MeshCutResult, Polygon, ResultEncoding, SliceRequest, SliceResult
+from polycut.pool import CutExecutor, PoolFullError, WorkerCrashedError
+from polycut.storage import CutStore, StoreBusyError, open_store
+
+NDJSON = "application/x-ndjson"
+T = TypeVar("T")
 
 app = FastAPI()
-db: dict[str, Cut] = {}
+# in-process dict by default, set POLYCUT_STORE=sqlite:///<path> to share cuts between workers
+db: CutStore = open_store(os.environ.get("POLYCUT_STORE"))
+cache = CutCache(max_entries=int(os.environ.get("POLYCUT_CACHE_ENTRIES", 1024)),
+                 max_vertices=int(os.environ.get("POLYCUT_CACHE_VERTICES", 1_000_000)))
+# prepared polygons of recently updated cuts, so dragging the plane of a cut does not prepare its polygon again
+prepared = PreparedCache(max_entries=int(os.environ.get("POLYCUT_PREPARED_ENTRIES", 64)))
+# polygons with at least POLYCUT_OFFLOAD_VERTICES vertices are cut in worker processes
+executor = CutExecutor(threshold=int(os.environ.get("POLYCUT_OFFLOAD_VERTICES", 20_000)),
+                       workers=int(os.environ.get("POLYCUT_POOL_WORKERS", 0)) or None,
+                       max_pending=int(os.environ.get("POLYCUT_POOL_QUEUE", -1)))
+# requests of a bulk cut sent to a worker process at a time
+bulk_chunk_size = int(os.environ.get("POLYCUT_BULK_CHUNK", 1000))
+# set POLYCUT_WARM_UP=0 to skip the warm-up request when a worker starts
+warm_up_on_startup = os.environ.get("POLYCUT_WARM_UP", "1") == "1"
+warm_up_body = json.dumps({
+    "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}],
+    "plane_normal": {"x": 1, "y": 0, "z": 0},
+    "plane_origins": [{"x": 0.5, "y": 0, "z": 0}],
+}).encode()
+
+
+@app.on_event("startup")
+async def warm_up():
+    """ Send one slice request through the app, so the first request of a new worker does not pay for the routing,
+    validation and serialization code running for the first time; slices are not stored """
+    if not warm_up_on_startup:
+        return
+    path = "/api/poly-cut/slice"
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "client": None,
+             "server": None, "headers": [(b"content-type", b"application/json")]}
+
+    async def receive():
+        return {"type": "http.request", "body": warm_up_body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+    # the warm-up cut is not a request to count
+    metrics.reset()
+
+
+@app.exception_handler(StoreBusyError)
+async def store_busy(request: Request, error: StoreBusyError):
+    """ Ask clients to retry when every connection of the store stayed in use """
+    return JSONResponse(status_code=503, content={"detail": "Store busy"}, headers={"Retry-After": "1"})
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """ Stop the worker processes """
+    executor.shutdown()
+
+
+async def cut_polygon(request: CutRequest) -> CutResult:
+    """ Cut a polygon through the cache, large polygons in a worker process """
+    # hashing a large polygon takes long enough to hold up other requests
+    key = await run_in_threadpool(request_key, request)
+    result = cache.get(key)
+    if result is None:
+        result = await offload_cut(request)
+        cache.put(key, request, result)
+    return result
+
+
+@contextmanager
+def pool_errors():
+    """ Answer work that the worker pool could not take or finish with 503 """
+    try:
+        yield
+    except PoolFullError:
+        raise HTTPException(status_code=503, detail="Too many large cuts in progress", headers={"Retry-After": "1"})
+    except WorkerCrashedError:
+        # the cuts that were running in the pool fail with it, retrying them starts a new pool
+        raise HTTPException(status_code=503, detail="Worker process crashed", headers={"Retry-After": "1"})
+
+
+async def offload_cut(request: CutRequest) -> CutResult:
+    """ Cut a polygon, in a worker process if it is large and the pool has room for it, in a thread otherwise """
+    with pool_errors(), metrics.stage("compute"):
+        return await executor.cut(request)
+
+
+async def offload(size: int, function: Callable[..., T], *args) -> T:
+    """ Call a function, in a worker process if its input of `size` vertices is large and the pool has room for
+    it, in a thread otherwise """
+    with pool_errors():
+        return await executor.run(size, function, *args)
+
+
+async def recut_polygon(cut_id: str, request: CutRequest) -> CutResult:
+    """ Cut the updated polygon of a stored cut through the cache, reusing the previously prepared polygon """
+    key = await run_in_threadpool(request_key, request)
+    result = cache.get(key)
+    if result is None:
+        result = await run_in_threadpool(recut_prepared_polygon, cut_id, request)
+        if result is None:
+            # while a worker cuts a large polygon from scratch, a thread prepares it for the updates that follow
+            result, polygon = await asyncio.gather(offload_cut(request), run_in_threadpool(
+                PreparedPolygon, request.polygon, request.simplify_tolerance))
+            prepared.put(cut_id, polygon)
+        cache.put(key, request, result)
+    return result
+
+
+def recut_prepared_polygon(cut_id: str, request: CutRequest) -> Optional[CutResult]:
+    """ Cut the updated polygon of a stored cut by patching its prepared polygon, or by preparing it again if it is
+    small; None for large polygons that have to be prepared again """
+    previous = prepared.get(cut_id)
+    tolerance = request.simplify_tolerance
+    polygon = previous.patch(request.polygon, tolerance) if previous is not None else None
+    if polygon is None:
+        if len(request.polygon) >= executor.threshold:
+            return None
+        polygon = PreparedPolygon(request.polygon, tolerance)
+    result = cut_prepared_polygon(polygon, request.plane_origin, request.plane_normal, projected=True, indexed=True)
+    prepared.put(cut_id, polygon)
+    return result
+
+
+def raise_for_cut_info(info: CutInfo):
+    """ Raise an HTTP error for every cut outcome that is not a successful cut """
+    match info:
+        case CutInfo.successful:
+            return
+        case CutInfo.failed_no_intersection | CutInfo.success_no_cut:
+            # nothing to store if the plane misses the polygon
+            raise HTTPException(status_code=400, detail=CutInfo.failed_no_intersection)
+        case _:
+            raise HTTPException(status_code=400, detail=info)
 
 
 @app.get("/")
@@ -19,79 +171,256 @@ def index():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def fetch_metrics():
+    """ Stage timings, vertex counts, cut outcomes and cache counters in the Prometheus text format """
+    return metrics.render() + "\n".join([
+        "# TYPE polycut_cache_hits_total counter", f"polycut_cache_hits_total {cache.hits}",
+        "# TYPE polycut_cache_misses_total counter", f"polycut_cache_misses_total {cache.misses}",
+        "# TYPE polycut_cache_entries gauge", f"polycut_cache_entries {len(cache.entries)}",
+    ]) + "\n"
+
+
+def parse_fields(fields: Optional[str]) -> Optional[dict]:
+    """ Turn comma-separated dotted field names of a cut, like "id,result.info", into the include of Cut.json """
+    if fields is None:
+        return None
+    include = {}
+    for name in fields.split(","):
+        model, target = Cut, include
+        *parents, last = name.strip().split(".")
+        for part in parents + [last]:
+            field = model.__fields__.get(part) if model is not None else None
+            if field is None:
+                raise HTTPException(status_code=400, detail=f"Unknown field {name.strip()}")
+            model = field.type_ if isinstance(field.type_, type) and issubclass(field.type_, BaseModel) else None
+        for part in parents:
+            if target.get(part) is True:
+                break
+            target = target.setdefault(part, {})
+        else:
+            target[last] = True
+    return include
+
+
+def serialize_cut(cut: Cut, include: Optional[dict], encoding: ResultEncoding) -> str:
+    """ Serialize the included fields of a cut as JSON, with the result polygons in the given encoding """
+    if encoding == ResultEncoding.full:
+        return cut.json(include=include)
+    data = cut.dict(include=include)
+    if "result_polygons" in data.get("result", {}):
+        data["result"] = delta_result(cut.request.polygon, data["result"])
+    return json.dumps(data, default=Polygon.to_list)
+
+
 @app.get("/api/poly-cut", response_model=List[Cut])
-def fetch_cuts():
-    """ Fetch all cuts """
-    # return db as list
-    return [cut for cut in db.values()]
+def fetch_cuts(after: Optional[str] = None, offset: int = Query(0, ge=0),
+               limit: Optional[int] = Query(None, ge=1), info: Optional[CutInfo] = None,
+               created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+               fields: Optional[str] = None, encoding: ResultEncoding = ResultEncoding.full,
+               accept: Optional[str] = Header(None)):
+    """ Fetch cuts in creation order, one page after the cut with id `after`, or stream them as NDJSON.
+    `fields` selects fields like "id,result.info" and `encoding=delta` writes the result polygons as index
+    ranges into the cut polygon """
+    include = parse_fields(fields)
+    try:
+        cuts = db.query(after=after, offset=offset, limit=limit, info=info,
+                        created_after=created_after.timestamp() if created_after else None,
+                        created_before=created_before.timestamp() if created_before else None)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unknown cursor")
 
+    if accepts(accept, NDJSON):
+        # one cut per line, straight from the store
+        return StreamingResponse((serialize_cut(cut, include, encoding) + "\n" for cut in cuts), media_type=NDJSON)
 
-@app.post("/api/poly-cut", response_model=str)
-def post_cut_request(request: CutRequest):
+    page = list(cuts)
+    # the stored cuts are already valid, serialize them directly instead of through the response model
+    response = Response(content="[" + ",".join(serialize_cut(cut, include, encoding) for cut in page) + "]",
+                        media_type="application/json")
+    if limit is not None and len(page) == limit:
+        response.headers["X-Next-Cursor"] = page[-1].id
+    return response
+
+
+async def read_cut_request(http_request: Request) -> CutRequest:
+    """ Read a cut request from a JSON or binary body """
+    body = await http_request.body()
+    # parsing a large polygon takes long enough to hold up other requests
+    return await run_in_threadpool(parse_cut_request, body, http_request.headers.get("content-type"))
+
+
+def parse_cut_request(body: bytes, content_type: Optional[str]) -> CutRequest:
+    """ Parse a cut request from a JSON or binary body """
+    with metrics.stage("parse"):
+        if content_type == codec.MEDIA_TYPE:
+            try:
+                return codec.decode_cut_request(body)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        try:
+            return CutRequest.parse_raw(body)
+        except ValidationError as e:
+            raise RequestValidationError([ErrorWrapper(e, ("body",))])
+
+
+def accepts(accept: Optional[str], media_type: str) -> bool:
+    """ Check if an Accept header lists a media type """
+    return accept is not None and media_type in (value.split(";")[0].strip() for value in accept.split(","))
+
+
+@app.post("/api/poly-cut", response_model=str, openapi_extra={"requestBody": {"required": True, "content": {
+    "application/json": {"schema": {"$ref": "#/components/schemas/CutRequest"}},
+    codec.MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+}}})
+async def post_cut_request(background_tasks: BackgroundTasks, request: CutRequest = Depends(read_cut_request)):
     """Post a cut request and return the id of the cut"""
-    result = try_cut_polygon(request)
-    match result.info:
-        case CutInfo.failed_no_intersection:
-            raise HTTPException(status_code=400, detail=str(CutInfo.failed_no_intersection))
-        case CutInfo.failed_line_vertex_tangent:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_line_vertex_tangent)
-        case CutInfo.failed_line_tangent_to_segment:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_line_tangent_to_segment)
-        case CutInfo.failed_cut_plane_not_orthogonal:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_cut_plane_not_orthogonal)
-        case CutInfo.failed_polygon_not_on_xy_plane:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_not_on_xy_plane)
-        case CutInfo.failed_polygon_not_convex:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_not_convex)
-        case CutInfo.failed_polygon_less_than_three_vertices:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_less_than_three_vertices)
-        case CutInfo.successful:
+    result = await cut_polygon(request)
+    raise_for_cut_info(result.info)
+    cut_id = str(uuid4())
+    # large cuts take long to write, and the store may wait for a free connection
+    await run_in_threadpool(store_cut, cut_id, request, result)
+    # after the response is sent, prepare the polygon for the updates that usually follow
+    background_tasks.add_task(prepare_polygon, cut_id, request)
+    return cut_id
+
+
+def prepare_polygon(cut_id: str, request: CutRequest):
+    """ Keep the prepared polygon of a new cut, unless an update prepared a newer one or the cut was deleted """
+    prepared.add(cut_id, PreparedPolygon(request.polygon, request.simplify_tolerance))
+    # deleting a cut removes it from the store before its prepared polygon
+    if cut_id not in db:
+        prepared.pop(cut_id)
+
+
+def store_cut(cut_id: str, request: CutRequest, result: CutResult):
+    """ Store a cut under its id """
+    db[cut_id] = Cut(id=cut_id, request=request, result=result)
+
+
+@app.post("/api/poly-cut/batch", response_model=List[BatchCutItem])
+async def post_batch_cut_request(batch: BatchCutRequest):
+    """Cut many polygons with many planes and return one item per (polygon, plane) pair"""
+    pairs = batch.pairs
+    if pairs is None:
+        pairs = [(i, j) for i in range(len(batch.polygons)) for j in range(len(batch.planes))]
+    # every pair cuts its polygon once
+    size = sum(len(batch.polygons[polygon_index]) for polygon_index, _ in pairs)
+    results = await offload(size, try_cut_polygons, batch.polygons, batch.planes, pairs)
+    content = await run_in_threadpool(store_batch_cuts, batch, pairs, results)
+    return Response(content=content, media_type="application/json")
+
+
+def store_batch_cuts(batch: BatchCutRequest, pairs: List[Tuple[int, int]], results: List[CutResult]) -> str:
+    """ Store the successful cuts of a batch and serialize its items """
+    items = []
+    for (polygon_index, plane_index), result in zip(pairs, results):
+        cut_id = None
+        if result.info == CutInfo.successful:
+            plane = batch.planes[plane_index]
+            # the batch is already validated, skip validating the polygon again for every pair
+            request = CutRequest.construct(polygon=batch.polygons[polygon_index], plane_origin=plane.origin,
+                                           plane_normal=plane.normal)
             cut_id = str(uuid4())
-            cut = Cut(id=cut_id, request=request, result=result)
-            db[cut_id] = cut
-            return cut_id
+            db[cut_id] = Cut(id=cut_id, request=request, result=result)
+        items.append(BatchCutItem(polygon_index=polygon_index, plane_index=plane_index, id=cut_id, result=result))
+    # the results are valid, serialize them directly instead of through the response model
+    return "[" + ",".join(item.json() for item in items) + "]"
+
+
+@app.post("/api/poly-cut/slice", response_model=SliceResult)
+async def post_slice_request(request: SliceRequest):
+    """Cut a polygon with parallel planes and return the strips between them"""
+    result = await offload(len(request.polygon), try_slice_polygon, request)
+    if result.info not in (CutInfo.successful, CutInfo.success_no_cut):
+        raise HTTPException(status_code=400, detail=result.info)
+    # the result is valid, serialize it directly instead of through the response model
+    return Response(content=await run_in_threadpool(result.json), media_type="application/json")
+
+
+@app.post("/api/poly-cut/clip", response_model=CutResult)
+async def post_clip_request(request: ClipRequest):
+    """Intersect, subtract or unite two polygons on the same plane"""
+    result = await offload(len(request.subject) + len(request.clip), try_clip_polygon, request)
+    if result.info not in (CutInfo.successful, CutInfo.success_no_cut):
+        raise HTTPException(status_code=400, detail=result.info)
+    return Response(content=await run_in_threadpool(result.json), media_type="application/json")
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """ Streaming response that is produced while the request body is still read, it does not listen for the client
+    to disconnect because that would consume the request body; a disconnect ends reading the body instead """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/api/poly-cut/bulk", response_class=StreamingResponse, openapi_extra={"requestBody": {
+    "required": True, "content": {NDJSON: {"schema": {"type": "string"}}},
+}})
+async def post_bulk_cut_request(http_request: Request):
+    """Cut newline-delimited cut requests and stream back one result line per request, in order, without storing
+    the cuts"""
+    lines = bulk.read_lines(http_request.stream())
+    # at most two chunks per worker are cut or queued, the body is read no faster than the results are sent
+    pool = executor.process_pool()
+    results = bulk.cut_stream_async(lines, pool, bulk_chunk_size, executor.workers * 2)
+    return BodyStreamingResponse(discard_broken_pool(results, pool), media_type=NDJSON)
+
+
+async def discard_broken_pool(results: AsyncIterator[str], pool: Executor) -> AsyncIterator[str]:
+    """ Pass on streamed results, discarding the pool if a worker died so that later requests start a new one """
+    try:
+        async for result in results:
+            yield result
+    except BrokenExecutor:
+        executor.discard(pool)
+        raise
+
+
+@app.post("/api/poly-cut/mesh", response_model=MeshCutResult)
+async def post_mesh_cut_request(request: MeshCutRequest):
+    """Cut a mesh with a plane and return the parts on both sides of it and the cross-section"""
+    size = len(request.mesh.vertices) + sum(map(len, request.mesh.faces))
+    result = await offload(size, try_cut_mesh, request)
+    if result.info not in (CutInfo.successful, CutInfo.success_no_cut):
+        raise HTTPException(status_code=400, detail=result.info)
+    # the parts are valid by construction, serialize them directly instead of through the response model
+    return Response(content=await run_in_threadpool(result.json), media_type="application/json")
 
 
 @app.put("/api/poly-cut/{id}")
-def put_cut_request(update: CutRequestUpdate):
+async def put_cut_request(update: CutRequestUpdate):
     """Update a cut request"""
-    if update.id not in db.keys():
+    if not await run_in_threadpool(db.__contains__, update.id):
         raise HTTPException(status_code=404, detail="Cut not found")
 
-    result = try_cut_polygon(update.request)
-    match result.info:
-        case CutInfo.failed_no_intersection:
-            raise HTTPException(status_code=400, detail=str(CutInfo.failed_no_intersection))
-        case CutInfo.failed_line_vertex_tangent:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_line_vertex_tangent)
-        case CutInfo.failed_line_tangent_to_segment:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_line_tangent_to_segment)
-        case CutInfo.failed_cut_plane_not_orthogonal:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_cut_plane_not_orthogonal)
-        case CutInfo.failed_polygon_not_on_xy_plane:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_not_on_xy_plane)
-        case CutInfo.failed_polygon_not_convex:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_not_convex)
-        case CutInfo.failed_polygon_less_than_three_vertices:
-            raise HTTPException(status_code=400, detail=CutInfo.failed_polygon_less_than_three_vertices)
-        case CutInfo.successful:
-            cut = Cut(id=update.id, request=update.request, result=result)
-            db[update.id] = cut
-            return update.id
+    result = await recut_polygon(update.id, update.request)
+    raise_for_cut_info(result.info)
+    await run_in_threadpool(store_cut, update.id, update.request, result)
+    return update.id
 
 
-@app.get("/api/poly-cut/{id}", response_model=Cut)
-def fetch_cut(id: str):
-    """Fetch a cut by its id"""
-    if id not in db.keys():
+@app.get("/api/poly-cut/{id}", response_model=Cut, responses={200: {"content": {codec.MEDIA_TYPE: {}}}})
+def fetch_cut(id: str, fields: Optional[str] = None, encoding: ResultEncoding = ResultEncoding.full,
+              accept: Optional[str] = Header(None)):
+    """Fetch a cut by its id, `fields` and `encoding` as for fetching all cuts"""
+    include = parse_fields(fields)
+    if id not in db:
         raise HTTPException(status_code=404, detail="Cut not found")
-    return db[id]
+    cut = db[id]
+    with metrics.stage("serialize"):
+        if accepts(accept, codec.MEDIA_TYPE):
+            return Response(content=codec.encode_cut(cut), media_type=codec.MEDIA_TYPE)
+        # the stored cut is already valid, serialize it directly instead of through the response model
+        return Response(content=serialize_cut(cut, include, encoding), media_type="application/json")
 
 
 @app.delete("/api/poly-cut/{id}")
 def delete_cut(id: str):
     """Delete a cut by its id"""
-    if id not in db.keys():
+    if id not in db:
         raise HTTPException(status_code=404, detail="Cut not found")
     del db[id]
+    prepared.pop(id)
     return None
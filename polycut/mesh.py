@@ -0,0 +1,153 @@
+from collections import defaultdict
+from typing import List, Tuple
+
+import numpy as np
+
+from polycut import metrics
+from polycut.calculations import epsilon
+from polycut.models import CutInfo, Mesh, MeshCutRequest, MeshCutResult, Polygon
+
+# vertices, flat face corners and number of corners of every face
+MeshArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def try_cut_mesh(request: MeshCutRequest) -> MeshCutResult:
+    """ Try to cut an indexed mesh with a plane """
+    mesh = request.mesh
+    vertices = mesh.vertices.coordinates
+    counts = np.fromiter((len(face) for face in mesh.faces), dtype=int, count=len(mesh.faces))
+    corners = np.fromiter((index for face in mesh.faces for index in face), dtype=int, count=counts.sum())
+    origin = np.array([request.plane_origin.x, request.plane_origin.y, request.plane_origin.z])
+    normal = np.array([request.plane_normal.x, request.plane_normal.y, request.plane_normal.z])
+    with metrics.stage("mesh"):
+        info, below, above, sections = cut_mesh_arrays(vertices, corners, counts, origin, normal)
+    metrics.record_cut(len(vertices), info)
+
+    # the parts are valid by construction, skip validating every face again
+    return MeshCutResult.construct(info=info, below=to_mesh(*below), above=to_mesh(*above),
+                                   sections=[Polygon(section) for section in sections])
+
+
+def to_mesh(vertices: np.ndarray, corners: np.ndarray, counts: np.ndarray) -> Mesh:
+    """ Convert mesh arrays to a mesh """
+    corners = corners.tolist()
+    ends = np.cumsum(counts).tolist()
+    faces = [corners[end - count:end] for end, count in zip(ends, counts.tolist())]
+    return Mesh.construct(vertices=Polygon(vertices), faces=faces)
+
+
+def empty_mesh() -> MeshArrays:
+    return np.empty((0, 3)), np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+
+def cut_mesh_arrays(vertices: np.ndarray, corners: np.ndarray, counts: np.ndarray, plane_origin: np.ndarray,
+                    plane_normal: np.ndarray) -> Tuple[CutInfo, MeshArrays, MeshArrays, List[np.ndarray]]:
+    """ Cut a mesh of convex faces with a plane into the parts below and above it and the cross-section polylines
+
+    Every edge shared by several faces is intersected once, and its intersection becomes one vertex of both parts.
+    Faces that only touch the plane belong to the side they lie on, faces in the plane to the part above.
+    """
+    if len(counts) == 0:
+        return CutInfo.success_no_cut, empty_mesh(), empty_mesh(), []
+
+    distances = (vertices - plane_origin) @ plane_normal
+    sides = np.sign(distances).astype(int)
+    sides[np.abs(distances) < epsilon * np.linalg.norm(plane_normal)] = 0
+    corner_sides = sides[corners]
+    if not np.any(corner_sides):
+        return CutInfo.failed_polygon_on_cut_plane, empty_mesh(), empty_mesh(), []
+
+    # every corner starts the edge to the next corner of its face
+    faces = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    following = np.arange(len(corners)) + 1
+    following[starts + counts - 1] = starts
+    ends = corners[following]
+
+    # the same edge of neighbouring faces is only intersected once
+    count = len(vertices)
+    keys, corner_edges = np.unique(np.minimum(corners, ends).astype(np.int64) * count + np.maximum(corners, ends),
+                                   return_inverse=True)
+    lows, highs = keys // count, keys % count
+    crossed = np.flatnonzero(sides[lows] * sides[highs] < 0)
+    t = distances[lows[crossed]] / (distances[lows[crossed]] - distances[highs[crossed]])
+    points = vertices[lows[crossed]] + t[:, None] * (vertices[highs[crossed]] - vertices[lows[crossed]])
+    all_vertices = np.concatenate([vertices, points])
+    crossings = np.full(len(keys), -1)
+    crossings[crossed] = count + np.arange(len(crossed))
+    corner_crossings = crossings[corner_edges]
+
+    positive = np.bincount(faces, weights=corner_sides > 0, minlength=len(counts)) > 0
+    negative = np.bincount(faces, weights=corner_sides < 0, minlength=len(counts)) > 0
+    above_faces = positive | ~negative
+
+    # every corner is followed by the intersection on its edge, if any, which ends up in both parts
+    slots = np.column_stack([corners, corner_crossings]).reshape(-1)
+    slot_faces = np.repeat(faces, 2)
+    crossing = corner_crossings >= 0
+    below = sub_mesh(all_vertices, slots, slot_faces,
+                     interleave(corner_sides <= 0, crossing) & negative[slot_faces], len(counts))
+    above = sub_mesh(all_vertices, slots, slot_faces,
+                     interleave(corner_sides >= 0, crossing) & above_faces[slot_faces], len(counts))
+
+    # a cut face contributes the segment between its two points on the plane, a face with more points is not
+    # convex and its parts would intersect themselves
+    on_plane = interleave(corner_sides == 0, crossing) & (positive & negative)[slot_faces]
+    face_points = np.bincount(slot_faces[on_plane], minlength=len(counts))
+    if np.any(face_points > 2):
+        return CutInfo.failed_polygon_not_convex, empty_mesh(), empty_mesh(), []
+    on_plane &= (face_points == 2)[slot_faces]
+    segments = [slots[on_plane].reshape(-1, 2)]
+    # an edge in the plane is part of the section if it lies between faces on both sides
+    in_plane = (sides[lows] == 0) & (sides[highs] == 0) \
+        & (np.bincount(corner_edges, weights=positive[faces], minlength=len(keys)) > 0) \
+        & (np.bincount(corner_edges, weights=negative[faces], minlength=len(keys)) > 0)
+    segments.append(np.column_stack([lows[in_plane], highs[in_plane]]))
+    segments = np.unique(np.sort(np.concatenate(segments), axis=1), axis=0)
+    segments = segments[segments[:, 0] != segments[:, 1]]
+    sections = [all_vertices[chain] for chain in chain_segments(segments)]
+
+    # faces in the plane alone do not make a cut
+    info = CutInfo.successful if np.any(positive) and np.any(negative) else CutInfo.success_no_cut
+    return info, below, above, sections
+
+
+def interleave(corner_mask: np.ndarray, crossing_mask: np.ndarray) -> np.ndarray:
+    """ Mask of the slots of the corners and of the intersections following them """
+    return np.column_stack([corner_mask, crossing_mask]).reshape(-1)
+
+
+def sub_mesh(vertices: np.ndarray, slots: np.ndarray, slot_faces: np.ndarray, keep: np.ndarray, face_count: int) \
+        -> MeshArrays:
+    """ Mesh of the kept face corners, with only the vertices it uses """
+    counts = np.bincount(slot_faces[keep], minlength=face_count)
+    used, corners = np.unique(slots[keep], return_inverse=True)
+    return vertices[used], corners, counts[counts > 0]
+
+
+def chain_segments(segments: np.ndarray) -> List[List[int]]:
+    """ Join segments given as (S, 2) vertex indices into polylines, closed ones end with their first vertex """
+    neighbours = defaultdict(list)
+    segments = segments.tolist()
+    for index, (first, second) in enumerate(segments):
+        neighbours[first].append(index)
+        neighbours[second].append(index)
+
+    # open polylines are started at one of their ends, closed ones anywhere
+    starts = [vertex for vertex, indices in neighbours.items() if len(indices) % 2] + [s[0] for s in segments]
+    used = [False] * len(segments)
+    chains = []
+    for start in starts:
+        chain = [start]
+        vertex = start
+        while True:
+            index = next((index for index in neighbours[vertex] if not used[index]), None)
+            if index is None:
+                break
+            used[index] = True
+            first, second = segments[index]
+            vertex = second if first == vertex else first
+            chain.append(vertex)
+        if len(chain) > 1:
+            chains.append(chain)
+    return chains
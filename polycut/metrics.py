@@ -0,0 +1,132 @@
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock
+from typing import Dict, List, Sequence
+
+from polycut.models import CutInfo
+
+# instrumentation is off unless POLYCUT_METRICS=1, a disabled stage costs one function call
+enabled = os.environ.get("POLYCUT_METRICS") == "1"
+
+duration_buckets = [1e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0, 10.0]
+vertex_buckets = [10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+class Histogram:
+    """ Histogram with cumulative buckets like a Prometheus histogram """
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """ Render the histogram in the Prometheus text format """
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum!r}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+lock = Lock()
+stage_durations: Dict[str, Histogram] = {}
+polygon_vertices = Histogram(vertex_buckets)
+cut_outcomes: Counter = Counter()
+counters: Counter = Counter()
+
+
+class StageTimer:
+    """ Context manager that records the duration of a stage """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        with lock:
+            if self.name not in stage_durations:
+                stage_durations[self.name] = Histogram(duration_buckets)
+            stage_durations[self.name].observe(duration)
+
+
+class NullTimer:
+    """ Context manager that does nothing, used while instrumentation is disabled """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+null_timer = NullTimer()
+
+
+def stage(name: str):
+    """ Time a stage of a cut: with stage("tangency"): ... """
+    if not enabled:
+        return null_timer
+    return StageTimer(name)
+
+
+def record_cut(vertices: int, info: CutInfo):
+    """ Record the vertex count and outcome of a cut """
+    if not enabled:
+        return
+    with lock:
+        polygon_vertices.observe(vertices)
+        cut_outcomes[info.value] += 1
+
+
+def increment(name: str, value: int = 1):
+    """ Increment a named counter """
+    if not enabled:
+        return
+    with lock:
+        counters[name] += value
+
+
+def render() -> str:
+    """ Render all metrics in the Prometheus text format """
+    with lock:
+        lines = ["# TYPE polycut_stage_seconds histogram"]
+        for name, histogram in sorted(stage_durations.items()):
+            lines += histogram.render("polycut_stage_seconds", f'stage="{name}"')
+        lines.append("# TYPE polycut_polygon_vertices histogram")
+        lines += polygon_vertices.render("polycut_polygon_vertices", "")
+        lines.append("# TYPE polycut_cut_outcomes_total counter")
+        for info, count in sorted(cut_outcomes.items()):
+            lines.append(f'polycut_cut_outcomes_total{{info="{info}"}} {count}')
+        for name, count in sorted(counters.items()):
+            lines += [f"# TYPE polycut_{name}_total counter", f"polycut_{name}_total {count}"]
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """ Forget all recorded metrics """
+    global polygon_vertices
+    with lock:
+        stage_durations.clear()
+        polygon_vertices = Histogram(vertex_buckets)
+        cut_outcomes.clear()
+        counters.clear()
@@ -1,5 +1,7 @@
-from typing import List
-from pydantic import BaseModel
+from operator import attrgetter, itemgetter
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
+from pydantic import BaseModel, Field, root_validator
 from enum import Enum
 
 
@@ -14,39 +16,221 @@ class Vector3D(BaseModel):
     z: float
 
 
-class CutRequest(BaseModel):
-    polygon: List[Vector3D]
+class Polygon:
+    """ Vertices of a polygon as one (N, 3) float64 array, read and written as a list of Vector3D """
+    __slots__ = ("coordinates",)
+    __hash__ = None
+
+    def __init__(self, coordinates: np.ndarray):
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema):
+        field_schema.update(type="array", items=Vector3D.schema())
+
+    @classmethod
+    def validate(cls, value) -> "Polygon":
+        if isinstance(value, Polygon):
+            return value
+        if isinstance(value, np.ndarray):
+            if value.ndim != 2 or value.shape[1] != 3:
+                raise ValueError("polygon array must have shape (N, 3)")
+            return cls(value)
+        if not isinstance(value, (list, tuple)):
+            raise TypeError("polygon must be a list of vertices")
+        # read the coordinates of JSON objects without creating a model per vertex
+        try:
+            rows = list(map(itemgetter("x", "y", "z"), value))
+        except (KeyError, TypeError):
+            try:
+                rows = list(map(attrgetter("x", "y", "z"), value))
+            except AttributeError:
+                raise ValueError("every vertex needs x, y and z coordinates")
+        try:
+            return cls(np.array(rows, dtype=float))
+        except (TypeError, ValueError):
+            raise ValueError("vertex coordinates must be numbers")
+
+    def to_list(self) -> List[dict]:
+        """ Convert to the JSON shape of a list of Vector3D """
+        return [{"x": x, "y": y, "z": z} for x, y, z in self.coordinates.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.coordinates)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Vector3D, "Polygon"]:
+        if isinstance(index, slice):
+            return Polygon(self.coordinates[index])
+        x, y, z = self.coordinates[index].tolist()
+        return Vector3D(x=x, y=y, z=z)
+
+    def __iter__(self) -> Iterator[Vector3D]:
+        return (Vector3D(x=x, y=y, z=z) for x, y, z in self.coordinates.tolist())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Polygon):
+            return np.array_equal(self.coordinates, other.coordinates)
+        if isinstance(other, list):
+            return len(other) == len(self) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Polygon({self.coordinates.tolist()!r})"
+
+
+class GeometryModel(BaseModel):
+    """ Base for models with polygons, writes polygons in the JSON shape of a list of Vector3D """
+
+    class Config:
+        json_encoders = {Polygon: Polygon.to_list}
+
+
+class CutRequest(GeometryModel):
+    polygon: Polygon
     plane_origin: Vector3D
     plane_normal: Vector3D
+    # if set, the polygon is simplified before cutting, moving its outline by at most this distance
+    simplify_tolerance: Optional[float] = Field(None, ge=0)
 
 
-class CutRequestUpdate(BaseModel):
+class SliceRequest(GeometryModel):
+    polygon: Polygon
+    plane_normal: Vector3D
+    plane_origins: List[Vector3D]
+
+
+class CutRequestUpdate(GeometryModel):
     id: str
     request: CutRequest
 
 
+class Plane(BaseModel):
+    origin: Vector3D
+    normal: Vector3D
+
+
+class BatchCutRequest(GeometryModel):
+    polygons: List[Polygon]
+    planes: List[Plane]
+    # (polygon index, plane index) pairs to cut; all combinations if omitted
+    pairs: Optional[List[Tuple[int, int]]] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_pairs(cls, values):
+        pairs = values.get("pairs")
+        if pairs is not None:
+            for polygon_index, plane_index in pairs:
+                if not (0 <= polygon_index < len(values["polygons"]) and 0 <= plane_index < len(values["planes"])):
+                    raise ValueError(f"pair ({polygon_index}, {plane_index}) is out of range")
+        return values
+
+
+class Mesh(GeometryModel):
+    vertices: Polygon
+    # vertex indices of every face, in the order of the face loop
+    faces: List[List[int]]
+
+    @root_validator(skip_on_failure=True)
+    def check_faces(cls, values):
+        faces = values["faces"]
+        if any(len(face) < 3 for face in faces):
+            raise ValueError("every face needs at least three vertices")
+        if faces:
+            indices = np.fromiter((index for face in faces for index in face), dtype=int)
+            if indices.min() < 0 or indices.max() >= len(values["vertices"]):
+                raise ValueError("face vertex index is out of range")
+        return values
+
+
+class MeshCutRequest(GeometryModel):
+    mesh: Mesh
+    plane_origin: Vector3D
+    plane_normal: Vector3D
+
+
+class ClipOperation(str, Enum):
+    intersection = "intersection"
+    # the subject without the clip polygon
+    difference = "difference"
+    union = "union"
+
+
+class ClipRequest(GeometryModel):
+    subject: Polygon
+    # on the plane of the subject
+    clip: Polygon
+    operation: ClipOperation = ClipOperation.intersection
+
+
 class CutInfo(str, Enum):
     failed_no_intersection = "failed_no_intersection"
     failed_line_vertex_tangent = "failed_line_vertex_tangent"
     failed_line_tangent_to_segment = "failed_line_on_polygon"
+    # no longer reported since polygons and planes may have any orientation, kept for stored cuts
     failed_cut_plane_not_orthogonal = "failed_cut_plane_not_orthogonal"
     failed_polygon_not_on_xy_plane = "failed_polygon_not_on_xy_plane"
+    failed_polygon_not_planar = "failed_polygon_not_planar"
+    failed_polygon_on_cut_plane = "failed_polygon_on_cut_plane"
+    # non-convex polygons are cut into all of their pieces, this is only reported for self-intersecting polygons
     failed_polygon_not_convex = "failed_polygon_not_convex"
     failed_polygon_less_than_three_vertices = "failed_polygon_less_than_three_vertices"
+    # clipping: the outlines touch without crossing or run along each other
+    failed_vertex_on_boundary = "failed_vertex_on_boundary"
+    failed_overlapping_segments = "failed_overlapping_segments"
+    success_no_cut = "success_no_cut"
     successful = "successful"
 
 
-class CutResult(BaseModel):
+class ResultEncoding(str, Enum):
+    full = "full"
+    # result polygons as index ranges into the cut polygon and the new points, see polycut/delta.py
+    delta = "delta"
+
+
+class CutResult(GeometryModel):
     info: CutInfo
-    result_polygons: List[List[Vector3D]]
+    result_polygons: List[Polygon]
+    # vertices removed by simplifying the polygon
+    removed_vertices: int = 0
+    # the plane was found to miss the polygon from its extents alone
+    fast_rejected: bool = False
 
 
-class Cut(BaseModel):
+class SliceResult(GeometryModel):
+    info: CutInfo
+    # pieces between consecutive planes, ordered along the plane normal
+    strips: List[List[Polygon]]
+    # no plane came near the polygon, which was found from its extents alone
+    fast_rejected: bool = False
+
+
+class MeshCutResult(GeometryModel):
+    info: CutInfo
+    # parts of the mesh behind and in front of the plane, seen along the plane normal
+    below: Mesh
+    above: Mesh
+    # cross-section polylines, closed ones end with their first vertex
+    sections: List[Polygon]
+
+
+class Cut(GeometryModel):
     id: str
     request: CutRequest
     result: CutResult
 
 
+class BatchCutItem(GeometryModel):
+    polygon_index: int
+    plane_index: int
+    # id of the stored cut, only set for successful cuts
+    id: Optional[str]
+    result: CutResult
+
+
 class Intersection(BaseModel):
     index: int
     position: Vector2D
@@ -0,0 +1,120 @@
+import asyncio
+import os
+from concurrent.futures import BrokenExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from polycut.calculations import try_cut_polygon
+from polycut.models import CutRequest, CutResult, Polygon, Vector3D
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+T = TypeVar("T")
+
+
+class PoolFullError(Exception):
+    """ Raised when the worker pool has no room for another cut """
+
+
+class WorkerCrashedError(Exception):
+    """ Raised when a worker process died while cuts were running in the pool, which is started again """
+
+
+class CutExecutor:
+    """ Cuts small polygons in threads and offloads large ones to a pool of worker processes """
+
+    def __init__(self, threshold: int, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.threshold = threshold
+        self.workers = workers or os.cpu_count() or 1
+        # by default twice as many cuts as workers may be running or queued
+        self.max_pending = self.workers * 2 if max_pending is None or max_pending < 0 else max_pending
+        self.pending = 0
+        self.pool: Optional["ProcessPoolExecutor"] = None
+
+    async def cut(self, request: CutRequest) -> CutResult:
+        """ Cut a polygon, in a worker process if it has at least `threshold` vertices and in a thread otherwise """
+        if len(request.polygon) < self.threshold:
+            return await asyncio.to_thread(try_cut_polygon, request)
+        if self.pending >= self.max_pending:
+            raise PoolFullError()
+        from multiprocessing import shared_memory
+
+        # hand the coordinates to the worker through shared memory instead of pickling them
+        coordinates = request.polygon.coordinates
+        memory = shared_memory.SharedMemory(create=True, size=max(coordinates.nbytes, 1))
+        try:
+            np.ndarray(coordinates.shape, dtype=float, buffer=memory.buf)[:] = coordinates
+            plane = (request.plane_origin.x, request.plane_origin.y, request.plane_origin.z,
+                     request.plane_normal.x, request.plane_normal.y, request.plane_normal.z)
+            return await self.submit(cut_shared_polygon, memory.name, len(coordinates), plane,
+                                     request.simplify_tolerance)
+        finally:
+            memory.close()
+            memory.unlink()
+
+    async def run(self, size: int, function: Callable[..., T], *args) -> T:
+        """ Call a function, in a worker process if the size of its input is at least `threshold` and in a thread
+        otherwise; the arguments are pickled for the worker """
+        if size < self.threshold:
+            return await asyncio.to_thread(function, *args)
+        return await self.submit(function, *args)
+
+    async def submit(self, function: Callable[..., T], *args) -> T:
+        """ Call a function in a worker process if the pool has room for it """
+        if self.pending >= self.max_pending:
+            raise PoolFullError()
+        pool = self.process_pool()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+        except BrokenExecutor:
+            self.discard(pool)
+            raise WorkerCrashedError()
+        finally:
+            self.pending -= 1
+
+    def process_pool(self) -> "ProcessPoolExecutor":
+        """ The pool of worker processes, started on first use """
+        if self.pool is None:
+            # imported here so that servers that never cut a large polygon start without them
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawned workers do not inherit the threads and sockets of the server
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def discard(self, pool: "ProcessPoolExecutor"):
+        """ Stop a pool that a dead worker broke, it would fail every later cut, the next cut starts a new pool """
+        if self.pool is pool:
+            self.pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """ Stop the worker processes """
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+def cut_shared_polygon(name: str, count: int, plane: Tuple[float, ...], tolerance: Optional[float] = None) \
+        -> CutResult:
+    """ Cut a polygon whose coordinates are in shared memory, runs in a worker process """
+    from multiprocessing import shared_memory
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        return cut_coordinates(np.ndarray((count, 3), dtype=float, buffer=memory.buf), plane, tolerance)
+    finally:
+        memory.close()
+
+
+def cut_coordinates(coordinates: np.ndarray, plane: Tuple[float, ...], tolerance: Optional[float] = None) \
+        -> CutResult:
+    """ Cut a polygon given as an (N, 3) array with a plane given as origin and normal coordinates """
+    origin = Vector3D(x=plane[0], y=plane[1], z=plane[2])
+    normal = Vector3D(x=plane[3], y=plane[4], z=plane[5])
+    request = CutRequest.construct(polygon=Polygon(coordinates), plane_origin=origin, plane_normal=normal,
+                                   simplify_tolerance=tolerance)
+    # the result polygons are new arrays that do not refer to the coordinates
+    return try_cut_polygon(request)
@@ -0,0 +1,31 @@
+"""
+Start the API server for production: no reloading and no access log, every worker process imports only the app
+and warms it up once before it accepts connections.
+
+    python -m polycut.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+
+def main(arguments: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m polycut.serve", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                        help="number of server processes")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args(arguments)
+
+    import uvicorn
+    # the app is passed by name so that a supervising process with several workers does not import it
+    uvicorn.run("polycut.main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level,
+                access_log=False, lifespan="on")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# number of edges in a leaf chunk and of chunks in a parent chunk
+branching = 16
+
+
+class EdgeIndex:
+    """ Bounding box hierarchy over chunks of consecutive polygon edges, which are usually close to each other,
+    to find the few edges a line can cross without testing all of them """
+    __slots__ = ("count", "lows", "highs")
+
+    def __init__(self, points: np.ndarray):
+        self.count = len(points)
+        ends = np.roll(points, -1, axis=0)
+        self.lows, self.highs = box_levels(np.minimum(points, ends), np.maximum(points, ends))
+
+    def query(self, line_origin: np.ndarray, line_normal: np.ndarray, margin: float) -> np.ndarray:
+        """ Sorted indices of all edges whose bounding box is closer than margin to the line, in the scale of the
+        normal, i.e. every edge that crosses or touches the line """
+        chunks = np.arange(len(self.lows[-1]))
+        for level in range(len(self.lows) - 1, -1, -1):
+            chunks = chunks[straddles(self.lows[level][chunks], self.highs[level][chunks], line_origin, line_normal,
+                                      margin)]
+            limit = self.count if level == 0 else len(self.lows[level - 1])
+            chunks = children(chunks, limit)
+        return chunks
+
+    def scale(self) -> float:
+        """ Largest absolute coordinate of any vertex """
+        return float(max(np.abs(self.lows[-1]).max(), np.abs(self.highs[-1]).max()))
+
+    def patched(self, points: np.ndarray, edges: np.ndarray) -> "EdgeIndex":
+        """ Index of the polygon after the given edges changed, recomputing only the boxes that contain them """
+        index = EdgeIndex.__new__(EdgeIndex)
+        index.count = self.count
+        index.lows = [lows.copy() for lows in self.lows]
+        index.highs = [highs.copy() for highs in self.highs]
+
+        chunks = np.unique(edges // branching)
+        members = children(chunks, self.count)
+        ends = points[(members + 1) % self.count]
+        starts = np.searchsorted(members, chunks * branching)
+        index.lows[0][chunks] = np.minimum.reduceat(np.minimum(points[members], ends), starts)
+        index.highs[0][chunks] = np.maximum.reduceat(np.maximum(points[members], ends), starts)
+        for level in range(1, len(self.lows)):
+            chunks = np.unique(chunks // branching)
+            below = children(chunks, len(self.lows[level - 1]))
+            starts = np.searchsorted(below, chunks * branching)
+            index.lows[level][chunks] = np.minimum.reduceat(index.lows[level - 1][below], starts)
+            index.highs[level][chunks] = np.maximum.reduceat(index.highs[level - 1][below], starts)
+        return index
+
+
+def box_levels(lows: np.ndarray, highs: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """ Lower and upper corners of the boxes of a hierarchy over a non-empty sequence of boxes: level 0 are the
+    boxes of chunks of `branching` consecutive boxes, every further level combines `branching` boxes of the one
+    below, up to a top level of at most `branching` boxes """
+    starts = np.arange(0, len(lows), branching)
+    level_lows, level_highs = [np.minimum.reduceat(lows, starts)], [np.maximum.reduceat(highs, starts)]
+    while len(level_lows[-1]) > branching:
+        starts = np.arange(0, len(level_lows[-1]), branching)
+        level_lows.append(np.minimum.reduceat(level_lows[-1], starts))
+        level_highs.append(np.maximum.reduceat(level_highs[-1], starts))
+    return level_lows, level_highs
+
+
+def children(chunks: np.ndarray, limit: int) -> np.ndarray:
+    """ Sorted indices of the items in the next level below the given sorted chunks """
+    items = (chunks[:, None] * branching + np.arange(branching)).reshape(-1)
+    return items[items < limit]
+
+
+def straddles(lows: np.ndarray, highs: np.ndarray, line_origin: np.ndarray, line_normal: np.ndarray,
+              margin: float) -> np.ndarray:
+    """ Check which boxes are closer than margin to the line """
+    centers = ((lows + highs) / 2 - line_origin) @ line_normal
+    radii = ((highs - lows) / 2) @ np.abs(line_normal)
+    return np.abs(centers) <= radii + margin
@@ -0,0 +1,464 @@
+import json
+import os
+import time
+from abc import abstractmethod
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from itertools import islice
+from queue import Empty, Queue
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Polygon, Vector3D
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# columns read by decode_cut
+columns = "id, info, plane, polygon, result_sizes, result, simplify_tolerance, removed_vertices"
+
+
+class StoreBusyError(Exception):
+    """ Raised when no connection of the store became free in time """
+
+
+class CutStore(MutableMapping):
+    """ Storage for cuts by id, iterated in creation order """
+
+    @abstractmethod
+    def created_at(self, cut_id: str) -> float:
+        """ Return the creation time of a stored cut """
+
+    @abstractmethod
+    def query(self, after: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+              info: Optional[CutInfo] = None, created_after: Optional[float] = None,
+              created_before: Optional[float] = None) -> Iterator[Cut]:
+        """ Iterate over matching cuts in creation order, starting after the cut with id `after` """
+
+
+class MemoryStore(CutStore):
+    """ Keeps all cuts in a dict of the current process """
+
+    def __init__(self):
+        self.cuts: Dict[str, Tuple[float, Cut]] = {}
+
+    def __getitem__(self, cut_id: str) -> Cut:
+        return self.cuts[cut_id][1]
+
+    def __setitem__(self, cut_id: str, cut: Cut):
+        # updates keep their creation time
+        created_at = self.cuts[cut_id][0] if cut_id in self.cuts else time.time()
+        self.cuts[cut_id] = (created_at, cut)
+
+    def __delitem__(self, cut_id: str):
+        del self.cuts[cut_id]
+
+    def __contains__(self, cut_id) -> bool:
+        return cut_id in self.cuts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.cuts)
+
+    def __len__(self) -> int:
+        return len(self.cuts)
+
+    def created_at(self, cut_id: str) -> float:
+        return self.cuts[cut_id][0]
+
+    def query(self, after: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+              info: Optional[CutInfo] = None, created_after: Optional[float] = None,
+              created_before: Optional[float] = None) -> Iterator[Cut]:
+        # iterate over a snapshot of the ids, so cuts can be added while a query is streamed
+        ids = list(self.cuts)
+        start = 0
+        if after is not None:
+            if after not in self.cuts:
+                raise KeyError(after)
+            start = ids.index(after) + 1
+        matches = (entry for entry in map(self.cuts.get, islice(ids, start, None)) if entry is not None
+                   and (info is None or entry[1].result.info == info)
+                   and (created_after is None or entry[0] >= created_after)
+                   and (created_before is None or entry[0] < created_before))
+        stop = None if limit is None else offset + limit
+        return (cut for _, cut in islice(matches, offset, stop))
+
+
+class SQLiteStore(CutStore):
+    """ Keeps cuts in an embedded SQLite database that can be shared by several worker processes """
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 5.0, batch_size: int = 100):
+        # imported here so that servers with another store start without it
+        import sqlite3
+        # seconds to wait for a free connection, and rows read with a connection while a query is iterated
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.pool: Queue = Queue()
+        for _ in range(pool_size):
+            connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            # write-ahead logging lets readers and a writer in other processes work concurrently
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.pool.put(connection)
+        with self.connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cuts (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    info TEXT NOT NULL,
+                    plane BLOB NOT NULL,
+                    polygon BLOB NOT NULL,
+                    result_sizes BLOB NOT NULL,
+                    result BLOB NOT NULL,
+                    simplify_tolerance REAL,
+                    removed_vertices INTEGER NOT NULL DEFAULT 0
+                )""")
+            # databases written before simplification lack its columns
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(cuts)")}
+            if "simplify_tolerance" not in existing:
+                connection.execute("ALTER TABLE cuts ADD COLUMN simplify_tolerance REAL")
+                connection.execute("ALTER TABLE cuts ADD COLUMN removed_vertices INTEGER NOT NULL DEFAULT 0")
+            connection.execute("CREATE INDEX IF NOT EXISTS cuts_created_at ON cuts (created_at, id)")
+
+    @contextmanager
+    def connection(self) -> Iterator["sqlite3.Connection"]:
+        """ Borrow a connection from the pool """
+        try:
+            connection = self.pool.get(timeout=self.timeout)
+        except Empty:
+            raise StoreBusyError("no database connection became free in time")
+        try:
+            yield connection
+        finally:
+            self.pool.put(connection)
+
+    def __getitem__(self, cut_id: str) -> Cut:
+        with self.connection() as connection:
+            row = connection.execute(f"SELECT {columns} FROM cuts WHERE id = ?", (cut_id,)).fetchone()
+        if row is None:
+            raise KeyError(cut_id)
+        return decode_cut(*row)
+
+    def __setitem__(self, cut_id: str, cut: Cut):
+        # updates keep their creation time
+        with self.connection() as connection:
+            connection.execute("""
+                INSERT INTO cuts (id, created_at, info, plane, polygon, result_sizes, result, simplify_tolerance,
+                                  removed_vertices)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    info = excluded.info, plane = excluded.plane, polygon = excluded.polygon,
+                    result_sizes = excluded.result_sizes, result = excluded.result,
+                    simplify_tolerance = excluded.simplify_tolerance, removed_vertices = excluded.removed_vertices""",
+                               (cut_id, time.time(), *encode_cut(cut)))
+
+    def __delitem__(self, cut_id: str):
+        with self.connection() as connection:
+            if connection.execute("DELETE FROM cuts WHERE id = ?", (cut_id,)).rowcount == 0:
+                raise KeyError(cut_id)
+
+    def __contains__(self, cut_id) -> bool:
+        with self.connection() as connection:
+            return connection.execute("SELECT 1 FROM cuts WHERE id = ?", (cut_id,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with self.connection() as connection:
+            ids = [row[0] for row in connection.execute("SELECT id FROM cuts ORDER BY created_at, id")]
+        return iter(ids)
+
+    def __len__(self) -> int:
+        with self.connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM cuts").fetchone()[0]
+
+    def values(self) -> Iterator[Cut]:
+        # one query instead of one per id
+        return self.query()
+
+    def query(self, after: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+              info: Optional[CutInfo] = None, created_after: Optional[float] = None,
+              created_before: Optional[float] = None) -> Iterator[Cut]:
+        conditions = []
+        parameters = []
+        if after is not None:
+            created_at = self.created_at(after)
+            conditions.append("(created_at, id) > (?, ?)")
+            parameters += [created_at, after]
+        if info is not None:
+            conditions.append("info = ?")
+            parameters.append(info.value)
+        if created_after is not None:
+            conditions.append("created_at >= ?")
+            parameters.append(created_after)
+        if created_before is not None:
+            conditions.append("created_at < ?")
+            parameters.append(created_before)
+        return self.rows(conditions, parameters, offset, limit)
+
+    def rows(self, conditions: List[str], parameters: list, offset: int, limit: Optional[int]) -> Iterator[Cut]:
+        """ Decode the cuts matching the conditions in creation order, read in batches that each borrow a connection
+        only while they are fetched, so a slowly consumed stream does not keep one from other requests """
+        # the first batch is read right away, so a busy store fails the request before a response is streamed
+        rows = self.fetch(conditions, parameters, offset, limit)
+        return self.continue_rows(rows, conditions, parameters, limit)
+
+    def continue_rows(self, rows: list, conditions: List[str], parameters: list, limit: Optional[int]) \
+            -> Iterator[Cut]:
+        """ Decode fetched rows and fetch the following batches after the last row of the one before """
+        while rows:
+            for row in rows:
+                yield decode_cut(*row[1:])
+            if limit is not None:
+                limit -= len(rows)
+            if len(rows) < self.batch_size or limit == 0:
+                return
+            created_at, cut_id = rows[-1][:2]
+            rows = self.fetch(conditions + ["(created_at, id) > (?, ?)"], parameters + [created_at, cut_id], 0, limit)
+
+    def fetch(self, conditions: List[str], parameters: list, offset: int, limit: Optional[int]) -> list:
+        """ Fetch one batch of matching rows in creation order, each with its creation time in front """
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        size = self.batch_size if limit is None else min(limit, self.batch_size)
+        with self.connection() as connection:
+            return connection.execute(f"""
+                SELECT created_at, {columns} FROM cuts {where}
+                ORDER BY created_at, id LIMIT ? OFFSET ?""", (*parameters, size, offset)).fetchall()
+
+    def created_at(self, cut_id: str) -> float:
+        with self.connection() as connection:
+            row = connection.execute("SELECT created_at FROM cuts WHERE id = ?", (cut_id,)).fetchone()
+        if row is None:
+            raise KeyError(cut_id)
+        return row[0]
+
+    def close(self):
+        """ Close all connections of the pool """
+        while not self.pool.empty():
+            self.pool.get().close()
+
+
+class MappedStore(CutStore):
+    """ Keeps the coordinates of cuts in an append-only file that is memory-mapped for reading, and only their
+    offsets and small fields in memory and in an append-only index file, so stored polygons are read as views of
+    the mapped file and only the parts in use take up memory. Once updated and deleted cuts leave more unused
+    coordinates than compact_threshold bytes and than there are used ones, the live coordinates are copied to a
+    new file. Only one process may use the directory. """
+
+    def __init__(self, directory: str, compact_threshold: int = 64 * 2 ** 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.jsonl")
+        self.compact_threshold = compact_threshold
+        # id -> created at, info, plane, simplify tolerance, removed vertices, offset, polygon size, result sizes
+        self.entries: Dict[str, tuple] = {}
+        # compacted files are numbered, the index names the current one in its first record
+        self.generation = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index:
+                for line in index:
+                    record = json.loads(line)
+                    if "generation" in record:
+                        self.generation = record["generation"]
+                    elif record.get("deleted"):
+                        self.entries.pop(record["id"], None)
+                    else:
+                        self.entries[record["id"]] = tuple(record["entry"])
+        self.coordinates_path = self.generation_path(self.generation)
+        self.coordinates = open(self.coordinates_path, "ab")
+        self.index = open(self.index_path, "a")
+        # number of coordinates in the file that no entry refers to anymore
+        self.unused = self.coordinates.tell() // 8 - sum(map(entry_length, self.entries.values()))
+        self.mapped = np.empty(0, dtype="<f8")
+        self.lock = Lock()
+
+    def __getitem__(self, cut_id: str) -> Cut:
+        entry, mapped = self.locate(cut_id)
+        if entry is None:
+            raise KeyError(cut_id)
+        return self.decode(cut_id, entry, mapped)
+
+    def __setitem__(self, cut_id: str, cut: Cut):
+        request, result = cut.request, cut.result
+        polygons = [request.polygon.coordinates] + [p.coordinates for p in result.result_polygons]
+        origin, normal = request.plane_origin, request.plane_normal
+        with self.lock:
+            # updates keep their creation time, their previous coordinates stay unused in the file
+            created_at = time.time()
+            if cut_id in self.entries:
+                created_at = self.entries[cut_id][0]
+                self.unused += entry_length(self.entries[cut_id])
+            offset = self.coordinates.tell() // 8
+            self.coordinates.write(np.concatenate(polygons).astype("<f8").tobytes())
+            self.coordinates.flush()
+            entry = (created_at, result.info.value, [origin.x, origin.y, origin.z, normal.x, normal.y, normal.z],
+                     request.simplify_tolerance, result.removed_vertices, offset, len(request.polygon),
+                     [len(p) for p in result.result_polygons])
+            self.write_record({"id": cut_id, "entry": entry})
+            self.entries[cut_id] = entry
+            self.compact_if_needed()
+
+    def __delitem__(self, cut_id: str):
+        with self.lock:
+            self.unused += entry_length(self.entries.pop(cut_id))
+            self.write_record({"id": cut_id, "deleted": True})
+            self.compact_if_needed()
+
+    def __contains__(self, cut_id) -> bool:
+        return cut_id in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def created_at(self, cut_id: str) -> float:
+        return self.entries[cut_id][0]
+
+    def query(self, after: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+              info: Optional[CutInfo] = None, created_after: Optional[float] = None,
+              created_before: Optional[float] = None) -> Iterator[Cut]:
+        # iterate over a snapshot of the ids, so cuts can be added while a query is streamed
+        ids = list(self.entries)
+        start = 0
+        if after is not None:
+            if after not in self.entries:
+                raise KeyError(after)
+            start = ids.index(after) + 1
+        located = ((cut_id, *self.locate(cut_id)) for cut_id in islice(ids, start, None))
+        matches = ((cut_id, entry, mapped) for cut_id, entry, mapped in located if entry is not None
+                   and (info is None or entry[1] == info.value)
+                   and (created_after is None or entry[0] >= created_after)
+                   and (created_before is None or entry[0] < created_before))
+        stop = None if limit is None else offset + limit
+        return (self.decode(*match) for match in islice(matches, offset, stop))
+
+    def write_record(self, record: dict):
+        self.index.write(json.dumps(record) + "\n")
+        self.index.flush()
+
+    def generation_path(self, generation: int) -> str:
+        name = "coordinates.f8" if generation == 0 else f"coordinates.{generation}.f8"
+        return os.path.join(self.directory, name)
+
+    def locate(self, cut_id: str) -> Tuple[Optional[tuple], Optional[np.ndarray]]:
+        """ Entry of a cut and a mapping of the file its offsets refer to, or None if there is no such cut """
+        with self.lock:
+            entry = self.entries.get(cut_id)
+            if entry is None:
+                return None, None
+            if entry[5] + entry_length(entry) > len(self.mapped):
+                # earlier mappings stay valid as long as views of them exist, also after compaction removed the file
+                self.mapped = np.memmap(self.coordinates_path, dtype="<f8", mode="r")
+            return entry, self.mapped
+
+    def compact_if_needed(self):
+        """ Copy the used coordinates to a new file and rewrite the index, called with the lock held """
+        used = self.coordinates.tell() // 8 - self.unused
+        if self.unused * 8 <= self.compact_threshold or self.unused <= used:
+            return
+        generation = self.generation + 1
+        path = self.generation_path(generation)
+        mapped = np.memmap(self.coordinates_path, dtype="<f8", mode="r") if used else None
+        entries = {}
+        with open(path, "wb") as coordinates:
+            for cut_id, entry in self.entries.items():
+                offset, length = entry[5], entry_length(entry)
+                entries[cut_id] = entry[:5] + (coordinates.tell() // 8,) + entry[6:]
+                coordinates.write(mapped[offset:offset + length].tobytes())
+            coordinates.flush()
+            os.fsync(coordinates.fileno())
+        # the new index replaces the old one at once, so a crash leaves either file usable
+        index_path = self.index_path + ".new"
+        with open(index_path, "w") as index:
+            index.write(json.dumps({"generation": generation}) + "\n")
+            for cut_id, entry in entries.items():
+                index.write(json.dumps({"id": cut_id, "entry": entry}) + "\n")
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(index_path, self.index_path)
+
+        self.coordinates.close()
+        self.index.close()
+        os.remove(self.coordinates_path)
+        self.generation, self.coordinates_path, self.entries = generation, path, entries
+        self.coordinates = open(path, "ab")
+        self.index = open(self.index_path, "a")
+        self.unused = 0
+        self.mapped = np.empty(0, dtype="<f8")
+
+    def decode(self, cut_id: str, entry: tuple, mapped: np.ndarray) -> Cut:
+        """ Build a cut whose polygons are views of the mapped file """
+        _, info, plane, simplify_tolerance, removed_vertices, offset, size, result_sizes = entry
+        polygons = []
+        for polygon_size in [size] + result_sizes:
+            polygons.append(Polygon(mapped[offset:offset + polygon_size * 3].reshape(-1, 3)))
+            offset += polygon_size * 3
+        # stored data was validated when it was written
+        plane_origin = Vector3D.construct(x=plane[0], y=plane[1], z=plane[2])
+        plane_normal = Vector3D.construct(x=plane[3], y=plane[4], z=plane[5])
+        request = CutRequest.construct(polygon=polygons[0], plane_origin=plane_origin, plane_normal=plane_normal,
+                                       simplify_tolerance=simplify_tolerance)
+        return Cut.construct(id=cut_id, request=request,
+                             result=CutResult.construct(info=CutInfo(info), result_polygons=polygons[1:],
+                                                        removed_vertices=removed_vertices))
+
+    def close(self):
+        """ Close the files, views of the mapped file stay valid """
+        self.coordinates.close()
+        self.index.close()
+
+
+def entry_length(entry: tuple) -> int:
+    """ Number of coordinates of the polygons of a mapped store entry """
+    return (entry[6] + sum(entry[7])) * 3
+
+
+def open_store(url: Optional[str]) -> CutStore:
+    """ Open the store for a url, either "memory", "sqlite:///<path>" or "mmap:///<directory>" """
+    if url is None or url == "memory":
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith("mmap:///"):
+        return MappedStore(url[len("mmap:///"):])
+    raise ValueError(f"unsupported store url {url}")
+
+
+def encode_cut(cut: Cut) -> tuple:
+    """ Encode a cut as (info, plane, polygon, result sizes, result, simplify tolerance, removed vertices) columns,
+    with little-endian binary blobs for the geometry """
+    request = cut.request
+    plane = pack_vertices([request.plane_origin, request.plane_normal])
+    sizes = np.array([len(p) for p in cut.result.result_polygons], dtype="<u4")
+    result = np.concatenate([p.coordinates for p in cut.result.result_polygons] + [np.empty((0, 3))])
+    polygon = request.polygon.coordinates.astype("<f8").tobytes()
+    return cut.result.info.value, plane, polygon, sizes.tobytes(), result.astype("<f8").tobytes(), \
+        request.simplify_tolerance, cut.result.removed_vertices
+
+
+def decode_cut(cut_id: str, info: str, plane: bytes, polygon: bytes, result_sizes: bytes, result: bytes,
+               simplify_tolerance: Optional[float] = None, removed_vertices: int = 0) -> Cut:
+    """ Decode a cut from the columns written by encode_cut """
+    plane_origin, plane_normal = unpack_vertices(plane)
+    # polygons are read-only views of the blobs
+    vertices = np.frombuffer(result, dtype="<f8").reshape(-1, 3)
+    sizes = np.frombuffer(result_sizes, dtype="<u4").tolist()
+    ends = np.cumsum(sizes, dtype=int).tolist()
+    result_polygons = [Polygon(vertices[end - size:end]) for size, end in zip(sizes, ends)]
+    # stored data was validated when it was written
+    request = CutRequest.construct(polygon=Polygon(np.frombuffer(polygon, dtype="<f8")), plane_origin=plane_origin,
+                                   plane_normal=plane_normal, simplify_tolerance=simplify_tolerance)
+    return Cut.construct(id=cut_id, request=request,
+                         result=CutResult.construct(info=CutInfo(info), result_polygons=result_polygons,
+                                                    removed_vertices=removed_vertices))
+
+
+def pack_vertices(vertices: List[Vector3D]) -> bytes:
+    """ Pack vertices as little-endian float64 x, y, z triples """
+    return np.array([[v.x, v.y, v.z] for v in vertices], dtype="<f8").tobytes()
+
+
+def unpack_vertices(data: bytes) -> List[Vector3D]:
+    """ Unpack vertices written by pack_vertices """
+    return [Vector3D.construct(x=x, y=y, z=z) for x, y, z in np.frombuffer(data, dtype="<f8").reshape(-1, 3).tolist()]
@@ -0,0 +1,47 @@
+import numpy as np
+
+from benchmarks.generators import generators, make_request
+from benchmarks import startup
+from benchmarks.run import compare, http_cases, run
+from polycut import main
+from polycut.calculations import try_cut_polygon
+from polycut.models import CutInfo
+
+
+def test_generators_are_reproducible():
+    for shape in generators:
+        first = make_request(shape, 100, seed=3)
+        assert first == make_request(shape, 100, seed=3)
+        assert len(first.polygon) == 100
+        assert np.all(first.polygon.coordinates[:, 2] == 0)
+
+
+def test_generated_polygons_are_cut():
+    for shape in ("convex", "star", "comb"):
+        assert try_cut_polygon(make_request(shape, 100)).info == CutInfo.successful
+    assert len(try_cut_polygon(make_request("comb", 100)).result_polygons) == 25
+
+
+def test_run_and_compare():
+    results = run([10], ["convex"], max_http_size=10, min_time=0)
+    assert {result["case"] for result in results} == {"try_cut_polygon", "slice_16_planes",
+                                                      "intersect_curve_with_line", "post_json", "post_binary",
+                                                      "get_json", "get_binary"}
+    slower = [dict(result, vertices_per_second=result["vertices_per_second"] / 2) for result in results]
+    assert compare(results, results, tolerance=0.25) == []
+    assert len(compare(slower, results, tolerance=0.25)) == len(results)
+
+
+def test_http_posts_are_not_cached():
+    post = http_cases("convex", 10)["post_json"]
+    for _ in range(3):
+        post()
+    assert main.cache.hits == 0
+
+
+def test_startup_benchmark():
+    results = startup.run(repeat=1)
+    assert [result["case"] for result in results] == ["import", "startup", "first_request", "process"]
+    slower = [dict(result, seconds=result["seconds"] * 2) for result in results]
+    assert startup.compare(results, results, tolerance=0.25) == []
+    assert len(startup.compare(slower, results, tolerance=0.25)) == len(results)
@@ -0,0 +1,56 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from polycut import bulk
+from polycut.__main__ import main
+from polycut.models import CutInfo
+
+
+def request_line(origin_x: float) -> bytes:
+    return json.dumps({
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 1, "y": 0, "z": 0}],
+        "plane_origin": {"x": origin_x, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }).encode()
+
+
+def infos(text: str):
+    return [json.loads(line).get("info") for line in text.splitlines()]
+
+
+def test_cut_lines_answers_invalid_requests():
+    results = bulk.cut_lines([request_line(0.5), b"{}", b"not json", request_line(5)])
+    lines = [json.loads(line) for line in results.splitlines()]
+    assert [line.get("info") for line in lines] == [CutInfo.successful, None, None, CutInfo.success_no_cut]
+    assert "detail" in lines[1] and "detail" in lines[2]
+
+
+def test_cut_stream_keeps_order():
+    lines = [request_line(x) for x in (0.5, 5, 0.25, 5, 0.75)] + [b""]
+    expected = infos(bulk.cut_lines(lines[:-1]))
+    with ThreadPoolExecutor(2) as pool:
+        assert infos("".join(bulk.cut_stream(iter(lines), pool, chunk_size=2, max_pending=2))) == expected
+    assert infos("".join(bulk.cut_stream(iter(lines), None, chunk_size=2, max_pending=2))) == expected
+
+
+def test_cut_stream_async_splits_lines_across_chunks():
+    body = b"\n".join(request_line(x) for x in (0.5, 5, 0.25))
+
+    async def chunks():
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    async def run():
+        lines = bulk.read_lines(chunks())
+        return "".join([results async for results in bulk.cut_stream_async(lines, None, 2, 1)])
+
+    assert infos(asyncio.run(run())) == [CutInfo.successful, CutInfo.success_no_cut, CutInfo.successful]
+
+
+def test_command_line(tmp_path):
+    source = tmp_path / "requests.ndjson"
+    source.write_bytes(b"\n".join(request_line(x) for x in (0.5, 5)) + b"\n")
+    target = tmp_path / "results.ndjson"
+    assert main([str(source), "--output", str(target), "--workers", "0"]) == 0
+    assert infos(target.read_text()) == [CutInfo.successful, CutInfo.success_no_cut]
@@ -0,0 +1,101 @@
+import numpy as np
+
+from polycut.cache import CutCache, request_key
+from polycut.calculations import try_cut_polygon
+from polycut.models import CutInfo, CutRequest, CutResult, Vector3D
+
+
+def make_request(polygon, origin_x: float = 0.5) -> CutRequest:
+    return CutRequest(polygon=np.array(polygon, dtype=float).reshape(-1, 3),
+                      plane_origin=Vector3D(x=origin_x, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+
+
+triangle = [[0, 0, 0], [1, 1, 0], [1, 0, 0]]
+
+
+def cached_cut(cache: CutCache, request: CutRequest, compute=try_cut_polygon) -> CutResult:
+    key = request_key(request)
+    result = cache.get(key)
+    if result is None:
+        result = compute(request)
+        cache.put(key, request, result)
+    return result
+
+
+def test_request_key_is_canonical():
+    key = request_key(make_request(triangle))
+    assert request_key(make_request([[0, 0, 0], [0, 0, 0], [1, 1, 0], [1, 0, 0]])) == key
+    assert request_key(make_request([[-0.0, 0, 0], [1, 1, 0], [1, 0, 0]])) == key
+    assert request_key(make_request(triangle, origin_x=0.25)) != key
+    assert request_key(make_request([[1, 1, 0], [1, 0, 0], [0, 0, 0]])) != key
+    assert request_key(make_request([[0, 0, 1], [0, 0, 1]])) != request_key(make_request([]))
+    # the height of the origin moves tilted planes
+    tilted = make_request(triangle)
+    tilted.plane_normal.z = 1
+    lifted = tilted.copy(deep=True)
+    lifted.plane_origin.z = 0.25
+    assert request_key(lifted) != request_key(tilted)
+    simplified = make_request(triangle)
+    simplified.simplify_tolerance = 0.1
+    assert request_key(simplified) != key
+
+
+def test_request_key_of_scaled_normal():
+    key = request_key(make_request(triangle))
+    scaled = make_request(triangle)
+    scaled.plane_normal = Vector3D(x=3, y=0, z=0)
+    assert request_key(scaled) == key
+    diagonal, scaled = make_request(triangle), make_request(triangle)
+    diagonal.plane_normal = Vector3D(x=1, y=1, z=0)
+    scaled.plane_normal = Vector3D(x=2, y=2, z=-0.0)
+    assert request_key(diagonal) == request_key(scaled)
+    scaled.plane_normal = Vector3D(x=-2, y=-2, z=0)
+    assert request_key(diagonal) != request_key(scaled)
+
+
+def test_scaled_normals_give_the_cached_result():
+    request = make_request([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    request.plane_normal = Vector3D(x=1, y=0.25, z=0)
+    for scale in (1e-7, 3, 1e7):
+        scaled = request.copy(deep=True)
+        scaled.plane_normal = Vector3D(x=scale, y=scale / 4, z=0)
+        assert request_key(scaled) == request_key(request)
+        assert try_cut_polygon(scaled) == try_cut_polygon(request)
+
+
+def test_hits_and_misses():
+    cache = CutCache()
+    first = cached_cut(cache, make_request(triangle))
+    second = cached_cut(cache, make_request(triangle))
+    assert first is second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failures_are_cached():
+    cache = CutCache()
+    calls = []
+
+    def compute(request):
+        calls.append(request)
+        return try_cut_polygon(request)
+
+    tangent = make_request(triangle, origin_x=1)
+    assert cached_cut(cache, tangent, compute).info == CutInfo.failed_line_tangent_to_segment
+    assert cached_cut(cache, tangent, compute).info == CutInfo.failed_line_tangent_to_segment
+    assert len(calls) == 1
+
+
+def test_eviction_by_entries_and_vertices():
+    cache = CutCache(max_entries=2)
+    for origin_x in (0.2, 0.4, 0.6):
+        cached_cut(cache, make_request(triangle, origin_x))
+    assert len(cache.entries) == 2
+    cached_cut(cache, make_request(triangle, 0.2))
+    assert cache.hits == 0
+
+    # a cut triangle uses 3 + 4 + 3 vertices
+    cache = CutCache(max_vertices=15)
+    cached_cut(cache, make_request(triangle, 0.2))
+    cached_cut(cache, make_request(triangle, 0.4))
+    assert len(cache.entries) == 1
+    assert cache.vertices == 10
@@ -1,4 +1,8 @@
-from polycut.models import Cut, CutInfo, CutRequest, CutResult, Vector2D
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Plane, SliceRequest, Vector2D, Vector3D
 import polycut.calculations as calc
 
 
@@ -39,3 +43,508 @@ def test_cut_polygon():
     result = calc.cut_polygon(polygon, first, second)
     assert len(result) == 2
     # TODO: check the result
+
+
+def test_remove_duplicate_vertices():
+    points = np.array([[0, 0], [0, 0], [1, 0], [1, 1], [0, 0]], dtype=float)
+    assert calc.remove_duplicate_vertices(points).tolist() == [[0, 0], [1, 0], [1, 1]]
+
+
+def test_has_tangent_segment():
+    points = np.array([[0, 0], [1, 0], [1, 1]], dtype=float)
+    distances = calc.distances_to_line(points, np.array([0, 0]), np.array([1, 1]))
+    assert not calc.has_tangent_segment(distances)
+    distances = calc.distances_to_line(points, np.array([0, 0]), np.array([0, 1]))
+    assert calc.has_tangent_segment(distances)
+
+
+def test_intersect_polygon_with_line_matches_segment_loop():
+    rng = np.random.default_rng(42)
+    points = rng.normal(size=(50, 2))
+    line_origin = np.array([0.1, -0.2])
+    line_normal = np.array([0.3, 1.0])
+    indices, positions = calc.intersect_polygon_with_line(points, line_origin, line_normal)
+
+    expected = []
+    for i, (x, y) in enumerate(points.tolist()):
+        x2, y2 = points[(i + 1) % len(points)].tolist()
+        intersection = calc.intersect_curve_with_line(Vector2D(x=x, y=y), Vector2D(x=x2, y=y2),
+                                                      Vector2D(x=0.1, y=-0.2), Vector2D(x=0.3, y=1.0))
+        if intersection is not None:
+            expected.append((i, [intersection.x, intersection.y]))
+    assert indices.tolist() == [i for i, _ in expected]
+    assert positions.tolist() == [p for _, p in expected]
+
+
+def test_split_polygon_matches_cut_polygon():
+    polygon = [Vector2D(x=0, y=0), Vector2D(x=1, y=0), Vector2D(x=1, y=1), Vector2D(x=0, y=1)]
+    first = calc.Intersection(index=0, position=Vector2D(x=0.5, y=0))
+    second = calc.Intersection(index=2, position=Vector2D(x=.5, y=1))
+    expected = [[[v.x, v.y] for v in p] for p in calc.cut_polygon(polygon, first, second)]
+
+    points = np.array([[v.x, v.y] for v in polygon])
+    result = calc.split_polygon(points, np.array([0, 2]), np.array([[0.5, 0], [0.5, 1]]))
+    assert [p.tolist() for p in result] == expected
+
+
+def test_try_cut_polygon_no_cut():
+    request = CutRequest(polygon=[Vector3D(x=0, y=0, z=0), Vector3D(x=1, y=0, z=0), Vector3D(x=1, y=1, z=0)],
+                         plane_origin=Vector3D(x=5, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+    result = calc.try_cut_polygon(request)
+    assert result.info == CutInfo.success_no_cut
+    assert result.result_polygons == []
+    assert result.fast_rejected
+
+
+def test_extents_bound_vertex_heights():
+    rng = np.random.default_rng(2)
+    points = rng.normal(size=(200, 2)) * [3, 1] + [10, -5]
+    extents = calc.Extents(points)
+    for normal in rng.normal(size=(100, 2)):
+        heights = points @ normal
+        assert heights.max() <= extents.highest(normal) + 1e-9
+    # along the sampled directions the bound is exact
+    assert np.isclose(extents.highest(np.array([0.0, -2.0])), -2 * points[:, 1].min())
+
+
+def test_fast_reject_matches_full_cut():
+    polygon = calc.PreparedPolygon(star_polygon())
+    for x in np.linspace(-2, 2, 41):
+        origin = np.array([x, 0.3])
+        normal = np.array([1.0, 0.4])
+        result = calc.cut_prepared_polygon(polygon, Vector3D(x=x, y=0.3, z=0), Vector3D(x=1, y=0.4, z=0))
+        info, pieces = calc.cut_polygon_array(polygon.points, origin, normal)
+        assert result.info == info
+        assert len(result.result_polygons) == len(pieces)
+        if result.fast_rejected:
+            assert info == CutInfo.success_no_cut
+
+
+def test_try_cut_polygons_matches_single_cuts():
+    square = [Vector3D(x=0, y=0, z=0), Vector3D(x=1, y=0, z=0), Vector3D(x=1, y=1, z=0), Vector3D(x=0, y=1, z=0)]
+    lifted = [Vector3D(x=0, y=0, z=1), Vector3D(x=1, y=0, z=1), Vector3D(x=1, y=1, z=1)]
+    planes = [Plane(origin=Vector3D(x=0.5, y=0, z=0), normal=Vector3D(x=1, y=0, z=0)),
+              Plane(origin=Vector3D(x=5, y=0, z=0), normal=Vector3D(x=1, y=0, z=0)),
+              Plane(origin=Vector3D(x=0, y=0, z=0), normal=Vector3D(x=0, y=0, z=1))]
+    pairs = [(0, 0), (0, 1), (1, 0), (0, 2)]
+    results = calc.try_cut_polygons([square, lifted], planes, pairs)
+    for (polygon_index, plane_index), result in zip(pairs, results):
+        polygon = [square, lifted][polygon_index]
+        request = CutRequest(polygon=polygon, plane_origin=planes[plane_index].origin,
+                             plane_normal=planes[plane_index].normal)
+        assert result == calc.try_cut_polygon(request)
+    assert [r.info for r in results] == [CutInfo.successful, CutInfo.success_no_cut, CutInfo.successful,
+                                         CutInfo.failed_polygon_on_cut_plane]
+
+
+def rotation(axis: np.ndarray, angle: float) -> np.ndarray:
+    axis = axis / np.linalg.norm(axis)
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * cross @ cross
+
+
+def to_vector(v: np.ndarray) -> Vector3D:
+    return Vector3D(x=v[0], y=v[1], z=v[2])
+
+
+def test_cut_rotated_polygon_matches_cut_on_xy_plane():
+    rng = np.random.default_rng(3)
+    u_shape = np.array([[0, 0, 0], [3, 0, 0], [3, 3, 0], [2, 3, 0], [2, 1, 0], [1, 1, 0], [1, 3, 0], [0, 3, 0]],
+                       dtype=float)
+    for _ in range(20):
+        matrix = rotation(rng.normal(size=3), rng.uniform(0, np.pi))
+        shift = rng.uniform(-5, 5, 3)
+        origin, normal = np.array([0, 2, 0]), np.array([0, 1, 0])
+        expected = calc.try_cut_polygon(CutRequest(polygon=u_shape, plane_origin=to_vector(origin),
+                                                   plane_normal=to_vector(normal)))
+        # the plane may be tilted against the polygon as long as it cuts it along the same line
+        tilted = normal + rng.uniform(-0.5, 0.5) * np.array([0, 0, 1])
+        result = calc.try_cut_polygon(CutRequest(polygon=u_shape @ matrix.T + shift,
+                                                 plane_origin=to_vector(matrix @ origin + shift),
+                                                 plane_normal=to_vector(matrix @ tilted)))
+        assert result.info == expected.info == CutInfo.successful
+        assert len(result.result_polygons) == 3
+        for piece, expected_piece in zip(result.result_polygons, expected.result_polygons):
+            assert np.allclose((piece.coordinates - shift) @ matrix, expected_piece.coordinates)
+
+
+def test_cut_polygon_with_tilted_plane():
+    square = [Vector3D(x=0, y=0, z=0), Vector3D(x=2, y=0, z=0), Vector3D(x=2, y=2, z=0), Vector3D(x=0, y=2, z=0)]
+    # cuts the XY plane along x = 1
+    result = calc.try_cut_polygon(CutRequest(polygon=square, plane_origin=Vector3D(x=0, y=0, z=1),
+                                             plane_normal=Vector3D(x=1, y=0, z=1)))
+    assert result.info == CutInfo.successful
+    assert sorted(np.unique(p.coordinates[:, 0]).tolist() for p in result.result_polygons) == [[0, 1], [1, 2]]
+
+
+def test_cut_polygon_with_parallel_plane():
+    triangle = np.array([[0, 0, 1], [1, 0, 2], [0, 1, 1]], dtype=float)
+    normal = Vector3D(x=-1, y=0, z=1)
+    result = calc.try_cut_polygon(CutRequest(polygon=triangle, plane_origin=Vector3D(x=0, y=0, z=0),
+                                             plane_normal=normal))
+    assert result.info == CutInfo.success_no_cut
+    result = calc.try_cut_polygon(CutRequest(polygon=triangle, plane_origin=Vector3D(x=0, y=5, z=1),
+                                             plane_normal=normal))
+    assert result.info == CutInfo.failed_polygon_on_cut_plane
+
+
+def test_prepared_polygon_not_planar():
+    polygon = calc.PreparedPolygon(np.array([[0, 0, 0], [1, 0, 0], [1, 1, 1], [0, 1, 0]], dtype=float))
+    assert polygon.info == CutInfo.failed_polygon_not_planar
+    polygon = calc.PreparedPolygon(np.array([[0, 0, 1], [1, 1, 1], [2, 2, 1]], dtype=float))
+    assert polygon.info == CutInfo.failed_polygon_not_planar
+
+
+def polygon_area(points):
+    return 0.5 * (points[:, 0] @ np.roll(points[:, 1], -1) - points[:, 1] @ np.roll(points[:, 0], -1))
+
+
+def test_cut_non_convex_polygon_into_pieces():
+    u_shape = np.array([[0, 0], [3, 0], [3, 3], [2, 3], [2, 1], [1, 1], [1, 3], [0, 3]], dtype=float)
+    info, pieces = calc.cut_polygon_array(u_shape, np.array([0, 2]), np.array([0, 1]))
+    assert info == CutInfo.successful
+    assert len(pieces) == 3
+    assert sorted(polygon_area(p) for p in pieces) == [1, 1, 5]
+
+
+def test_cut_non_convex_polygon_keeps_area():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 40))
+        radii = rng.uniform(0.2, 1, 40)
+        star = np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+        line_origin = rng.uniform(-0.3, 0.3, 2)
+        line_normal = rng.normal(size=2)
+        info, pieces = calc.split_polygon_along_line(star, line_origin, line_normal)
+        if info == CutInfo.success_no_cut:
+            continue
+        assert info == CutInfo.successful
+        assert np.isclose(sum(polygon_area(p) for p in pieces), polygon_area(star))
+        for piece in pieces:
+            heights = (piece - line_origin) @ line_normal
+            assert np.all(heights >= -1e-12) or np.all(heights <= 1e-12)
+
+
+def test_split_polygon_along_line_touching_vertex():
+    # the tip of the spike touches the line from below
+    spike = np.array([[0, 0], [1, 0], [2, 1], [3, 0], [4, 0], [4, 2], [0, 2]], dtype=float)
+    info, pieces = calc.split_polygon_along_line(spike, np.array([0, 1]), np.array([0, 1]))
+    assert info == CutInfo.successful
+    assert sorted(polygon_area(p) for p in pieces) == [1.5, 1.5, 4]
+
+    # the tip of the notch touches the line from above
+    notch = np.array([[0, 0], [4, 0], [4, 2], [2, 1], [0, 2]], dtype=float)
+    info, pieces = calc.cut_polygon_array(notch, np.array([0, 1]), np.array([0, 1]))
+    assert info == CutInfo.successful
+    assert sorted(polygon_area(p) for p in pieces) == [2, 4]
+
+
+def test_split_polygon_along_line_reflex_vertex_on_line():
+    # the reflex vertex (2.4, 0.2) is rounded to just below the line, its crossings coincide
+    comb = np.array([[0, 0], [4.8, 0], [2.7, 0.2], [2.4, 0.2], [2.4, 0.6], [2.1, 0.6]])
+    line_origin, line_normal = np.array([2.6, 0]), np.array([1.0, 1.0])
+    info, pieces = calc.cut_polygon_array(comb, line_origin, line_normal)
+    assert info == CutInfo.successful
+    assert len(pieces) == 3
+    assert np.isclose(sum(polygon_area(p) for p in pieces), polygon_area(comb))
+    for piece in pieces:
+        heights = (piece - line_origin) @ line_normal
+        assert np.all(heights >= -1e-12) or np.all(heights <= 1e-12)
+
+
+def test_slice_polygon_array_keeps_area():
+    rng = np.random.default_rng(11)
+    for _ in range(20):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 60))
+        radii = rng.uniform(0.2, 1, 60)
+        star = np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+        line_normal = rng.normal(size=2)
+        heights = star @ line_normal
+        offsets = np.sort(rng.uniform(heights.min(), heights.max(), 8))
+        info, strips = calc.slice_polygon_array(star, heights, offsets, line_normal)
+        assert info == CutInfo.successful
+        assert len(strips) == len(offsets) + 1
+        assert np.isclose(sum(polygon_area(p) for strip in strips for p in strip), polygon_area(star))
+        bounds = np.concatenate([[-np.inf], offsets, [np.inf]])
+        for band, strip in enumerate(strips):
+            for piece in strip:
+                piece_heights = piece @ line_normal
+                assert np.all(piece_heights >= bounds[band] - 1e-12)
+                assert np.all(piece_heights <= bounds[band + 1] + 1e-12)
+
+
+def test_slice_polygon_array_vertex_on_plane():
+    # the corner (0.5, 0.4) is rounded to just below the plane at 0.1
+    comb = np.array([[0, 0], [2, 0], [2, 0.1], [1.7, 0.1], [1.7, 0.4], [0.5, 0.4], [0.5, 0.1], [0, 0.1]])
+    line_normal = np.array([1.0, -1.0])
+    offsets = np.arange(-3, 21) * 0.1
+    info, strips = calc.slice_polygon_array(comb, comb @ line_normal, offsets, line_normal)
+    assert info == CutInfo.successful
+    assert np.isclose(sum(polygon_area(p) for strip in strips for p in strip), polygon_area(comb))
+    bounds = np.concatenate([[-np.inf], offsets, [np.inf]])
+    for band, strip in enumerate(strips):
+        for piece in strip:
+            assert np.all(piece @ line_normal >= bounds[band] - 1e-12)
+            assert np.all(piece @ line_normal <= bounds[band + 1] + 1e-12)
+
+
+def test_try_slice_polygon():
+    square = [Vector3D(x=0, y=0, z=0), Vector3D(x=4, y=0, z=0), Vector3D(x=4, y=4, z=0), Vector3D(x=0, y=4, z=0)]
+    origins = [Vector3D(x=3, y=0, z=0), Vector3D(x=1, y=0, z=0), Vector3D(x=2, y=0, z=0), Vector3D(x=9, y=0, z=0)]
+    result = calc.try_slice_polygon(SliceRequest(polygon=square, plane_normal=Vector3D(x=1, y=0, z=0),
+                                                 plane_origins=origins))
+    assert result.info == CutInfo.successful
+    assert [len(strip) for strip in result.strips] == [1, 1, 1, 1, 0]
+    for band, strip in enumerate(result.strips[:4]):
+        assert sorted({v.x for v in strip[0]}) == [band, band + 1]
+    assert not result.fast_rejected
+
+    origins = [Vector3D(x=-1, y=0, z=0), Vector3D(x=9, y=0, z=0)]
+    result = calc.try_slice_polygon(SliceRequest(polygon=square, plane_normal=Vector3D(x=1, y=0, z=0),
+                                                 plane_origins=origins))
+    assert result.info == CutInfo.success_no_cut
+    assert result.fast_rejected
+    assert [len(strip) for strip in result.strips] == [0, 1, 0]
+
+
+def test_try_slice_rotated_polygon():
+    square = np.array([[0, 0, 0], [4, 0, 0], [4, 4, 0], [0, 4, 0]], dtype=float)
+    matrix = rotation(np.array([1.0, 2.0, 0.5]), 0.8)
+    origins = [to_vector(matrix @ np.array([x, 0, 0])) for x in (1, 2, 3)]
+    result = calc.try_slice_polygon(SliceRequest(polygon=square @ matrix.T,
+                                                 plane_normal=to_vector(matrix @ np.array([1.0, 0, 0])),
+                                                 plane_origins=origins))
+    assert result.info == CutInfo.successful
+    assert [len(strip) for strip in result.strips] == [1, 1, 1, 1]
+    for band, strip in enumerate(result.strips):
+        assert np.allclose(sorted(np.unique(np.round(strip[0].coordinates @ matrix, 9)[:, 0])), [band, band + 1])
+
+
+def star_polygon(count: int = 60, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    radii = rng.uniform(0.5, 1.5, count)
+    return np.column_stack([radii * np.cos(angles), radii * np.sin(angles), np.zeros(count)])
+
+
+def assert_same_result(first: CutResult, second: CutResult):
+    assert first.info == second.info
+    assert len(first.result_polygons) == len(second.result_polygons)
+    for a, b in zip(first.result_polygons, second.result_polygons):
+        assert np.array_equal(a.coordinates, b.coordinates)
+
+
+def distances_to_outline(points: np.ndarray, outline: np.ndarray) -> np.ndarray:
+    starts, ends = outline, np.roll(outline, -1, axis=0)
+    distances = [calc.distances_to_segments(points, np.broadcast_to(a, points.shape), np.broadcast_to(b, points.shape))
+                 for a, b in zip(starts, ends)]
+    return np.min(distances, axis=0)
+
+
+def test_simplify_polygon_keeps_error_bound():
+    rng = np.random.default_rng(9)
+    angles = np.linspace(0, 2 * np.pi, 2000, endpoint=False)
+    radii = 10 + np.sin(angles * 5) + rng.uniform(-0.01, 0.01, len(angles))
+    outline = np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+    for tolerance in (0.001, 0.05, 0.5):
+        simplified = calc.simplify_polygon(outline, tolerance)
+        assert 3 <= len(simplified) < len(outline)
+        assert np.all(distances_to_outline(outline, simplified) <= tolerance)
+    assert len(calc.simplify_polygon(outline, 0.5)) < len(calc.simplify_polygon(outline, 0.05))
+
+
+def test_simplify_polygon_keeps_thin_polygon():
+    sliver = np.array([[0, 0], [1, 0.001], [2, 0], [1, -0.001]], dtype=float)
+    assert np.array_equal(calc.simplify_polygon(sliver, 0.1), sliver)
+
+
+def test_try_cut_simplified_polygon():
+    request = CutRequest(polygon=star_polygon(count=400), plane_origin=Vector3D(x=0.1, y=0, z=0),
+                         plane_normal=Vector3D(x=1, y=0.3, z=0), simplify_tolerance=0.01)
+    result = calc.try_cut_polygon(request)
+    assert result.info == CutInfo.successful
+    assert 0 < result.removed_vertices < 400
+    assert calc.try_cut_polygon(request.copy(update={"simplify_tolerance": None})).removed_vertices == 0
+
+
+def test_prepared_polygon_update_reuses_unchanged_polygon():
+    polygon = calc.PreparedPolygon(star_polygon())
+    assert polygon.update(star_polygon()) is polygon
+    assert polygon.update(star_polygon(count=61)) is not polygon
+
+
+def test_prepared_polygon_patch_only_small_changes():
+    polygon = calc.PreparedPolygon(star_polygon())
+    coordinates = star_polygon()
+    coordinates[10, :2] *= 1.2
+    assert polygon.patch(coordinates) is not None
+    coordinates[:, :2] *= 1.2
+    assert polygon.patch(coordinates) is None
+
+
+def test_prepared_polygon_shared_by_threads():
+    polygon = calc.PreparedPolygon(star_polygon(count=2000))
+    normals = np.random.default_rng(4).normal(size=(400, 2))
+
+    def project(normal):
+        polygon.edge_index()
+        polygon.extents()
+        return polygon.projection(normal).heights
+
+    with ThreadPoolExecutor(8) as pool:
+        for normal, heights in zip(normals, pool.map(project, normals)):
+            assert np.array_equal(heights, polygon.points @ normal)
+    assert len(polygon.projections) == polygon.max_projections
+
+
+def test_prepared_polygon_update_patches_projection():
+    polygon = calc.PreparedPolygon(star_polygon())
+    normal = np.array([1.0, 0.5])
+    polygon.projection(normal)
+
+    coordinates = star_polygon()
+    coordinates[10:13, :2] *= 1.2
+    patched = polygon.update(coordinates)
+    fresh = calc.PreparedPolygon(coordinates)
+    assert np.array_equal(patched.points, fresh.points)
+
+    projection = patched.projection(normal)
+    expected = fresh.projection(normal)
+    assert np.array_equal(projection.heights, expected.heights)
+    assert np.array_equal(projection.sorted_heights, expected.sorted_heights)
+    assert np.array_equal(projection.denominators, expected.denominators)
+
+
+def test_prepared_polygon_update_widens_extents():
+    polygon = calc.PreparedPolygon(star_polygon())
+    polygon.extents()
+    coordinates = star_polygon()
+    coordinates[10:13, :2] *= 1.2
+    patched = polygon.update(coordinates)
+    fresh = calc.Extents(calc.PreparedPolygon(coordinates).points)
+    assert all(a >= b for a, b in zip(patched.extents().support, fresh.support))
+
+
+def test_prepared_polygon_update_with_new_duplicate_prepares_again():
+    polygon = calc.PreparedPolygon(star_polygon())
+    coordinates = star_polygon()
+    coordinates[11] = coordinates[10]
+    updated = polygon.update(coordinates)
+    assert len(updated.points) == len(coordinates) - 1
+    assert updated.duplicates == 1
+
+
+def test_projected_cut_matches_full_cut():
+    polygon = calc.PreparedPolygon(star_polygon())
+    normal = Vector3D(x=1, y=0.5, z=0)
+    for origin_x in np.linspace(-2, 2, 41):
+        origin = Vector3D(x=origin_x, y=0, z=0)
+        assert_same_result(calc.cut_prepared_polygon(polygon, origin, normal, projected=True),
+                           calc.cut_prepared_polygon(calc.PreparedPolygon(star_polygon()), origin, normal))
+    # through a vertex
+    vertex = polygon.points[7]
+    origin = Vector3D(x=vertex[0], y=vertex[1], z=0)
+    assert_same_result(calc.cut_prepared_polygon(polygon, origin, normal, projected=True),
+                       calc.cut_prepared_polygon(calc.PreparedPolygon(star_polygon()), origin, normal))
+
+
+def test_indexed_cut_matches_full_cut(monkeypatch):
+    monkeypatch.setattr(calc.PreparedPolygon, "min_index_vertices", 3)
+    coordinates = star_polygon(count=500)
+    polygon = calc.PreparedPolygon(coordinates)
+    for origin_x, normal_y in [(0, 0.3), (0.7, 0), (-1.2, 2), (3, 0.1)] + [(p[0], 1) for p in coordinates[:5]]:
+        origin, normal = Vector3D(x=origin_x, y=0, z=0), Vector3D(x=1, y=normal_y, z=0)
+        assert_same_result(calc.cut_prepared_polygon(polygon, origin, normal, indexed=True),
+                           calc.cut_prepared_polygon(calc.PreparedPolygon(coordinates), origin, normal))
+    assert polygon.index is not None
+
+
+def test_exact_height_signs_match_rational_arithmetic():
+    rng = np.random.default_rng(4)
+    line_origin = np.array([512345.25, 5412345.5])
+    line_normal = np.array([0.6, -0.8])
+    # points rounded onto the line, so that the rounded heights are mostly too small to trust
+    along = rng.uniform(-100, 100, 200)
+    points = line_origin + along[:, None] * np.array([0.8, 0.6])
+    heights = calc.exact_height_signs(points, line_origin, line_normal)
+    expected = [calc.height_sign(x, y, line_origin, line_normal) for x, y in points.tolist()]
+    assert np.sign(heights).tolist() == expected
+    assert calc.height_sign(3.0, 1.0, np.array([1.0, 1.0]), np.array([0.0, 2.0])) == 0
+
+
+def test_robust_cut_near_vertex_with_large_coordinates(monkeypatch):
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=float) + [512345.25, 5412345.5]
+    normal = np.array([1.0, 0.0])
+    # the line passes 1e-7 beside the right edge, closer than epsilon
+    assert calc.cut_polygon_array(square, square[1] + [1e-7, 0], normal)[0] == CutInfo.failed_line_tangent_to_segment
+    monkeypatch.setattr(calc, "robust", True)
+    assert calc.cut_polygon_array(square, square[1] + [1e-7, 0], normal)[0] == CutInfo.success_no_cut
+    assert calc.cut_polygon_array(square, square[1] - [1e-7, 0], normal)[0] == CutInfo.successful
+    assert calc.cut_polygon_array(square, square[1], normal)[0] == CutInfo.failed_line_tangent_to_segment
+
+    # a line through two opposite vertices cuts at them, a line touching one vertex does not cut
+    info, pieces = calc.cut_polygon_array(square, square[0], np.array([1.0, -1.0]))
+    assert info == CutInfo.successful
+    for piece in pieces:
+        offsets = piece - square[0]
+        area = 0.5 * np.sum(offsets[:, 0] * np.roll(offsets[:, 1], -1) - offsets[:, 1] * np.roll(offsets[:, 0], -1))
+        assert abs(area) == 50
+    assert calc.cut_polygon_array(square, square[0], np.array([1.0, 1.0]))[0] == CutInfo.success_no_cut
+
+
+def test_robust_mode_keeps_close_vertices(monkeypatch):
+    # a triangle 1e-7 wide far from the origin, cut through its middle vertex
+    triangle = np.array([[1e6, 0, 0], [1e6 + 1e-7, 1e-7, 0], [1e6, 2e-7, 0]])
+    origin, normal = Vector3D(x=0, y=1e-7, z=0), Vector3D(x=0, y=1, z=0)
+    monkeypatch.setattr(calc, "robust", False)
+    result = calc.cut_prepared_polygon(calc.PreparedPolygon(triangle), origin, normal)
+    assert result.info == CutInfo.failed_polygon_less_than_three_vertices
+    monkeypatch.setattr(calc, "robust", True)
+    assert len(calc.remove_duplicate_vertices(triangle[:, :2])) == 3
+    assert len(calc.remove_duplicate_vertices(triangle[[0, 0, 1, 2], :2])) == 3
+    result = calc.cut_prepared_polygon(calc.PreparedPolygon(triangle), origin, normal)
+    assert result.info == CutInfo.successful
+    assert [len(polygon) for polygon in result.result_polygons] == [4, 3]
+
+
+def test_robust_cut_matches_cut_away_from_vertices(monkeypatch):
+    coordinates = star_polygon(count=500)
+    planes = [(0, 0.3), (0.7, 0), (-1.2, 2), (3, 0.1), (0.01, 5)]
+    expected = [calc.cut_prepared_polygon(calc.PreparedPolygon(coordinates), Vector3D(x=x, y=0, z=0),
+                                          Vector3D(x=1, y=y, z=0)) for x, y in planes]
+    monkeypatch.setattr(calc, "robust", True)
+    monkeypatch.setattr(calc.PreparedPolygon, "min_index_vertices", 3)
+    polygon = calc.PreparedPolygon(coordinates)
+    for (x, y), result in zip(planes, expected):
+        origin, normal = Vector3D(x=x, y=0, z=0), Vector3D(x=1, y=y, z=0)
+        assert_same_result(calc.cut_prepared_polygon(calc.PreparedPolygon(coordinates), origin, normal), result)
+        assert_same_result(calc.cut_prepared_polygon(polygon, origin, normal, projected=True, indexed=True), result)
+
+
+def test_robust_segment_helpers(monkeypatch):
+    monkeypatch.setattr(calc, "robust", True)
+    origin, normal = Vector2D(x=0.1, y=0.2), Vector2D(x=1, y=-1)
+    # 0.3 - 0.1 and 0.4 - 0.2 differ in binary, though by less than epsilon
+    assert calc.is_point_on_line(Vector2D(x=0.3, y=0.4), origin, normal) is False
+    assert calc.is_point_on_line(Vector2D(x=1.5, y=1.75), Vector2D(x=0.5, y=0.75), normal)
+    assert not calc.are_equal(Vector2D(x=1, y=1), Vector2D(x=1 + 1e-9, y=1))
+    assert calc.intersect_curve_with_line(Vector2D(x=0, y=0), Vector2D(x=1, y=1), Vector2D(x=0, y=0), normal) is None
+    intersection = calc.intersect_curve_with_line(Vector2D(x=0, y=1), Vector2D(x=2, y=1), origin, normal)
+    assert abs(intersection.x - 0.9) < 1e-12 and intersection.y == 1
+
+
+def test_robust_cut_reflex_vertex_on_line(monkeypatch):
+    monkeypatch.setattr(calc, "robust", True)
+    comb = np.array([[0, 0], [4.8, 0], [2.7, 0.2], [2.4, 0.2], [2.4, 0.6], [2.1, 0.6]])
+    info, pieces = calc.cut_polygon_array(comb, np.array([2.6, 0]), np.array([1.0, 1.0]))
+    assert info == CutInfo.successful
+    assert len(pieces) == 3
+    assert np.isclose(sum(polygon_area(p) for p in pieces), polygon_area(comb))
+
+
+def test_order_crossings_exactly():
+    square = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+    # rounded positions that cannot tell the crossings apart leave the order to the exact positions
+    order = calc.order_crossings_exactly(square, np.array([1, 3]), np.array([1, 0]), np.zeros(2),
+                                         np.array([0, 0.5]), np.array([0.0, 1.0]))
+    assert order.tolist() == [0, 1]
@@ -0,0 +1,141 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from polycut.clipping import clip_polygon_array, inside_polygon, overlapping_boxes, signed_area, try_clip_polygon
+from polycut.models import ClipOperation, ClipRequest, CutInfo
+
+square = np.array([[0, 0], [2, 0], [2, 2], [0, 2]], dtype=float)
+
+
+def test_overlapping_squares():
+    other = square + [1, 1]
+    areas = {}
+    for operation in ClipOperation:
+        info, rings = clip_polygon_array(square, other, operation)
+        assert info == CutInfo.successful
+        assert len(rings) == 1
+        areas[operation] = signed_area(rings[0])
+    assert areas == {ClipOperation.intersection: 1, ClipOperation.difference: 3, ClipOperation.union: 7}
+
+
+def test_clockwise_input():
+    info, rings = clip_polygon_array(square[::-1], square[::-1] + [1, 1], ClipOperation.intersection)
+    assert info == CutInfo.successful
+    assert signed_area(rings[0]) == 1
+
+
+def test_difference_splits_subject():
+    bar = np.array([[0.5, -1], [1.5, -1], [1.5, 3], [0.5, 3]])
+    info, rings = clip_polygon_array(square, bar, ClipOperation.difference)
+    assert info == CutInfo.successful
+    assert sorted(signed_area(ring) for ring in rings) == [1, 1]
+
+
+def test_union_with_hole():
+    # a U shape closed by a bar leaves a hole
+    u = np.array([[0, 0], [3, 0], [3, 3], [2, 3], [2, 1], [1, 1], [1, 3], [0, 3]], dtype=float)
+    bar = np.array([[-1, 2], [4, 2], [4, 2.5], [-1, 2.5]])
+    info, rings = clip_polygon_array(u, bar, ClipOperation.union)
+    assert info == CutInfo.successful
+    assert sorted(signed_area(ring) for ring in rings) == [-1, 9.5]
+
+
+def test_separate_polygons():
+    inner = square * 0.25 + 0.5
+    assert clip_polygon_array(square, inner, ClipOperation.intersection) == (CutInfo.success_no_cut, [inner])
+    info, rings = clip_polygon_array(square, inner, ClipOperation.difference)
+    assert info == CutInfo.success_no_cut
+    assert [signed_area(ring) for ring in rings] == [4, -0.25]
+    info, rings = clip_polygon_array(square, square + [5, 0], ClipOperation.union)
+    assert info == CutInfo.success_no_cut and len(rings) == 2
+    assert clip_polygon_array(square, square + [5, 0], ClipOperation.intersection) == (CutInfo.success_no_cut, [])
+
+
+@pytest.mark.parametrize("clip, info", [
+    (square + [1, 0], CutInfo.failed_overlapping_segments),
+    (np.array([[2, 1], [3, 0], [3, 2]]), CutInfo.failed_vertex_on_boundary),
+    (np.array([[1, 1], [3, -1], [3, 3]]), CutInfo.failed_vertex_on_boundary),
+])
+def test_touching_outlines(clip, info):
+    assert clip_polygon_array(square, clip, ClipOperation.union) == (info, [])
+
+
+def test_random_polygons():
+    rng = np.random.default_rng(3)
+    points = rng.uniform(-2, 2, (2000, 2))
+
+    def star(center):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, 20))
+        radii = rng.uniform(0.4, 1, 20)
+        return center + np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+
+    for _ in range(20):
+        subject, clip = star([0, 0]), star(rng.uniform(-1, 1, 2))
+        in_subject, in_clip = inside_polygon(points, subject), inside_polygon(points, clip)
+        expected = {ClipOperation.intersection: in_subject & in_clip,
+                    ClipOperation.difference: in_subject & ~in_clip,
+                    ClipOperation.union: in_subject | in_clip}
+        for operation, inside in expected.items():
+            info, rings = clip_polygon_array(subject, clip, operation)
+            assert info in (CutInfo.successful, CutInfo.success_no_cut)
+            # points inside a hole are inside two rings
+            covered = np.zeros(len(points), dtype=bool)
+            for ring in rings:
+                covered ^= inside_polygon(points, ring)
+            assert np.array_equal(covered, inside)
+
+
+def test_overlapping_boxes():
+    rng = np.random.default_rng(5)
+    lows, other_lows = rng.uniform(0, 10, (50, 2)), rng.uniform(0, 10, (60, 2))
+    highs, other_highs = lows + rng.uniform(0, 2, (50, 2)), other_lows + rng.uniform(0, 2, (60, 2))
+    # boxes starting at the same x are found once
+    other_lows[0, 0] = lows[0, 0]
+    boxes, other_boxes = overlapping_boxes(lows, highs, other_lows, other_highs, 0)
+    expected = np.argwhere(np.all(lows[:, None] <= other_highs[None], axis=2)
+                           & np.all(other_lows[None] <= highs[:, None], axis=2))
+    assert sorted(map(list, zip(boxes.tolist(), other_boxes.tolist()))) == expected.tolist()
+
+
+def serpentine_boxes(count, y):
+    # edges spanning the full width, so that all of them overlap in x
+    rows = np.repeat(np.arange(count // 2) / count, 2)
+    points = np.column_stack([np.tile([0, 1, 1, 0], count // 4 + 1)[:len(rows)], y + rows])
+    ends = np.roll(points, -1, axis=0)
+    return np.minimum(points, ends), np.maximum(points, ends)
+
+
+def test_overlapping_boxes_scales_with_close_pairs():
+    # the memory needed grows with the number of boxes, not with the pairs that overlap in x only
+    tracemalloc.start()
+    boxes, other_boxes = overlapping_boxes(*serpentine_boxes(20000, 0), *serpentine_boxes(20000, 2), 1e-6)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(boxes) == len(other_boxes) == 0
+    assert peak < 16 * 2 ** 20
+
+    lows, highs = serpentine_boxes(400, 0)
+    other_lows, other_highs = serpentine_boxes(400, 0.1)
+    boxes, other_boxes = overlapping_boxes(lows, highs, other_lows, other_highs, 0)
+    expected = np.argwhere(np.all(lows[:, None] <= other_highs[None], axis=2)
+                           & np.all(other_lows[None] <= highs[:, None], axis=2))
+    assert len(expected) > 0
+    assert sorted(map(list, zip(boxes.tolist(), other_boxes.tolist()))) == expected.tolist()
+
+def test_clip_tilted_polygons():
+    tilted = [{"x": x, "y": y, "z": x} for x, y in square.tolist()]
+    request = ClipRequest(subject=tilted, clip=[{"x": x + 1, "y": y + 1, "z": x + 1} for x, y in square.tolist()])
+    result = try_clip_polygon(request)
+    assert result.info == CutInfo.successful
+    coordinates = result.result_polygons[0].coordinates
+    assert len(coordinates) == 4
+    assert np.allclose(coordinates[:, 0], coordinates[:, 2])
+
+
+def test_clip_polygon_off_plane():
+    subject = [{"x": x, "y": y, "z": 0} for x, y in square.tolist()]
+    clip = [{"x": x, "y": y, "z": 1} for x, y in square.tolist()]
+    result = try_clip_polygon(ClipRequest(subject=subject, clip=clip))
+    assert result.info == CutInfo.failed_polygon_not_planar
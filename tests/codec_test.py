@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from polycut import codec
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Polygon, Vector3D
+
+
+def make_request() -> CutRequest:
+    return CutRequest(polygon=Polygon(np.array([[0, 0, 0], [1, 0.5, 0], [1, 1, 0]])),
+                      plane_origin=Vector3D(x=0.5, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+
+
+def test_cut_request_round_trip():
+    request = make_request()
+    data = codec.encode_cut_request(request)
+    assert len(data) == 8 + 56 + 8 + 3 * 24
+    assert codec.decode_cut_request(data) == request
+    request.simplify_tolerance = 0.25
+    assert codec.decode_cut_request(codec.encode_cut_request(request)) == request
+
+
+def test_version_1_request():
+    request = make_request()
+    data = codec.encode_cut_request(request)
+    # version 1 had no simplify tolerance after the plane
+    data = data[:4] + bytes([1]) + data[5:8 + 48] + data[8 + 56:]
+    assert codec.decode_cut_request(data) == request
+
+
+def test_cut_round_trip():
+    result = CutResult(info=CutInfo.successful, result_polygons=[np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0]]),
+                                                                 np.array([[2, 0, 0], [3, 0, 0], [3, 1, 0]])])
+    cut = Cut(id="a1", request=make_request(), result=result)
+    assert codec.decode_cut(codec.encode_cut(cut)) == cut
+    cut.request.simplify_tolerance = 0.5
+    cut.result.removed_vertices = 7
+    assert codec.decode_cut(codec.encode_cut(cut)) == cut
+
+
+def test_decode_invalid_data():
+    data = codec.encode_cut_request(make_request())
+    with pytest.raises(ValueError):
+        codec.decode_cut_request(data[:-1])
+    with pytest.raises(ValueError):
+        codec.decode_cut_request(data + b"\0")
+    with pytest.raises(ValueError):
+        codec.decode_cut_request(b"JSON" + data[4:])
+    with pytest.raises(ValueError):
+        codec.decode_cut(data)
+    request = make_request()
+    request.simplify_tolerance = -1
+    with pytest.raises(ValueError):
+        codec.decode_cut_request(codec.encode_cut_request(request))
@@ -0,0 +1,46 @@
+import numpy as np
+
+from polycut.calculations import try_cut_polygon
+from polycut.delta import delta_decode, delta_encode
+from polycut.models import CutRequest, Vector3D
+
+
+def test_delta_encoding_round_trip():
+    rng = np.random.default_rng(4)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, 200))
+    radii = rng.uniform(0.5, 1.5, 200)
+    star = np.column_stack([radii * np.cos(angles), radii * np.sin(angles), np.zeros(200)])
+    request = CutRequest(polygon=star, plane_origin=Vector3D(x=0.1, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+    result = try_cut_polygon(request)
+    new_points, ranges = delta_encode(request.polygon, result.result_polygons)
+    # only the intersections are new, each once although it ends two pieces
+    assert sum(len(p) for p in result.result_polygons) == len(star) + 2 * len(new_points)
+    assert len(np.unique(new_points, axis=0)) == len(new_points)
+    decoded = delta_decode(request.polygon, new_points, ranges)
+    assert len(decoded) == len(result.result_polygons)
+    for a, b in zip(decoded, result.result_polygons):
+        assert np.array_equal(a.coordinates, b.coordinates)
+
+
+def test_delta_encoding_without_results():
+    request = CutRequest(polygon=[Vector3D(x=0, y=0, z=0)], plane_origin=Vector3D(x=0, y=0, z=0),
+                         plane_normal=Vector3D(x=1, y=0, z=0))
+    new_points, ranges = delta_encode(request.polygon, [])
+    assert len(new_points) == 0 and ranges == []
+
+
+def test_delta_encoding_of_tilted_polygon():
+    rng = np.random.default_rng(5)
+    angles = np.sort(rng.uniform(0, 2 * np.pi, 2000))
+    radii = rng.uniform(0.5, 1.5, 2000)
+    star = np.column_stack([radii * np.cos(angles), radii * np.sin(angles), np.zeros(2000)])
+    # the polygon is cut in the frame of its plane, its own vertices come back with their given coordinates
+    tilted = star @ np.array([[1, 0, 0], [0, 0.6, -0.8], [0, 0.8, 0.6]]).T + [1, 2, 3]
+    request = CutRequest(polygon=tilted, plane_origin=Vector3D(x=1.1, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+    result = try_cut_polygon(request)
+    new_points, ranges = delta_encode(request.polygon, result.result_polygons)
+    assert sum(len(p) for p in result.result_polygons) == len(tilted) + 2 * len(new_points)
+    assert len(new_points) < 50
+    decoded = delta_decode(request.polygon, new_points, ranges)
+    for a, b in zip(decoded, result.result_polygons):
+        assert np.array_equal(a.coordinates, b.coordinates)
@@ -1,12 +1,25 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import BrokenExecutor
 from uuid import uuid4
 
+import pytest
 from fastapi.testclient import TestClient
 from fastapi import status
 
 from math import cos, sin, radians
 
-from polycut.models import CutInfo
+from polycut import codec
+from polycut.cache import request_key
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, SliceRequest, SliceResult
+from polycut import main
 from polycut.main import app
+from polycut.calculations import PreparedPolygon, try_cut_polygon, try_slice_polygon
+from polycut.pool import CutExecutor
+from polycut.storage import MemoryStore, SQLiteStore
 
 # from debug2D import plot_cut # disable for pytest
 
@@ -98,6 +111,48 @@ def test_post_simple_cut():
     # plot_cut(cut)
 
 
+def test_post_simplified_cut():
+    count = 720
+    data = {
+        "polygon": [{"x": cos(radians(i * 360 / count)), "y": sin(radians(i * 360 / count)), "z": 0}
+                    for i in range(count)],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+        "simplify_tolerance": 0.001,
+    }
+
+    response = client.post("/api/poly-cut", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    result = client.get(f"/api/poly-cut/{response.json()}").json()["result"]
+    assert result["removed_vertices"] > 0
+    assert sum(len(p) for p in result["result_polygons"]) < count
+
+    data["simplify_tolerance"] = -1
+    response = client.post("/api/poly-cut", json=data)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_fetch_cut_fields_and_delta_encoding():
+    cut_id = post_triangle()
+    response = client.get(f"/api/poly-cut/{cut_id}", params={"fields": "id,result.info"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"id": cut_id, "result": {"info": CutInfo.successful}}
+
+    full = client.get(f"/api/poly-cut/{cut_id}").json()
+    response = client.get(f"/api/poly-cut/{cut_id}", params={"encoding": "delta", "fields": "result"})
+    result = response.json()["result"]
+    assert result["info"] == CutInfo.successful
+    table = full["request"]["polygon"] + result["new_points"]
+    decoded = [[vertex for start, stop in piece for vertex in table[start:stop]] for piece in result["result_polygons"]]
+    assert decoded == full["result"]["result_polygons"]
+
+    response = client.get("/api/poly-cut", params={"after": cut_id, "fields": "id"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get(f"/api/poly-cut/{cut_id}", params={"fields": "result.nothing"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 def test_dense_circle():
     # generate circle polygon
     polygon = []
@@ -154,10 +209,10 @@ def test_post_non_planar():
 
     response = client.post("/api/poly-cut", json=data)
     assert response.status_code == status.HTTP_400_BAD_REQUEST
-    assert response.json()["detail"] == CutInfo.failed_polygon_not_on_xy_plane
+    assert response.json()["detail"] == CutInfo.failed_polygon_not_planar
 
 
-def test_post_non_orthogonal_plane():
+def test_post_polygon_on_cut_plane():
     data = {
         "polygon": [
             {"x": 0, "y": 0, "z": 0},
@@ -170,7 +225,7 @@ def test_post_non_orthogonal_plane():
 
     response = client.post("/api/poly-cut", json=data)
     assert response.status_code == status.HTTP_400_BAD_REQUEST
-    assert response.json()["detail"] == CutInfo.failed_cut_plane_not_orthogonal
+    assert response.json()["detail"] == CutInfo.failed_polygon_on_cut_plane
 
 
 def test_self_intersecting_polygon():
@@ -248,3 +303,529 @@ def test_two_vertices_polygon():
     response = client.post("/api/poly-cut", json=data)
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.json()["detail"] == CutInfo.failed_polygon_less_than_three_vertices
+
+
+def test_plane_misses_polygon():
+    data = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 1, "y": 1, "z": 0},
+            {"x": 1, "y": 0, "z": 0},
+        ],
+        "plane_origin": {"x": 5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+
+    response = client.post("/api/poly-cut", json=data)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == CutInfo.failed_no_intersection
+
+
+def test_batch_cut_cross_product():
+    data = {
+        "polygons": [
+            [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 1, "y": 0, "z": 0}],
+            [{"x": 0, "y": 0, "z": 0}, {"x": 10, "y": 10, "z": 0}, {"x": 10, "y": 0, "z": 0}],
+        ],
+        "planes": [
+            {"origin": {"x": 0.5, "y": 0, "z": 0}, "normal": {"x": 1, "y": 0, "z": 0}},
+            {"origin": {"x": 5, "y": 0, "z": 0}, "normal": {"x": 1, "y": 0, "z": 0}},
+        ],
+    }
+
+    response = client.post("/api/poly-cut/batch", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()
+    assert [(item["polygon_index"], item["plane_index"]) for item in items] == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert [item["result"]["info"] for item in items] == [CutInfo.successful, CutInfo.success_no_cut,
+                                                          CutInfo.successful, CutInfo.successful]
+    assert items[1]["id"] is None
+    stored = client.get(f"/api/poly-cut/{items[3]['id']}")
+    assert stored.status_code == status.HTTP_200_OK
+    assert stored.json()["request"]["plane_origin"] == {"x": 5, "y": 0, "z": 0}
+
+
+def test_batch_cut_pairs():
+    data = {
+        "polygons": [
+            [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 1, "y": 0, "z": 0}],
+        ],
+        "planes": [
+            {"origin": {"x": 0.5, "y": 0, "z": 0}, "normal": {"x": 1, "y": 0, "z": 0}},
+        ],
+        "pairs": [[0, 0], [0, 0]],
+    }
+
+    response = client.post("/api/poly-cut/batch", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()
+    assert len(items) == 2
+    assert items[0]["id"] != items[1]["id"]
+    assert items[0]["result"] == items[1]["result"]
+
+
+def test_batch_cut_pair_out_of_range():
+    data = {
+        "polygons": [],
+        "planes": [],
+        "pairs": [[0, 0]],
+    }
+
+    response = client.post("/api/poly-cut/batch", json=data)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_non_convex_polygon_cut_into_pieces():
+    u_shape = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 3, "y": 0, "z": 0},
+            {"x": 3, "y": 3, "z": 0},
+            {"x": 2, "y": 3, "z": 0},
+            {"x": 2, "y": 1, "z": 0},
+            {"x": 1, "y": 1, "z": 0},
+            {"x": 1, "y": 3, "z": 0},
+            {"x": 0, "y": 3, "z": 0},
+        ],
+        "plane_origin": {"x": 0, "y": 2, "z": 0},
+        "plane_normal": {"x": 0, "y": 1, "z": 0},
+    }
+
+    response = client.post("/api/poly-cut", json=u_shape)
+    assert response.status_code == status.HTTP_200_OK
+    result = client.get(f"/api/poly-cut/{response.json()}")
+    assert len(result.json()["result"]["result_polygons"]) == 3
+
+
+def test_slice_polygon():
+    data = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 4, "y": 0, "z": 0},
+            {"x": 4, "y": 4, "z": 0},
+            {"x": 0, "y": 4, "z": 0},
+        ],
+        "plane_normal": {"x": 0, "y": 1, "z": 0},
+        "plane_origins": [{"x": 0, "y": y, "z": 0} for y in (1, 2, 3)],
+    }
+
+    response = client.post("/api/poly-cut/slice", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["info"] == CutInfo.successful
+    assert [len(strip) for strip in result["strips"]] == [1, 1, 1, 1]
+
+
+def test_slice_polygon_on_cut_plane():
+    data = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 4, "y": 0, "z": 0},
+            {"x": 4, "y": 4, "z": 0},
+        ],
+        "plane_normal": {"x": 0, "y": 0, "z": 1},
+        "plane_origins": [{"x": 0, "y": 0, "z": 0}],
+    }
+
+    response = client.post("/api/poly-cut/slice", json=data)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == CutInfo.failed_polygon_on_cut_plane
+
+
+def test_bulk_cut(monkeypatch):
+    executor = CutExecutor(threshold=3, workers=1)
+    monkeypatch.setattr(main, "executor", executor)
+    monkeypatch.setattr(main, "bulk_chunk_size", 2)
+    triangle = [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 1, "y": 0, "z": 0}]
+    lines = [json.dumps({"polygon": triangle, "plane_origin": {"x": x, "y": 0, "z": 0},
+                         "plane_normal": {"x": 1, "y": 0, "z": 0}}) for x in (0.5, 5, 0.25)]
+    try:
+        response = client.post("/api/poly-cut/bulk", content="\n".join(lines + ["{}"]),
+                               headers={"Content-Type": "application/x-ndjson"})
+    finally:
+        executor.shutdown()
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [result.get("info") for result in results] == [CutInfo.successful, CutInfo.success_no_cut,
+                                                           CutInfo.successful, None]
+    assert "detail" in results[3]
+
+
+def test_cut_mesh():
+    data = {
+        "mesh": {
+            "vertices": [{"x": x, "y": y, "z": z} for x, y, z in [(0, 0, 0), (2, 0, 0), (0, 2, 0), (0, 0, 2)]],
+            "faces": [[0, 2, 1], [0, 1, 3], [1, 2, 3], [2, 0, 3]],
+        },
+        "plane_origin": {"x": 0, "y": 0, "z": 1},
+        "plane_normal": {"x": 0, "y": 0, "z": 1},
+    }
+
+    response = client.post("/api/poly-cut/mesh", json=data)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["info"] == CutInfo.successful
+    assert len(result["below"]["faces"]) == 4
+    assert len(result["above"]["faces"]) == 3
+    assert len(result["sections"]) == 1
+    assert len(result["sections"][0]) == 4
+
+
+def test_cut_mesh_face_out_of_range():
+    data = {
+        "mesh": {"vertices": [{"x": 0, "y": 0, "z": 0}], "faces": [[0, 1, 2]]},
+        "plane_origin": {"x": 0, "y": 0, "z": 1},
+        "plane_normal": {"x": 0, "y": 0, "z": 1},
+    }
+
+    response = client.post("/api/poly-cut/mesh", json=data)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def post_triangle() -> str:
+    data = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 1, "y": 1, "z": 0},
+            {"x": 1, "y": 0, "z": 0},
+        ],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    return client.post("/api/poly-cut", json=data).json()
+
+
+def test_fetch_cuts_paginated():
+    ids = [post_triangle() for _ in range(3)]
+    response = client.get("/api/poly-cut", params={"after": ids[0], "limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert [cut["id"] for cut in response.json()] == [ids[1]]
+    assert response.headers["X-Next-Cursor"] == ids[1]
+
+    response = client.get("/api/poly-cut", params={"after": ids[1], "limit": 5})
+    assert [cut["id"] for cut in response.json()][:1] == [ids[2]]
+
+    response = client.get("/api/poly-cut", params={"after": "unknown"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_fetch_cuts_ndjson():
+    cut_id = post_triangle()
+    response = client.get("/api/poly-cut", headers={"Accept": "application/x-ndjson"},
+                          params={"info": CutInfo.successful.value})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    cuts = [json.loads(line) for line in response.text.splitlines()]
+    assert cut_id in [cut["id"] for cut in cuts]
+
+
+def test_binary_post_and_fetch():
+    request = CutRequest(polygon=[{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 1, "y": 0, "z": 0}],
+                         plane_origin={"x": 0.5, "y": 0, "z": 0}, plane_normal={"x": 1, "y": 0, "z": 0})
+    response = client.post("/api/poly-cut", content=codec.encode_cut_request(request),
+                           headers={"Content-Type": codec.MEDIA_TYPE})
+    assert response.status_code == status.HTTP_200_OK
+    id = response.json()
+
+    response = client.get(f"/api/poly-cut/{id}", headers={"Accept": codec.MEDIA_TYPE})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == codec.MEDIA_TYPE
+    cut = codec.decode_cut(response.content)
+    assert cut.request == request
+    assert cut.result == Cut.parse_obj(client.get(f"/api/poly-cut/{id}").json()).result
+
+
+def test_binary_post_simplified():
+    # a square with a vertex halfway along its bottom edge
+    polygon = [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0},
+               {"x": 0, "y": 2, "z": 0}]
+    request = CutRequest(polygon=polygon, plane_origin={"x": 0.5625, "y": 0, "z": 0},
+                         plane_normal={"x": 1, "y": 0, "z": 0}, simplify_tolerance=0.1)
+    response = client.post("/api/poly-cut", content=codec.encode_cut_request(request),
+                           headers={"Content-Type": codec.MEDIA_TYPE})
+    assert response.status_code == status.HTTP_200_OK
+    id = response.json()
+
+    cut = codec.decode_cut(client.get(f"/api/poly-cut/{id}", headers={"Accept": codec.MEDIA_TYPE}).content)
+    assert cut.request.simplify_tolerance == 0.1
+    assert cut.result.removed_vertices == 1
+    client.delete(f"/api/poly-cut/{id}")
+
+
+def test_binary_post_invalid():
+    response = client.post("/api/poly-cut", content=b"PCUT", headers={"Content-Type": codec.MEDIA_TYPE})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_busy_store_rejected(monkeypatch, tmp_path):
+    store = SQLiteStore(str(tmp_path / "cuts.db"), pool_size=1, timeout=0.01)
+    monkeypatch.setattr(main, "db", store)
+    with store.connection():
+        response = client.get("/api/poly-cut", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+    store.close()
+
+
+def test_large_cut_rejected_when_pool_full(monkeypatch):
+    monkeypatch.setattr(main, "executor", CutExecutor(threshold=3, workers=1, max_pending=0))
+    data = {
+        "polygon": [
+            {"x": 0, "y": 0, "z": 0},
+            {"x": 1, "y": 1, "z": 0},
+            {"x": 3, "y": 0, "z": 0},
+        ],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+
+    response = client.post("/api/poly-cut", json=data)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_large_cut_retried_after_worker_crashed(monkeypatch):
+    executor = CutExecutor(threshold=3, workers=1)
+    monkeypatch.setattr(main, "executor", executor)
+    with pytest.raises(BrokenExecutor):
+        executor.process_pool().submit(os._exit, 1).result()
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 3, "y": 0, "z": 0}],
+        # a plane that no other test cuts with, so the result is not cached
+        "plane_origin": {"x": 0.375, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    try:
+        response = client.post("/api/poly-cut", json=data)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        response = client.post("/api/poly-cut", json=data)
+        assert response.status_code == status.HTTP_200_OK
+        client.delete(f"/api/poly-cut/{response.json()}")
+    finally:
+        executor.shutdown()
+
+
+def test_cached_cut_of_scaled_normal_matches_fresh_cut():
+    square = [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 0, "y": 1, "z": 0}]
+    data = {"polygon": square, "plane_origin": {"x": 0.4375, "y": 0, "z": 0},
+            "plane_normal": {"x": 1e-7, "y": 0, "z": 0}}
+    tiny = client.post("/api/poly-cut", json=data)
+    assert tiny.status_code == status.HTTP_200_OK
+    data["plane_normal"]["x"] = 1
+    unit = client.post("/api/poly-cut", json=data)
+    assert unit.status_code == status.HTTP_200_OK
+    cached = client.get(f"/api/poly-cut/{unit.json()}").json()["result"]
+    assert CutResult(**cached) == try_cut_polygon(CutRequest(**data))
+    client.delete(f"/api/poly-cut/{tiny.json()}")
+    client.delete(f"/api/poly-cut/{unit.json()}")
+
+
+class LoopCheckingStore(MemoryStore):
+    """ Memory store that fails if it is used on the thread of the event loop """
+
+    def __setitem__(self, cut_id, cut):
+        assert_not_on_event_loop()
+        super().__setitem__(cut_id, cut)
+
+    def __contains__(self, cut_id):
+        assert_not_on_event_loop()
+        return super().__contains__(cut_id)
+
+
+def assert_not_on_event_loop():
+    with pytest.raises(RuntimeError):
+        asyncio.get_running_loop()
+
+
+def test_blocking_work_runs_outside_event_loop(monkeypatch):
+    monkeypatch.setattr(main, "db", LoopCheckingStore())
+
+    def checked_request_key(request):
+        assert_not_on_event_loop()
+        return request_key(request)
+
+    monkeypatch.setattr(main, "request_key", checked_request_key)
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 1, "z": 0}, {"x": 3, "y": 0, "z": 0}],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    cut_id = client.post("/api/poly-cut", json=data).json()
+    data["plane_origin"]["x"] = 1.5
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_large_inputs_rejected_when_pool_full(monkeypatch):
+    monkeypatch.setattr(main, "executor", CutExecutor(threshold=3, workers=1, max_pending=0))
+    square = [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0}, {"x": 0, "y": 2, "z": 0}]
+    plane = {"origin": {"x": 1, "y": 0, "z": 0}, "normal": {"x": 1, "y": 0, "z": 0}}
+    requests = {
+        "batch": {"polygons": [square], "planes": [plane]},
+        "slice": {"polygon": square, "plane_normal": plane["normal"], "plane_origins": [plane["origin"]]},
+        "clip": {"subject": square, "clip": [{"x": p["x"] + 1, "y": p["y"] + 1, "z": 0} for p in square]},
+        "mesh": {"mesh": {"vertices": square, "faces": [[0, 1, 2, 3]]}, "plane_origin": plane["origin"],
+                 "plane_normal": plane["normal"]},
+    }
+    for path, data in requests.items():
+        response = client.post(f"/api/poly-cut/{path}", json=data)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+
+
+def test_large_slice_cut_in_worker(monkeypatch):
+    executor = CutExecutor(threshold=3, workers=1)
+    monkeypatch.setattr(main, "executor", executor)
+    square = [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0}, {"x": 0, "y": 2, "z": 0}]
+    request = SliceRequest(polygon=square, plane_normal={"x": 1, "y": 0, "z": 0},
+                           plane_origins=[{"x": 0.5, "y": 0, "z": 0}, {"x": 1.5, "y": 0, "z": 0}])
+    try:
+        response = client.post("/api/poly-cut/slice", content=request.json())
+        assert response.status_code == status.HTTP_200_OK
+        assert executor.pool is not None
+        assert SliceResult(**response.json()) == try_slice_polygon(request)
+    finally:
+        executor.shutdown()
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(main.metrics, "enabled", True)
+    main.metrics.reset()
+    main.cache.clear()
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 1, "y": 0, "z": 0}, {"x": 0, "y": 1, "z": 0}],
+        "plane_origin": {"x": 0.25, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    client.post("/api/poly-cut", json=data)
+    cut_id = client.post("/api/poly-cut", json=data).json()
+    client.get(f"/api/poly-cut/{cut_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'polycut_stage_seconds_count{stage="parse"} 2' in response.text
+    assert 'polycut_stage_seconds_count{stage="serialize"} 1' in response.text
+    assert 'polycut_cut_outcomes_total{info="successful"} 1' in response.text
+    assert "polycut_cache_hits_total 1" in response.text
+    assert "polycut_cache_misses_total 1" in response.text
+    main.metrics.reset()
+
+
+def test_update_cut_plane_only_reuses_prepared_polygon():
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0},
+                    {"x": 0, "y": 2, "z": 0}],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    cut_id = client.post("/api/poly-cut", json=data).json()
+
+    for origin_x in (0.75, 1.0, 1.25):
+        data["plane_origin"]["x"] = origin_x
+        response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+        assert response.status_code == status.HTTP_200_OK
+        cut = Cut(**client.get(f"/api/poly-cut/{cut_id}").json())
+        left = cut.result.result_polygons[0].coordinates
+        assert left[:, 0].max() == origin_x
+    assert main.prepared.get(cut_id) is not None
+
+    client.delete(f"/api/poly-cut/{cut_id}")
+    assert main.prepared.get(cut_id) is None
+
+
+def test_update_cut_moving_a_vertex_patches_prepared_polygon():
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0},
+                    {"x": 0, "y": 2, "z": 0}],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    cut_id = client.post("/api/poly-cut", json=data).json()
+    data["plane_origin"]["x"] = 0.875
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_200_OK
+
+    data["polygon"][2]["x"] = 2.5
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_200_OK
+    cut = Cut(**client.get(f"/api/poly-cut/{cut_id}").json())
+    assert cut.result.result_polygons[1].coordinates[:, 0].max() == 2.5
+    client.delete(f"/api/poly-cut/{cut_id}")
+
+
+def test_posted_cut_keeps_prepared_polygon(monkeypatch):
+    monkeypatch.setattr(main.metrics, "enabled", True)
+    main.metrics.reset()
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0},
+                    {"x": 0, "y": 2, "z": 0}],
+        "plane_origin": {"x": 0.8125, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    cut_id = client.post("/api/poly-cut", json=data).json()
+    assert main.prepared.get(cut_id) is not None
+
+    # the first update already patches the polygon instead of preparing it again
+    data["polygon"][2]["x"] = 2.25
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_200_OK
+    assert main.metrics.counters["prepared_patched"] == 1
+    main.metrics.reset()
+
+    client.delete(f"/api/poly-cut/{cut_id}")
+    assert main.prepared.get(cut_id) is None
+
+
+def test_update_large_cut_prepared_again_in_worker(monkeypatch):
+    data = {
+        "polygon": [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0},
+                    {"x": 0, "y": 2, "z": 0}],
+        "plane_origin": {"x": 0.5, "y": 0, "z": 0},
+        "plane_normal": {"x": 1, "y": 0, "z": 0},
+    }
+    cut_id = client.post("/api/poly-cut", json=data).json()
+    # every polygon is large and the pool has no room
+    monkeypatch.setattr(main, "executor", CutExecutor(threshold=3, workers=1, max_pending=0))
+    main.prepared.pop(cut_id)
+    # a plane that no other test cuts with, so the result is not cached
+    data["plane_origin"]["x"] = 0.625
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    # moving the plane of a prepared polygon is cut in the server
+    main.prepared.put(cut_id, PreparedPolygon(data["polygon"]))
+    response = client.put(f"/api/poly-cut/{cut_id}", json={"id": cut_id, "request": data})
+    assert response.status_code == status.HTTP_200_OK
+    client.delete(f"/api/poly-cut/{cut_id}")
+
+
+def test_clip_polygon():
+    square = [{"x": 0, "y": 0, "z": 0}, {"x": 2, "y": 0, "z": 0}, {"x": 2, "y": 2, "z": 0}, {"x": 0, "y": 2, "z": 0}]
+    shifted = [{"x": p["x"] + 1, "y": p["y"] + 1, "z": 0} for p in square]
+    response = client.post("/api/poly-cut/clip", json={"subject": square, "clip": shifted, "operation": "difference"})
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["info"] == CutInfo.successful
+    assert len(result["result_polygons"]) == 1 and len(result["result_polygons"][0]) == 6
+
+    response = client.post("/api/poly-cut/clip", json={"subject": square, "clip": square})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == CutInfo.failed_overlapping_segments
+
+
+def test_import_skips_optional_modules():
+    # a fresh interpreter, the tests themselves import some of these modules
+    code = "import sys, polycut.main; print(sorted(set(sys.argv[1:]) & set(sys.modules)))"
+    modules = ["matplotlib", "sqlite3", "multiprocessing.shared_memory", "concurrent.futures.process"]
+    output = subprocess.run([sys.executable, "-c", code, *modules], check=True, capture_output=True, text=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_warm_up_does_not_store(monkeypatch):
+    monkeypatch.setattr(main, "warm_up_on_startup", True)
+    count = len(main.db)
+    with TestClient(app):
+        assert len(main.db) == count
@@ -0,0 +1,83 @@
+import numpy as np
+
+from polycut.mesh import chain_segments, cut_mesh_arrays, try_cut_mesh
+from polycut.models import CutInfo, Mesh, MeshCutRequest, Vector3D
+
+cube_vertices = np.array([[x, y, z] for z in (0, 1) for y in (0, 1) for x in (0, 1)], dtype=float)
+cube_faces = [[0, 2, 3, 1], [4, 5, 7, 6], [0, 1, 5, 4], [2, 6, 7, 3], [0, 4, 6, 2], [1, 3, 7, 5]]
+
+
+def cut_cube(origin, normal):
+    request = MeshCutRequest(mesh=Mesh(vertices=cube_vertices, faces=cube_faces),
+                             plane_origin=Vector3D(x=origin[0], y=origin[1], z=origin[2]),
+                             plane_normal=Vector3D(x=normal[0], y=normal[1], z=normal[2]))
+    return try_cut_mesh(request)
+
+
+def test_cut_cube():
+    result = cut_cube((0, 0, 0.5), (0, 0, 1))
+    assert result.info == CutInfo.successful
+    # the four vertical edges are intersected once and shared by the faces on both sides
+    assert len(result.below.vertices) == len(result.above.vertices) == 8
+    assert len(result.below.faces) == len(result.above.faces) == 5
+    assert np.all(result.below.vertices.coordinates[:, 2] <= 0.5)
+    assert np.all(result.above.vertices.coordinates[:, 2] >= 0.5)
+    assert len(result.sections) == 1
+    section = result.sections[0].coordinates
+    assert len(section) == 5 and np.array_equal(section[0], section[-1])
+    assert np.all(section[:, 2] == 0.5)
+
+
+def test_cut_cube_through_diagonal():
+    # the plane passes through two vertical edges of the cube
+    result = cut_cube((0, 0, 0), (1, -1, 0))
+    assert result.info == CutInfo.successful
+    assert len(result.sections) == 1
+    assert len(result.sections[0]) == 5
+    assert sorted(len(face) for face in result.below.faces) == [3, 3, 4, 4]
+
+
+def test_cut_cube_misses():
+    result = cut_cube((0, 0, 2), (0, 0, 1))
+    assert result.info == CutInfo.success_no_cut
+    assert len(result.below.faces) == 6 and len(result.above.faces) == 0
+    assert result.sections == []
+
+
+def test_cut_non_convex_face_fails():
+    # a U-shaped face whose two prongs are crossed by the plane
+    u_shape = np.array([[0, 0, 0], [3, 0, 0], [3, 3, 0], [2, 3, 0], [2, 1, 0], [1, 1, 0], [1, 3, 0], [0, 3, 0]],
+                       dtype=float)
+    info, below, above, sections = cut_mesh_arrays(u_shape, np.arange(8), np.array([8]), np.array([0, 2, 0]),
+                                                   np.array([0, 1.0, 0]))
+    assert info == CutInfo.failed_polygon_not_convex
+    assert len(below[2]) == len(above[2]) == 0 and sections == []
+
+    # below the notch the face is crossed only twice
+    info, below, above, sections = cut_mesh_arrays(u_shape, np.arange(8), np.array([8]), np.array([0, 0.5, 0]),
+                                                   np.array([0, 1.0, 0]))
+    assert info == CutInfo.successful
+    assert below[2].tolist() == [4] and above[2].tolist() == [8]
+    assert len(sections) == 1 and len(sections[0]) == 2
+
+
+def test_cut_triangle_mesh_intersects_shared_edges_once():
+    rng = np.random.default_rng(5)
+    grid = np.array([[x, y, 0] for y in range(10) for x in range(10)], dtype=float)
+    grid[:, 2] = rng.uniform(-0.1, 0.1, len(grid))
+    quads = [(y * 10 + x, y * 10 + x + 1, y * 10 + x + 11, y * 10 + x + 10) for y in range(9) for x in range(9)]
+    faces = np.array([t for a, b, c, d in quads for t in ((a, b, c), (a, c, d))])
+    info, below, above, sections = cut_mesh_arrays(grid, faces.reshape(-1), np.full(len(faces), 3),
+                                                   np.array([4.5, 0, 0]), np.array([1.0, 0.2, 0]))
+    assert info == CutInfo.successful
+    assert len(below[2]) + len(above[2]) > len(faces)
+    # one open polyline across the grid whose points are shared by both parts
+    assert len(sections) == 1
+    assert np.allclose((sections[0] - [4.5, 0, 0]) @ [1.0, 0.2, 0], 0)
+    assert len(np.unique(np.concatenate([below[0], above[0]]), axis=0)) == len(below[0]) + len(above[0]) \
+        - len(sections[0])
+
+
+def test_chain_segments():
+    assert chain_segments(np.array([[1, 2], [0, 1], [5, 6], [6, 7], [7, 5]])) in ([[0, 1, 2], [5, 6, 7, 5]],
+                                                                                   [[2, 1, 0], [5, 6, 7, 5]])
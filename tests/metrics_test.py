@@ -0,0 +1,55 @@
+from polycut import metrics
+from polycut.calculations import PreparedPolygon, cut_prepared_polygon
+from polycut.models import CutInfo, Vector3D
+
+
+def square():
+    return [Vector3D(x=0, y=0, z=0), Vector3D(x=1, y=0, z=0), Vector3D(x=1, y=1, z=0), Vector3D(x=0, y=1, z=0)]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram([1, 10])
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+
+    lines = histogram.render("h", 'stage="a"')
+    assert lines == [
+        'h_bucket{stage="a",le="1"} 2',
+        'h_bucket{stage="a",le="10"} 3',
+        'h_bucket{stage="a",le="+Inf"} 4',
+        'h_sum{stage="a"} 56.5',
+        'h_count{stage="a"} 4',
+    ]
+
+
+def test_disabled_stage_records_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    metrics.reset()
+
+    assert metrics.stage("cut") is metrics.null_timer
+    cut_prepared_polygon(PreparedPolygon(square()), Vector3D(x=0.5, y=0, z=0), Vector3D(x=1, y=0, z=0))
+    assert metrics.stage_durations == {}
+    assert metrics.polygon_vertices.count == 0
+
+
+def test_enabled_stages_are_recorded(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    metrics.reset()
+
+    cut_prepared_polygon(PreparedPolygon(square()), Vector3D(x=0.5, y=0, z=0), Vector3D(x=1, y=0, z=0))
+    cut_prepared_polygon(PreparedPolygon(square()), Vector3D(x=5, y=0, z=0), Vector3D(x=1, y=0, z=0))
+
+    assert {"dedup", "tangency", "intersections", "cut"} <= set(metrics.stage_durations)
+    assert metrics.stage_durations["dedup"].count == 2
+    assert metrics.stage_durations["cut"].count == 1
+    assert metrics.polygon_vertices.sum == 8
+    assert metrics.cut_outcomes == {CutInfo.successful.value: 1, CutInfo.success_no_cut.value: 1}
+    # the second plane misses the square
+    assert metrics.counters["fast_rejects"] == 1
+
+    text = metrics.render()
+    assert 'polycut_stage_seconds_count{stage="cut"} 1' in text
+    assert 'polycut_cut_outcomes_total{info="successful"} 1' in text
+    assert "polycut_polygon_vertices_count 2" in text
+    assert "polycut_fast_rejects_total 1" in text
+    metrics.reset()
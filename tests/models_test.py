@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Polygon, Vector3D
+
+
+def test_polygon_from_json_objects():
+    polygon = Polygon.validate([{"x": 0, "y": 1, "z": 2}, {"x": 3, "y": 4, "z": 5}])
+    assert polygon.coordinates.tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert polygon.coordinates.dtype == np.float64
+
+
+def test_polygon_from_vectors():
+    polygon = Polygon.validate([Vector3D(x=0, y=1, z=2)])
+    assert polygon.coordinates.tolist() == [[0, 1, 2]]
+    assert list(polygon) == [Vector3D(x=0, y=1, z=2)]
+    assert polygon[0] == Vector3D(x=0, y=1, z=2)
+    assert polygon == [Vector3D(x=0, y=1, z=2)]
+
+
+def test_polygon_invalid_vertices():
+    with pytest.raises(ValidationError):
+        CutRequest(polygon=[{"x": 0}], plane_origin=Vector3D(x=0, y=0, z=0), plane_normal=Vector3D(x=1, y=0, z=0))
+    with pytest.raises(ValidationError):
+        CutRequest(polygon=[{"x": "a", "y": 0, "z": 0}], plane_origin=Vector3D(x=0, y=0, z=0),
+                   plane_normal=Vector3D(x=1, y=0, z=0))
+    with pytest.raises(ValidationError):
+        CutRequest(polygon=np.zeros((3, 2)), plane_origin=Vector3D(x=0, y=0, z=0),
+                   plane_normal=Vector3D(x=1, y=0, z=0))
+
+
+def test_polygon_json_round_trip():
+    vertices = [{"x": 0.5, "y": 1.0, "z": 2.0}, {"x": 3.0, "y": 4.0, "z": 5.0}]
+    request = CutRequest(polygon=vertices, plane_origin=Vector3D(x=0, y=0, z=0),
+                         plane_normal=Vector3D(x=1, y=0, z=0))
+    cut = Cut(id="a", request=request, result=CutResult(info=CutInfo.successful, result_polygons=[vertices]))
+    data = json.loads(cut.json())
+    assert data["request"]["polygon"] == vertices
+    assert data["result"]["result_polygons"] == [vertices]
+    assert Cut.parse_raw(cut.json()) == cut
@@ -0,0 +1,72 @@
+import asyncio
+import os
+from concurrent.futures import BrokenExecutor
+from math import cos, sin, radians
+
+import pytest
+
+from polycut.calculations import try_cut_polygon
+from polycut.models import CutRequest, Vector3D
+from polycut.pool import CutExecutor, PoolFullError, WorkerCrashedError
+
+
+def make_request(count: int) -> CutRequest:
+    polygon = [{"x": cos(radians(i * 360 / count)), "y": sin(radians(i * 360 / count)), "z": 0} for i in range(count)]
+    return CutRequest(polygon=polygon, plane_origin=Vector3D(x=0.1, y=0, z=0), plane_normal=Vector3D(x=1, y=0.2, z=0))
+
+
+def test_large_polygon_cut_in_worker():
+    executor = CutExecutor(threshold=100, workers=1)
+    request = make_request(500)
+    try:
+        assert asyncio.run(executor.cut(request)) == try_cut_polygon(request)
+        assert executor.pool is not None
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+def test_small_polygon_cut_inline():
+    executor = CutExecutor(threshold=100, workers=1, max_pending=0)
+    request = make_request(50)
+    assert asyncio.run(executor.cut(request)) == try_cut_polygon(request)
+    assert executor.pool is None
+
+
+def test_full_pool_rejects_large_polygons():
+    executor = CutExecutor(threshold=100, workers=1, max_pending=0)
+    with pytest.raises(PoolFullError):
+        asyncio.run(executor.cut(make_request(500)))
+
+
+def test_crashed_worker_restarts_pool():
+    executor = CutExecutor(threshold=100, workers=1, max_pending=1)
+    request = make_request(500)
+    try:
+        broken = executor.process_pool()
+        with pytest.raises(BrokenExecutor):
+            broken.submit(os._exit, 1).result()
+        with pytest.raises(WorkerCrashedError):
+            asyncio.run(executor.cut(request))
+        # the slot of the failed cut is free again and the next cut runs in a new pool
+        assert executor.pending == 0
+        assert asyncio.run(executor.cut(request)) == try_cut_polygon(request)
+        assert executor.pool is not broken
+    finally:
+        executor.shutdown()
+
+
+def test_run_dispatches_by_size():
+    executor = CutExecutor(threshold=100, workers=1, max_pending=0)
+    assert asyncio.run(executor.run(50, sum, [1, 2])) == 3
+    assert executor.pool is None
+    with pytest.raises(PoolFullError):
+        asyncio.run(executor.run(500, sum, [1, 2]))
+
+    executor = CutExecutor(threshold=100, workers=1)
+    try:
+        assert asyncio.run(executor.run(500, sum, [1, 2])) == 3
+        assert executor.pool is not None
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
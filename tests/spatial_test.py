@@ -0,0 +1,42 @@
+import numpy as np
+
+from polycut.spatial import EdgeIndex
+
+
+def wavy_circle(count: int = 5000) -> np.ndarray:
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    radii = 10 + np.sin(angles * 40)
+    return np.column_stack([radii * np.cos(angles), radii * np.sin(angles)])
+
+
+def test_query_finds_every_crossed_edge():
+    points = wavy_circle()
+    index = EdgeIndex(points)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        origin, normal = rng.normal(size=2) * 5, rng.normal(size=2)
+        heights = (points - origin) @ normal
+        crossed = np.flatnonzero(heights * np.roll(heights, -1) <= 0)
+        edges = index.query(origin, normal, 1e-9)
+        assert np.all(np.diff(edges) > 0)
+        assert np.isin(crossed, edges).all()
+        assert len(edges) < len(points) / 10
+
+
+def test_query_line_missing_polygon():
+    index = EdgeIndex(wavy_circle())
+    assert len(index.query(np.array([20.0, 0]), np.array([1.0, 0]), 1e-9)) == 0
+
+
+def test_patched_index_matches_rebuilt_index():
+    points = wavy_circle()
+    index = EdgeIndex(points)
+    moved = points.copy()
+    moved[[100, 101, 4999]] *= 3
+    patched = index.patched(moved, np.array([99, 100, 101, 4998, 4999]))
+    rebuilt = EdgeIndex(moved)
+    for level in range(len(rebuilt.lows)):
+        assert np.array_equal(patched.lows[level], rebuilt.lows[level])
+        assert np.array_equal(patched.highs[level], rebuilt.highs[level])
+    # the original index is unchanged
+    assert np.array_equal(index.lows[0], EdgeIndex(points).lows[0])
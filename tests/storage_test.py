@@ -0,0 +1,165 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from polycut.models import Cut, CutInfo, CutRequest, CutResult, Vector3D
+from polycut.storage import MappedStore, MemoryStore, SQLiteStore, StoreBusyError, open_store
+
+
+def make_cut(cut_id: str, offset: float = 0) -> Cut:
+    polygon = [Vector3D(x=0 + offset, y=0, z=0), Vector3D(x=1, y=0.5, z=0), Vector3D(x=1, y=1, z=0)]
+    request = CutRequest(polygon=polygon, plane_origin=Vector3D(x=0.5, y=0, z=0),
+                         plane_normal=Vector3D(x=1, y=0, z=0))
+    result = CutResult(info=CutInfo.successful,
+                       result_polygons=[polygon[:2], [Vector3D(x=0.25, y=0.125, z=0)] + polygon[1:]])
+    return Cut(id=cut_id, request=request, result=result)
+
+
+@pytest.fixture(params=["memory", "sqlite", "mmap"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryStore()
+    elif request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "cuts.db"))
+        yield store
+        store.close()
+    else:
+        store = MappedStore(str(tmp_path / "cuts"))
+        yield store
+        store.close()
+
+
+def test_put_get_delete(store):
+    cut = make_cut("a")
+    store["a"] = cut
+    assert "a" in store
+    assert store["a"] == cut
+    assert len(store) == 1
+    del store["a"]
+    assert "a" not in store
+    with pytest.raises(KeyError):
+        store["a"]
+    with pytest.raises(KeyError):
+        del store["a"]
+
+
+def test_simplification_is_stored(store):
+    cut = make_cut("a")
+    cut.request.simplify_tolerance = 0.5
+    cut.result.removed_vertices = 7
+    store["a"] = cut
+    assert store["a"].request.simplify_tolerance == 0.5
+    assert store["a"].result.removed_vertices == 7
+
+
+def test_sqlite_adds_simplification_columns(tmp_path):
+    path = str(tmp_path / "cuts.db")
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE cuts (id TEXT PRIMARY KEY, created_at REAL NOT NULL, info TEXT NOT NULL, plane BLOB NOT NULL,
+                           polygon BLOB NOT NULL, result_sizes BLOB NOT NULL, result BLOB NOT NULL)""")
+    connection.close()
+    store = SQLiteStore(path)
+    store["a"] = make_cut("a")
+    assert store["a"] == make_cut("a")
+    store.close()
+
+
+def test_update_keeps_creation_order(store):
+    store["a"] = make_cut("a")
+    store["b"] = make_cut("b")
+    created_at = store.created_at("a")
+    store["a"] = make_cut("a", offset=0.5)
+    assert store.created_at("a") == created_at
+    assert list(store) == ["a", "b"]
+    assert [cut.id for cut in store.values()] == ["a", "b"]
+    assert store["a"] == make_cut("a", offset=0.5)
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "cuts.db")
+    first = SQLiteStore(path)
+    second = open_store(f"sqlite:///{path}")
+    first["a"] = make_cut("a")
+    assert second["a"] == make_cut("a")
+    first.close()
+    second.close()
+
+
+def test_sqlite_query_returns_connection_between_batches(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cuts.db"), pool_size=1, timeout=0.1, batch_size=2)
+    for cut_id in "abcde":
+        store[cut_id] = make_cut(cut_id)
+    cuts = store.query()
+    assert next(cuts).id == "a"
+    # the only connection is free while the query is not consumed
+    assert store["e"] == make_cut("e")
+    assert [cut.id for cut in cuts] == ["b", "c", "d", "e"]
+    assert [cut.id for cut in store.query(offset=1, limit=3)] == ["b", "c", "d"]
+    with store.connection():
+        with pytest.raises(StoreBusyError):
+            store["a"]
+    store.close()
+
+
+def test_mapped_store_reopens(tmp_path):
+    directory = str(tmp_path / "cuts")
+    first = MappedStore(directory)
+    for cut_id in "abc":
+        first[cut_id] = make_cut(cut_id)
+    first["a"] = make_cut("a", offset=0.5)
+    del first["b"]
+    first.close()
+
+    second = open_store(f"mmap:///{directory}")
+    assert list(second) == ["a", "c"]
+    assert second["a"] == make_cut("a", offset=0.5)
+    # polygons are views of the mapped coordinate file
+    assert np.shares_memory(second["c"].request.polygon.coordinates, second.mapped)
+    second.close()
+
+
+def test_mapped_store_compacts_unused_coordinates(tmp_path):
+    directory = str(tmp_path / "cuts")
+    store = MappedStore(directory, compact_threshold=0)
+    store["a"] = make_cut("a")
+    store["b"] = make_cut("b")
+    before = store["a"]
+    for step in range(100):
+        store["a"] = make_cut("a", offset=step / 100)
+    del store["b"]
+    # the file holds at most twice the coordinates in use
+    assert os.path.getsize(store.coordinates_path) <= 2 * 8 * 8 * 3
+    assert len(os.listdir(directory)) == 2
+    assert store["a"] == make_cut("a", offset=0.99)
+    # views taken before a compaction keep their coordinates
+    assert before == make_cut("a")
+    store.close()
+
+    reopened = MappedStore(directory, compact_threshold=0)
+    assert list(reopened) == ["a"]
+    assert reopened["a"] == make_cut("a", offset=0.99)
+    reopened["c"] = make_cut("c")
+    assert [cut.id for cut in reopened.query()] == ["a", "c"]
+    reopened.close()
+
+
+def test_open_store_unsupported():
+    with pytest.raises(ValueError):
+        open_store("redis://localhost")
+
+
+def test_query_pages_and_filters(store):
+    for cut_id in "abcde":
+        store[cut_id] = make_cut(cut_id)
+    assert [cut.id for cut in store.query(limit=2)] == ["a", "b"]
+    assert [cut.id for cut in store.query(after="b", limit=2)] == ["c", "d"]
+    assert [cut.id for cut in store.query(offset=3)] == ["d", "e"]
+    assert [cut.id for cut in store.query(info=CutInfo.failed_polygon_not_convex)] == []
+    created_at = store.created_at("c")
+    assert [cut.id for cut in store.query(created_after=created_at)][0] == "c"
+    assert "c" not in [cut.id for cut in store.query(created_before=created_at)]
+    with pytest.raises(KeyError):
+        store.query(after="unknown")